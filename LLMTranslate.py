@@ -1,17 +1,663 @@
-from together import Together
+from together import Together, AsyncTogether
 import google.generativeai as genai
 from dotenv import load_dotenv
 import os
 import re
+import json
+import logging
+import threading
+import itertools
+import time
+import datetime
+from collections import namedtuple
+
+from llmRateLimit import call_with_retry, acall_with_retry, get_limiter
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
 
 # Načtení proměnných z .env souboru
 load_dotenv()
 
 
+# Verze promptu - zvýšit při každé změně pravidel/instrukcí, aby se nemíchaly
+# segmenty v překladové paměti vzniklé různými prompty
+PROMPT_VERSION = "2"
+
+# Pravidla překladu (společná pro překlad celého HTML i jednotlivých segmentů)
+TRANSLATION_RULES = (
+        "\n1. VŠECHNY HTML tagy, atributy a entity (jako `&nbsp;`) ponech beze změny"\
+        "\n2. Překládej POUZE textový obsah mezi tagy"\
+        "\n3. Zachovej číselné hodnoty, kódy (IP42, USB), technické parametry (3.5 mil, 100 řádků/s) a firemní názvy (Honeywell) beze změny"\
+        "\n4. Nikdy nepřidávej cizojazyčné znaky (jako 几乎) ani znaky mimo českou znakovou sadu, drž se českého jazyka"\
+        "\n5. V technických termínech použij standardní českou terminologii (např. 'lineární imager', 'IP42')"\
+        "\n6. Pokud v textu je 3.5 cm, přelož to jako 3,5 cm (s čárkou), pokud je 3.5 mil, přelož to jako 3,5 mil (s čárkou)"\
+        "\n7. Nepřidávej nic co není v původním textu například: ```html to nepřidavej"
+)
+
+# Statická část promptu - posílá se jako system instruction, takže je u všech požadavků
+# stejná a provider ji může cachovat; v uživatelské zprávě je jen obsah k překladu
+SYSTEM_INSTRUCTION = (
+        "Jsi překladatel technických popisů produktů. Text z uživatelské zprávy přelož"
+        " z **němčiny** do češtiny a zachovej přesnou strukturu HTML. Dodrž pravidla:"
+        + TRANSLATION_RULES
+)
+
+
+class TranslationPrompt(namedtuple("TranslationPrompt", "system user")):
+    """Prompt rozdělený na cachovatelnou system instruction a proměnnou uživatelskou zprávu"""
+
+    def __str__(self):
+        return self.system + "\n\n" + self.user
+
+
+def split_prompt(prompt):
+    """Vrátí (system, user); obyčejný řetězec je celý uživatelská zpráva"""
+    if isinstance(prompt, TranslationPrompt):
+        return prompt.system, prompt.user
+    return None, prompt
+
+
+def build_translation_prompt(original_html: str) -> TranslationPrompt:
+    """
+    Sestaví prompt pro překlad HTML popisku z němčiny do češtiny.
+
+    Args:
+        original_html (str): HTML ze scraperu (popis + specifikace)
+
+    Returns:
+        TranslationPrompt: system instruction s pravidly + HTML jako uživatelská zpráva
+    """
+    return TranslationPrompt(SYSTEM_INSTRUCTION, original_html)
+
+
+def build_segments_prompt(segments) -> TranslationPrompt:
+    """
+    Sestaví prompt pro překlad seznamu textových segmentů (bez HTML).
+
+    Args:
+        segments (list[str]): Texty k překladu
+
+    Returns:
+        TranslationPrompt: Prompt, který žádá odpověď jako JSON pole stejné délky
+    """
+    return TranslationPrompt(
+        SYSTEM_INSTRUCTION,
+        "Vstup je JSON pole řetězců. Odpověz POUZE JSON polem přeložených řetězců"
+        " se stejným počtem položek ve stejném pořadí, bez dalšího textu."
+        + "\n\nSegmenty k překladu:\n\n" + json.dumps(list(segments), ensure_ascii=False)
+    )
+
+
+# ---------- Dávkový překlad více produktů v jednom požadavku ----------
+BATCH_START = "<<<PRODUKT {}>>>"
+BATCH_END = "<<<KONEC {}>>>"
+_BATCH_ITEM_RE = re.compile(r"<<<PRODUKT ([^>]+)>>>\s*\n?(.*?)\n?\s*<<<KONEC \1>>>", re.DOTALL)
+
+# Pevná část promptu (system instruction + instrukce k oddělovačům) se do rozpočtu počítá jednou
+_BATCH_OVERHEAD_TOKENS = 400
+
+
+def estimate_tokens(text: str) -> int:
+    """Hrubý odhad počtu tokenů (~4 znaky na token)"""
+    return len(text or "") // 4 + 1
+
+
+def plan_batches(items, token_budget: int):
+    """
+    Rozdělí produkty do dávek tak, aby vstup každé dávky nepřekročil token_budget.
+    Produkt větší než rozpočet jde do samostatné dávky.
+
+    Args:
+        items: seznam (siv_code, html)
+        token_budget (int): max. odhad tokenů vstupu na dávku
+
+    Returns:
+        list[list[(siv_code, html)]]
+    """
+    batches, current, used = [], [], _BATCH_OVERHEAD_TOKENS
+    for siv_code, html in items:
+        cost = estimate_tokens(html) + 10
+        if current and used + cost > token_budget:
+            batches.append(current)
+            current, used = [], _BATCH_OVERHEAD_TOKENS
+        current.append((siv_code, html))
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_batch_prompt(items) -> TranslationPrompt:
+    """Prompt pro překlad více produktů najednou, každý ohraničený stabilními značkami"""
+    body = "\n\n".join(
+        f"{BATCH_START.format(siv_code)}\n{html}\n{BATCH_END.format(siv_code)}" for siv_code, html in items
+    )
+    return TranslationPrompt(
+        SYSTEM_INSTRUCTION,
+        "Každý produkt je ohraničen značkami <<<PRODUKT id>>> a <<<KONEC id>>>. "
+        "Značky zkopíruj do odpovědi beze změny a mezi ně vlož pouze překlad daného produktu."
+        + "\n\nProdukty k překladu:\n\n" + body
+    )
+
+
+def split_batch_response(ai_response: str, siv_codes):
+    """
+    Rozdělí odpověď dávky zpět podle SivCode.
+
+    Returns:
+        dict {siv_code: překlad} - jen pro produkty, které se vrátily neprázdné
+    """
+    wanted = {str(code): code for code in siv_codes}
+    result = {}
+    for key, text in _BATCH_ITEM_RE.findall(ai_response or ""):
+        key = key.strip()
+        if key in wanted and text.strip():
+            result[wanted[key]] = text.strip()
+    return result
+
+
+def translate_batch(items, ai_function, token_budget: int = 6000):
+    """
+    Přeloží více produktů s minimem požadavků na LLM.
+
+    Produkty se rozdělí do dávek podle token_budget, každá dávka je jeden požadavek.
+    Produkty, které v odpovědi chybí (nebo dávka selže), se přeloží jednotlivě.
+
+    Args:
+        items: seznam (siv_code, html)
+        ai_function: funkce prompt -> odpověď (např. gemini_ai_response)
+        token_budget (int): max. odhad tokenů vstupu na jednu dávku
+
+    Returns:
+        dict {siv_code: překlad}; produkty, které se nepodařilo přeložit, chybí
+    """
+    translations = {}
+    for batch in plan_batches(items, token_budget):
+        if len(batch) > 1:
+            try:
+                response = ai_function(build_batch_prompt(batch))
+                translations.update(split_batch_response(response, [code for code, _ in batch]))
+            except LLMError as e:
+                logger.warning("Dávkový překlad selhal: %s", e)
+
+        # Chybějící položky (nebo dávka o jednom produktu) → samostatný požadavek
+        for siv_code, html in batch:
+            if siv_code in translations:
+                continue
+            if len(batch) > 1:
+                logger.warning("Produkt %s chybí v odpovědi dávky - překládám samostatně", siv_code,
+                               extra={"siv_code": siv_code})
+            try:
+                response = ai_function(build_translation_prompt(html))
+            except LLMError as e:
+                logger.warning("Překlad produktu %s selhal: %s", siv_code, e, extra={"siv_code": siv_code})
+                continue
+            if response:
+                translations[siv_code] = response
+    return translations
+
+
+# ---------- Klientská vrstva providerů ----------
+# Výchozí timeout jednoho požadavku na LLM (sekundy)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+# HTTP stavy, u kterých má smysl požadavek zopakovat
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+
+# Explicitní context cache u Gemini (system instruction se nahraje jednou a požadavky na ni
+# jen odkazují). Gemini ji vyžaduje od určité minimální délky obsahu - když ji API odmítne,
+# posílá se system instruction s každým požadavkem.
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "0") == "1"
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+
+class LLMError(Exception):
+    """Chyba při komunikaci s LLM - nikdy se nevrací jako text překladu"""
+
+    def __init__(self, message, provider=None, status=None, retryable=False, rejected=False):
+        super().__init__(message)
+        self.provider = provider
+        self.status = status
+        self.retryable = retryable
+        # Provider odmítl konkrétní požadavek (špatný požadavek, safety filtr) - o jeho
+        # zdraví to nic neříká, takže se to nepočítá do circuit breakeru routeru
+        self.rejected = rejected
+
+
+def _to_llm_error(e, provider):
+    """Převede výjimku z SDK na LLMError (s HTTP stavem, pokud ho SDK nese)"""
+    if isinstance(e, LLMError):
+        return e
+    status = None
+    for attr in ("status_code", "http_status", "code"):
+        value = getattr(e, attr, None)
+        if isinstance(value, int):
+            status = value
+            break
+    text = str(e)
+    timeout = "timeout" in type(e).__name__.lower() or "deadline" in text.lower()
+    quota = "429" in text or "quota" in text.lower() or "rate limit" in text.lower()
+    if status is None and quota:
+        status = 429
+    retryable = timeout or (status in RETRYABLE_STATUSES)
+    rejected = not retryable and status is not None and 400 <= status < 500
+    return LLMError(f"Chyba při komunikaci s {provider}: {text}", provider=provider, status=status,
+                    retryable=retryable, rejected=rejected)
+
+
+def strip_think(ai_response: str) -> str:
+    """Odstraní části odpovědi označené <think>...</think>"""
+    return re.sub(r'<think>.*?</think>', '', ai_response or "", flags=re.DOTALL).strip()
+
+
+class ThinkFilter:
+    """
+    Průběžně odfiltrovává <think>...</think> ze streamované odpovědi.
+    Značky rozdělené mezi chunky se drží v bufferu, dokud nejsou celé.
+    """
+
+    OPEN = "<think>"
+    CLOSE = "</think>"
+
+    def __init__(self):
+        self._buf = ""
+        self._inside = False
+
+    @staticmethod
+    def _partial_suffix(text, tag):
+        # Délka nejdelšího konce textu, který je začátkem značky
+        for k in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:k]):
+                return k
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        """Přidá chunk a vrátí text, který už je bezpečně mimo <think>"""
+        self._buf += chunk or ""
+        out = []
+        while True:
+            if self._inside:
+                idx = self._buf.find(self.CLOSE)
+                if idx == -1:
+                    keep = self._partial_suffix(self._buf, self.CLOSE)
+                    self._buf = self._buf[len(self._buf) - keep:]
+                    break
+                self._buf = self._buf[idx + len(self.CLOSE):]
+                self._inside = False
+            else:
+                idx = self._buf.find(self.OPEN)
+                if idx == -1:
+                    keep = self._partial_suffix(self._buf, self.OPEN)
+                    out.append(self._buf[:len(self._buf) - keep])
+                    self._buf = self._buf[len(self._buf) - keep:]
+                    break
+                out.append(self._buf[:idx])
+                self._buf = self._buf[idx + len(self.OPEN):]
+                self._inside = True
+        return "".join(out)
+
+    def finish(self) -> str:
+        """Konec streamu - vrátí zbytek bufferu (neuzavřený <think> se zahodí)"""
+        rest = "" if self._inside else self._buf
+        self._buf = ""
+        return rest
+
+
+_token_stats = {}
+_token_stats_lock = threading.Lock()
+
+
+def record_token_usage(provider, model, prompt_tokens, output_tokens, cached_tokens=0):
+    """Zaloguje spotřebu tokenů jednoho požadavku a přičte ji do souhrnných počítadel"""
+    name = f"{provider}/{model}"
+    prompt_tokens, output_tokens, cached_tokens = prompt_tokens or 0, output_tokens or 0, cached_tokens or 0
+    logger.debug("%s (prompt v%s): vstup %d tokenů (z cache %d), výstup %d tokenů",
+                 name, PROMPT_VERSION, prompt_tokens, cached_tokens, output_tokens)
+    with _token_stats_lock:
+        stats = _token_stats.setdefault(
+            name, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0})
+        stats["requests"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+        stats["output_tokens"] += output_tokens
+    metrics = get_metrics()
+    metrics.inc("llm_tokens_total", prompt_tokens, provider=provider, model=model, kind="prompt")
+    metrics.inc("llm_tokens_total", cached_tokens, provider=provider, model=model, kind="cached")
+    metrics.inc("llm_tokens_total", output_tokens, provider=provider, model=model, kind="output")
+
+
+def get_token_stats():
+    """Souhrnná spotřeba tokenů: {"provider/model": {...}} včetně průměru vstupu na požadavek"""
+    with _token_stats_lock:
+        data = {name: dict(stats) for name, stats in _token_stats.items()}
+    for stats in data.values():
+        stats["avg_prompt_tokens"] = round(stats["prompt_tokens"] / stats["requests"], 1) if stats["requests"] else 0
+    return data
+
+
+class TogetherProvider:
+    """Together (DeepSeek) - jeden sdílený klient (sync + async) pro všechna vlákna"""
+
+    name = "together"
+    default_model = "deepseek-ai/DeepSeek-R1-Distill-Llama-70B-free"
+
+    def __init__(self, timeout=LLM_TIMEOUT):
+        # Získání API klíče
+        api_key = os.getenv("TOGETHER_API_KEY")
+        if not api_key:
+            raise LLMError("TOGETHER_API_KEY nebyl nalezen v .env souboru", provider=self.name)
+        self.timeout = timeout
+        self._api_key = api_key
+        # Klienti podle timeoutu (SDK nastavuje timeout na klientovi, ne na požadavku)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _client(self, timeout, is_async=False):
+        key = (timeout or self.timeout, is_async)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                cls = AsyncTogether if is_async else Together
+                # Retry řeší vlastní vrstva, SDK ať neopakuje potichu
+                client = cls(api_key=self._api_key, timeout=key[0], max_retries=0)
+                self._clients[key] = client
+            return client
+
+    @staticmethod
+    def _messages(prompt):
+        # System instruction jde první a je u všech požadavků stejná (prefix cache providera)
+        system, user = split_prompt(prompt)
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": user})
+        return messages
+
+    def _record_usage(self, usage, model):
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        record_token_usage(self.name, model, getattr(usage, "prompt_tokens", 0),
+                           getattr(usage, "completion_tokens", 0), getattr(details, "cached_tokens", 0))
+
+    def complete(self, prompt, model=None, timeout=None):
+        model = model or self.default_model
+        try:
+            response = self._client(timeout).chat.completions.create(
+                model=model,
+                messages=self._messages(prompt),
+            )
+            text = response.choices[0].message.content
+        except Exception as e:
+            raise _to_llm_error(e, self.name) from e
+        self._record_usage(getattr(response, "usage", None), model)
+        if not text:
+            raise LLMError("Prázdná odpověď od AI", provider=self.name, retryable=True)
+        return text
+
+    def stream(self, prompt, model=None, timeout=None):
+        """Generátor textových chunků odpovědi"""
+        model = model or self.default_model
+        try:
+            response = self._client(timeout).chat.completions.create(
+                model=model,
+                messages=self._messages(prompt),
+                stream=True,
+            )
+            for chunk in response:
+                # Spotřebu tokenů nese poslední chunk streamu
+                self._record_usage(getattr(chunk, "usage", None), model)
+                if not chunk.choices:
+                    continue
+                text = getattr(chunk.choices[0].delta, "content", None)
+                if text:
+                    yield text
+        except Exception as e:
+            raise _to_llm_error(e, self.name) from e
+
+    async def acomplete(self, prompt, model=None, timeout=None):
+        model = model or self.default_model
+        try:
+            response = await self._client(timeout, is_async=True).chat.completions.create(
+                model=model,
+                messages=self._messages(prompt),
+            )
+            text = response.choices[0].message.content
+        except Exception as e:
+            raise _to_llm_error(e, self.name) from e
+        self._record_usage(getattr(response, "usage", None), model)
+        if not text:
+            raise LLMError("Prázdná odpověď od AI", provider=self.name, retryable=True)
+        return text
+
+
+class GeminiProvider:
+    """Gemini - genai.configure jednou, GenerativeModel se cachuje podle modelu a system instruction"""
+
+    name = "gemini"
+    default_model = "gemini-2.0-flash-lite"
+
+    def __init__(self, timeout=LLM_TIMEOUT):
+        # Načtení API klíče z .env
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise LLMError("GEMINI_API_KEY nebyl nalezen v .env souboru", provider=self.name)
+        self.timeout = timeout
+        genai.configure(api_key=api_key)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model, system=None):
+        key = (model or self.default_model, system)
+        with self._lock:
+            cached = self._models.get(key)
+            if cached is None or time.monotonic() >= cached[1]:
+                cached = self._create_model(*key)
+                self._models[key] = cached
+            return cached[0]
+
+    def _create_model(self, model, system):
+        """Vrátí (GenerativeModel, platnost do); s context cache platí do vypršení jejího TTL"""
+        if system and GEMINI_CONTEXT_CACHE:
+            try:
+                content = genai.caching.CachedContent.create(
+                    model=f"models/{model}",
+                    display_name=f"preklad-v{PROMPT_VERSION}",
+                    system_instruction=system,
+                    ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL),
+                )
+                logger.debug("Gemini context cache %s pro %s (prompt v%s)", content.name, model, PROMPT_VERSION)
+                # Obnovit chvíli před vypršením, ať požadavek neodkazuje na smazanou cache
+                expires = time.monotonic() + max(GEMINI_CONTEXT_CACHE_TTL - 60, 60)
+                return genai.GenerativeModel.from_cached_content(cached_content=content), expires
+            except Exception as e:
+                logger.warning("Gemini context cache není k dispozici (%s) - "
+                               "system instruction se posílá s každým požadavkem", e)
+        return genai.GenerativeModel(model, system_instruction=system), float("inf")
+
+    def _record_usage(self, response, model):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None or not getattr(usage, "prompt_token_count", 0):
+            return
+        record_token_usage(self.name, model, usage.prompt_token_count,
+                           getattr(usage, "candidates_token_count", 0),
+                           getattr(usage, "cached_content_token_count", 0))
+
+    @staticmethod
+    def _text(response):
+        try:
+            return response.text
+        except ValueError as e:
+            # Odpověď bez textu (např. zablokovaná safety filtrem)
+            raise LLMError(f"Gemini nevrátil text: {e}", provider="gemini", rejected=True) from e
+
+    def complete(self, prompt, model=None, timeout=None):
+        model = model or self.default_model
+        system, user = split_prompt(prompt)
+        try:
+            response = self._model(model, system).generate_content(
+                user, request_options={"timeout": timeout or self.timeout}
+            )
+            text = self._text(response)
+        except Exception as e:
+            raise _to_llm_error(e, self.name) from e
+        self._record_usage(response, model)
+        if not text:
+            raise LLMError("Prázdná odpověď od Gemini", provider=self.name, retryable=True)
+        return text
+
+    def stream(self, prompt, model=None, timeout=None):
+        """Generátor textových chunků odpovědi"""
+        model = model or self.default_model
+        system, user = split_prompt(prompt)
+        try:
+            response = self._model(model, system).generate_content(
+                user, stream=True, request_options={"timeout": timeout or self.timeout}
+            )
+            last = None
+            for chunk in response:
+                last = chunk
+                text = self._text(chunk)
+                if text:
+                    yield text
+        except Exception as e:
+            raise _to_llm_error(e, self.name) from e
+        # Spotřeba tokenů je kumulativní, platí hodnota z posledního chunku
+        self._record_usage(last, model)
+
+    async def acomplete(self, prompt, model=None, timeout=None):
+        model = model or self.default_model
+        system, user = split_prompt(prompt)
+        try:
+            response = await self._model(model, system).generate_content_async(
+                user, request_options={"timeout": timeout or self.timeout}
+            )
+            text = self._text(response)
+        except Exception as e:
+            raise _to_llm_error(e, self.name) from e
+        self._record_usage(response, model)
+        if not text:
+            raise LLMError("Prázdná odpověď od Gemini", provider=self.name, retryable=True)
+        return text
+
+
+PROVIDERS = {
+    TogetherProvider.name: TogetherProvider,
+    GeminiProvider.name: GeminiProvider,
+}
+
+_provider_instances = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name):
+    """Vrátí sdílenou instanci providera (vytvoří ji při prvním použití)"""
+    with _providers_lock:
+        provider = _provider_instances.get(name)
+        if provider is None:
+            if name not in PROVIDERS:
+                raise ValueError(f"Neznámý LLM provider: {name}")
+            provider = PROVIDERS[name]()
+            _provider_instances[name] = provider
+        return provider
+
+
+def register_provider(provider):
+    """
+    Zaregistruje hotovou instanci providera pod jejím jménem (provider.name).
+    Slouží pro lokální stand-iny (benchmark.py) - dál se volá přes stejné limity a router.
+    """
+    with _providers_lock:
+        PROVIDERS[provider.name] = type(provider)
+        _provider_instances[provider.name] = provider
+
+
+def _request_tokens(prompt):
+    # Vstup + odhad výstupu (překlad je zhruba stejně dlouhý jako originál)
+    system, user = split_prompt(prompt)
+    return (estimate_tokens(system) if system else 0) + estimate_tokens(user) * 2
+
+
+def _record_request(provider_name, model, start, ok, histogram="llm_request_seconds"):
+    """Latence požadavku včetně čekání na limity a opakování + počet podle výsledku"""
+    metrics = get_metrics()
+    metrics.observe(histogram, time.monotonic() - start, provider=provider_name, model=model)
+    metrics.inc("llm_requests_total", provider=provider_name, model=model, result="ok" if ok else "error")
+
+
+def complete_with_limits(provider_name, prompt, model=None, timeout=None):
+    """Požadavek přes sdílený rate limiter providera+modelu s retry/backoff při 429 a 5xx"""
+    provider = get_provider(provider_name)
+    model = model or provider.default_model
+    start, ok = time.monotonic(), False
+    try:
+        result = call_with_retry(
+            lambda: provider.complete(prompt, model=model, timeout=timeout),
+            get_limiter(provider_name, model),
+            _request_tokens(prompt),
+        )
+        ok = True
+        return result
+    finally:
+        _record_request(provider_name, model, start, ok)
+
+
+async def acomplete_with_limits(provider_name, prompt, model=None, timeout=None):
+    """Async varianta complete_with_limits"""
+    provider = get_provider(provider_name)
+    model = model or provider.default_model
+    start, ok = time.monotonic(), False
+    try:
+        result = await acall_with_retry(
+            lambda: provider.acomplete(prompt, model=model, timeout=timeout),
+            get_limiter(provider_name, model),
+            _request_tokens(prompt),
+        )
+        ok = True
+        return result
+    finally:
+        _record_request(provider_name, model, start, ok)
+
+
+def stream_with_limits(provider_name, prompt, model=None, timeout=None, delete_think=True):
+    """
+    Streamovaná odpověď přes sdílený rate limiter. Otevření streamu (do prvního chunku)
+    se při 429/5xx opakuje; <think> části se filtrují průběžně.
+
+    Yields:
+        str: chunky přeloženého textu
+    """
+    provider = get_provider(provider_name)
+    model = model or provider.default_model
+
+    def open_stream():
+        chunks = provider.stream(prompt, model=model, timeout=timeout)
+        return next(chunks, ""), chunks
+
+    start = time.monotonic()
+    try:
+        first, chunks = call_with_retry(open_stream, get_limiter(provider_name, model), _request_tokens(prompt))
+    except Exception:
+        _record_request(provider_name, model, start, False, histogram="llm_first_chunk_seconds")
+        raise
+    # U streamu se měří čas do prvního chunku (ten určuje, kdy uživatel vidí první text)
+    _record_request(provider_name, model, start, True, histogram="llm_first_chunk_seconds")
+
+    think = ThinkFilter() if delete_think else None
+    for chunk in itertools.chain([first], chunks):
+        text = think.feed(chunk) if think else chunk
+        if text:
+            yield text
+    if think:
+        rest = think.finish()
+        if rest:
+            yield rest
+
+
 def get_ai_response(
         user_message: str,
-        model: str = "deepseek-ai/DeepSeek-R1-Distill-Llama-70B-free",
-        delete_think: bool = True
+        model: str = TogetherProvider.default_model,
+        delete_think: bool = True,
+        timeout: float = None
 ) -> str:
     """
     Získá odpověď od AI na základě uživatelské zprávy.
@@ -20,78 +666,63 @@ def get_ai_response(
         user_message (str): Zpráva od uživatele
         model (str): Model AI, který se má použít
         delete_think (bool): Odstranit části odpovědi označené <think> (default: True)
+        timeout (float): Timeout požadavku v sekundách (default: LLM_TIMEOUT)
 
     Returns:
         str: Odpověď od AI
+
+    Raises:
+        LLMError: při jakékoli chybě komunikace (chyba se nikdy nevrací jako text)
     """
-    try:
-        # Získání API klíče
-        api_key = os.getenv("TOGETHER_API_KEY")
-        if not api_key:
-            raise ValueError("TOGETHER_API_KEY nebyl nalezen v .env souboru")
-
-        # Inicializace klienta
-        client = Together(api_key=api_key)
-
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            ]
-        )
+    ai_response = complete_with_limits("together", user_message, model=model, timeout=timeout)
 
-        # Získání odpovědi
-        ai_response = response.choices[0].message.content
+    # Odstranění částí <think> pokud je delete_think True
+    if delete_think:
+        ai_response = strip_think(ai_response)
+    return ai_response
 
-        # Odstranění částí <think> pokud je delete_think True
-        if delete_think:
-            ai_response = re.sub(r'<think>.*?</think>', '', ai_response, flags=re.DOTALL)
-            ai_response = ai_response.strip()
 
-        return ai_response
-    except Exception as e:
-        return f"Chyba při komunikaci s AI: {str(e)}"
 def gemini_ai_response(
         user_message: str,
-        model: str = "gemini-2.0-flash-lite",
-        delete_think: bool = True
+        model: str = GeminiProvider.default_model,
+        delete_think: bool = True,
+        timeout: float = None
 ) -> str:
     """
     Získá odpověď od Gemini na základě uživatelské zprávy.
 
     Args:
         user_message (str): Zpráva od uživatele
-        model (str): Model Gemini, který se má použít (default: gemini-1.5-flash)
+        model (str): Model Gemini, který se má použít (default: gemini-2.0-flash-lite)
         delete_think (bool): Odstranit části odpovědi označené <think> (default: True)
+        timeout (float): Timeout požadavku v sekundách (default: LLM_TIMEOUT)
 
     Returns:
         str: Odpověď od AI
+
+    Raises:
+        LLMError: při jakékoli chybě komunikace (chyba se nikdy nevrací jako text)
     """
-    try:
-        # Načtení API klíče z .env
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY nebyl nalezen v .env souboru")
+    ai_response = complete_with_limits("gemini", user_message, model=model, timeout=timeout)
 
-        # Inicializace Gemini klienta
-        genai.configure(api_key=api_key)
+    # Odstranění částí <think> pokud je delete_think True
+    if delete_think:
+        ai_response = strip_think(ai_response)
+    return ai_response
 
-        model_instance = genai.GenerativeModel(model)
-        response = model_instance.generate_content(user_message)
 
-        ai_response = response.text
+async def aget_ai_response(user_message: str, model: str = TogetherProvider.default_model,
+                           delete_think: bool = True, timeout: float = None) -> str:
+    """Async varianta get_ai_response"""
+    ai_response = await acomplete_with_limits("together", user_message, model=model, timeout=timeout)
+    return strip_think(ai_response) if delete_think else ai_response
 
-        # Odstranění částí <think> pokud je delete_think True
-        if delete_think:
-            ai_response = re.sub(r'<think>.*?</think>', '', ai_response, flags=re.DOTALL)
-            ai_response = ai_response.strip()
 
-        return ai_response
-    except Exception as e:
-        return f"Chyba při komunikaci s Gemini: {str(e)}"
+async def agemini_ai_response(user_message: str, model: str = GeminiProvider.default_model,
+                              delete_think: bool = True, timeout: float = None) -> str:
+    """Async varianta gemini_ai_response"""
+    ai_response = await acomplete_with_limits("gemini", user_message, model=model, timeout=timeout)
+    return strip_think(ai_response) if delete_think else ai_response
 
 # Příklad použití
 if __name__ == "__main__":
@@ -0,0 +1,522 @@
+"""
+Dávkový běh bez GUI: načtení produktů z DB → scrapování → překlad → uložení.
+
+Každá fáze má vlastní omezený počet vláken a mezi fázemi jsou omezené fronty
+(backpressure) - rychlejší fáze tak nepředběhne pomalejší a paměť neroste.
+
+Použití:
+    python batchPipeline.py --dodavatel api --limit 1000
+    python batchPipeline.py --dodavatel "Kosatec (selenium)" --scrape-workers 2 --translate-workers 4
+"""
+import argparse
+import logging
+import queue
+import threading
+import time
+
+from database import (get_products, update_product_notes_batch, bulk_update_product_notes,
+                      add_ignored_siv_code, get_db_pool)
+from saveQueue import WriteBehindSaver
+from workLease import WorkLeases
+from workJournal import get_work_journal
+from metrics import get_metrics, start_metrics_exporter
+from webScrapeDescriptions import DODAVATELE, SCRAPE_ERROR_PREFIX, normalize_scrape_result, get_kosatec_path_stats
+from scrapeCache import get_scrape_cache
+from translationMemory import get_translation_memory
+from llmRateLimit import get_limiter_stats
+from llmRouter import routed_ai_response, get_router
+from logConfig import setup_logging, product_context
+from LLMTranslate import (get_ai_response, gemini_ai_response, build_translation_prompt, LLMError,
+                          translate_batch, estimate_tokens, get_token_stats, PROMPT_VERSION)
+
+logger = logging.getLogger(__name__)
+
+# Značka konce fronty - každé vlákno fáze si vezme jednu a skončí
+_STOP = object()
+
+PREKLADACE = {
+    "router": routed_ai_response,
+    "gemini": gemini_ai_response,
+    "together": get_ai_response,
+}
+
+
+class PipelineStats:
+    """Thread-safe počítadla průběhu dávky"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.started = time.time()
+
+    def inc(self, key, amount=1):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + amount
+        get_metrics().inc("pipeline_events_total", amount, event=key)
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.counts)
+        data["elapsed_s"] = round(time.time() - self.started, 2)
+        return data
+
+
+class _Stage:
+    """
+    Jedna fáze pipeline: `workers` vláken bere položky z in_queue, zpracuje je
+    funkcí `handler` a výsledek (pokud není None) pošle do out_queue.
+    Poslední doběhnuté vlákno pošle do další fáze značky _STOP.
+
+    S batch_tokens > 0 vlákno sbírá položky, dokud jejich odhad tokenů (funkce `cost`)
+    nepřekročí rozpočet nebo dokud fronta batch_wait sekund nic nepřinese;
+    handler pak dostane seznam položek a vrací seznam výsledků.
+
+    Když handler vyhodí výjimku, zavolá se on_error se SivCody položek, které tím skončily.
+    """
+
+    def __init__(self, name, handler, in_queue, out_queue, workers, next_workers,
+                 batch_tokens=0, cost=None, batch_wait=0.5, on_error=None):
+        self.name = name
+        self.handler = handler
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.workers = workers
+        self.next_workers = next_workers
+        self.batch_tokens = batch_tokens
+        self.cost = cost
+        self.batch_wait = batch_wait
+        self.on_error = on_error
+        self._alive = workers
+        self._lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _collect_batch(self, first):
+        """Doplní dávku z fronty; vrací (dávka, zda přišla značka _STOP)"""
+        batch, used = [first], self.cost(first)
+        while used < self.batch_tokens:
+            try:
+                item = self.in_queue.get(timeout=self.batch_wait)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            used += self.cost(item)
+        return batch, False
+
+    def _run(self):
+        try:
+            while True:
+                item = self.in_queue.get()
+                if item is _STOP:
+                    break
+
+                stop_seen = False
+                if self.batch_tokens:
+                    item, stop_seen = self._collect_batch(item)
+
+                try:
+                    if self.batch_tokens:
+                        result = self.handler(item)
+                    else:
+                        # Položky všech fází začínají SivCode → logy produktu jdou dohledat napříč fázemi
+                        with product_context(item[0]):
+                            result = self.handler(item)
+                except Exception as e:
+                    logger.error("Fáze %s selhala: %s", self.name, e, exc_info=True)
+                    result = None
+                    if self.on_error is not None:
+                        self.on_error([i[0] for i in item] if self.batch_tokens else [item[0]])
+
+                results = (result or []) if self.batch_tokens else [result]
+                for r in results:
+                    if r is not None and self.out_queue is not None:
+                        self.out_queue.put(r)
+                if stop_seen:
+                    break
+        finally:
+            with self._lock:
+                self._alive -= 1
+                last = self._alive == 0
+            if last and self.out_queue is not None:
+                for _ in range(self.next_workers):
+                    self.out_queue.put(_STOP)
+
+
+class BatchPipeline:
+    """
+    Headless varianta workflow z TranslationApp:
+    get_products → scrape (DODAVATELE) → překlad (LLM) → dávkové uložení (WriteBehindSaver)
+    """
+
+    def __init__(self, supplier_name, limit=None, page_size=50,
+                 scrape_workers=4, translate_workers=2, save_workers=1,
+                 queue_size=20, provider="router", batch_tokens=6000, dry_run=False,
+                 bulk_save=False, bulk_batch=1000, shard=None, replay_journal=True):
+        if supplier_name not in DODAVATELE:
+            raise ValueError(f"Neznámý dodavatel: {supplier_name}")
+
+        dodavatel = DODAVATELE[supplier_name]
+        self.supplier_name = supplier_name
+        self.supplier_code = dodavatel["kod"]
+        self.scrape_function = dodavatel["funkce"]
+        self.translate_function = PREKLADACE[provider]
+
+        self.limit = limit
+        self.page_size = page_size
+        self.scrape_workers = scrape_workers
+        self.translate_workers = translate_workers
+        self.save_workers = save_workers
+        self.batch_tokens = batch_tokens
+        self.dry_run = dry_run
+        # (index, počet) - proces zpracovává jen svou část katalogu (shardedRunner)
+        self.shard = shard
+
+        self.scrape_queue = queue.Queue(maxsize=queue_size)
+        self.translate_queue = queue.Queue(maxsize=queue_size)
+        self.save_queue = queue.Queue(maxsize=queue_size)
+
+        self.stats = PipelineStats()
+        self.metrics = get_metrics()
+        for name, stage_queue in (("scrape", self.scrape_queue), ("translate", self.translate_queue),
+                                  ("save", self.save_queue)):
+            self.metrics.gauge("queue_depth", stage_queue.qsize, queue=name)
+        # Žurnál stavů produktů (None = vypnutý): hotové překlady se znovu neplatí
+        self.journal = get_work_journal()
+        if dry_run:
+            self.saver = None
+            self.leases = None
+        else:
+            # Zabrané produkty (lease) se po uložení uvolní
+            self.leases = WorkLeases()
+            if bulk_save:
+                # Velké dávky přes staging tabulku (noční importy)
+                self.saver = WriteBehindSaver(self._bulk_save, batch_size=bulk_batch, flush_seconds=30,
+                                              on_flushed=self._saved)
+            else:
+                self.saver = WriteBehindSaver(update_product_notes_batch, on_flushed=self._saved)
+            # Potvrzené, ale neuložené překlady z minulého běhu (pád, přerušení)
+            if self.journal is not None and replay_journal:
+                self.journal.replay_pending(self.saver)
+
+        # Překladová paměť (None = vypnutá); počítadla se hlásí za tento běh
+        self.memory = get_translation_memory()
+        if self.memory is not None:
+            self.memory.reset_stats()
+
+    # ---------- Fáze 0: načítání práce z DB ----------
+    def _feed(self):
+        """Načítá stránky produktů z DB (keyset podle SivCode) a plní scrape frontu"""
+        fed = 0
+        after = None
+        try:
+            while self.limit is None or fed < self.limit:
+                if self.leases is not None:
+                    products = self.leases.fetch(self.supplier_code, limit=self.page_size, after=after,
+                                                 shard=self.shard)
+                else:
+                    products = get_products(self.supplier_code, limit=self.page_size, after=after,
+                                            shard=self.shard)
+                self.stats.inc("db_pages")
+
+                for row in products:
+                    if self.limit is not None and fed >= self.limit:
+                        break
+                    self.scrape_queue.put(row)
+                    fed += 1
+                    self.stats.inc("fed")
+
+                # Kratší stránka = konec katalogu (produkty před kurzorem už byly v tomto běhu)
+                if len(products) < self.page_size:
+                    break
+                after = products[-1][0]
+        finally:
+            for _ in range(self.scrape_workers):
+                self.scrape_queue.put(_STOP)
+
+    # ---------- Fáze 1: scrapování ----------
+    def _scrape(self, row):
+        siv_code = row[0]
+        original_html = self.journal.reuse_original(siv_code) if self.journal is not None else None
+        if original_html is not None:
+            # Originál už je v žurnálu z minulého běhu - neplatíme znovu scrape
+            self.stats.inc("scraped")
+            return siv_code, original_html
+        try:
+            with self.metrics.timer("scrape_seconds", supplier=self.supplier_name):
+                original_html, _, _ = normalize_scrape_result(self.scrape_function(siv_code))
+        except ValueError as e:
+            # Scraper hlásí nenalezený produkt přes ValueError → trvalé přeskočení
+            self._skip(siv_code, f"Scraper selhal: {e}", kind="not_found")
+            return None
+        except Exception as e:
+            self._scrape_failed(siv_code, f"Scraper selhal: {e}", kind="scrape_error")
+            return None
+
+        if original_html.startswith(SCRAPE_ERROR_PREFIX):
+            # Timeout, 5xx, výpadek spojení - produkt se vrátí v dalším běhu
+            self._scrape_failed(siv_code, original_html.strip(), kind="page_error")
+            return None
+        if not original_html.strip():
+            self._skip(siv_code, "Prázdný originál", kind="empty_original")
+            return None
+
+        if self.journal is not None:
+            self.journal.record_scraped(self.supplier_code, siv_code, original_html)
+        self.stats.inc("scraped")
+        return siv_code, original_html
+
+    # ---------- Fáze 2: překlad ----------
+    def _journal_translation(self, siv_code):
+        """Překlad ze žurnálu (aktuální verze promptu), nebo None"""
+        if self.journal is None:
+            return None
+        return self.journal.reuse_translation(siv_code)
+
+    def _translate(self, item):
+        siv_code, original_html = item
+        translated = self._journal_translation(siv_code)
+        if translated:
+            self.stats.inc("translated")
+            return siv_code, translated
+        try:
+            with self.metrics.timer("translate_seconds", supplier=self.supplier_name, mode="single"):
+                if self.memory is not None:
+                    translated = self.memory.translate_html(original_html, self.translate_function,
+                                                            fallback_function=self._translate_whole)
+                else:
+                    translated = self._translate_whole(original_html)
+        except LLMError as e:
+            # Chybu LLM neignorujeme trvale - produkt se vrátí v dalším běhu
+            logger.warning("Překlad produktu selhal: %s", e)
+            self.stats.inc("translate_errors")
+            self.metrics.inc("translate_errors_total", supplier=self.supplier_name, reason="llm_error")
+            self._release(siv_code)
+            return None
+        if not translated:
+            logger.warning("Překlad produktu je prázdný")
+            self.stats.inc("translate_errors")
+            self.metrics.inc("translate_errors_total", supplier=self.supplier_name, reason="empty")
+            self._release(siv_code)
+            return None
+
+        if self.journal is not None:
+            self.journal.record_translated(siv_code, translated)
+        self.stats.inc("translated")
+        return siv_code, translated
+
+    def _translate_whole(self, original_html):
+        return self.translate_function(build_translation_prompt(original_html))
+
+    def _translate_batch(self, items):
+        """Dávkový překlad více produktů (jen s --batch-tokens > 0)"""
+        results = []
+        pending = []
+        for siv_code, original_html in items:
+            translated = self._journal_translation(siv_code)
+            if translated:
+                self.stats.inc("translated")
+                results.append((siv_code, translated))
+            else:
+                pending.append((siv_code, original_html))
+        if not pending:
+            return results
+        items = pending
+
+        with self.metrics.timer("translate_seconds", supplier=self.supplier_name, mode="batch"):
+            if self.memory is not None:
+                try:
+                    translated = self.memory.translate_many([html for _, html in items], self.translate_function,
+                                                            fallback_function=self._translate_whole)
+                    translations = {siv_code: text for (siv_code, _), text in zip(items, translated)}
+                except LLMError as e:
+                    logger.warning("Překlad dávky selhal: %s", e)
+                    translations = {}
+            else:
+                translations = translate_batch(items, self.translate_function, token_budget=self.batch_tokens)
+        self.stats.inc("translate_batches")
+
+        for siv_code, _ in items:
+            text = translations.get(siv_code)
+            if not text:
+                logger.warning("Překlad produktu %s selhal", siv_code, extra={"siv_code": siv_code})
+                self.stats.inc("translate_errors")
+                self.metrics.inc("translate_errors_total", supplier=self.supplier_name, reason="batch_missing")
+                self._release(siv_code)
+                continue
+            if self.journal is not None:
+                self.journal.record_translated(siv_code, text)
+            self.stats.inc("translated")
+            results.append((siv_code, text))
+        return results
+
+    # ---------- Fáze 3: uložení ----------
+    def _save(self, item):
+        siv_code, translated = item
+        if self.dry_run:
+            logger.info("(dry-run) Překlad neukládám")
+        else:
+            if self.journal is not None:
+                self.journal.record_confirmed(siv_code, translated, supplier=self.supplier_code)
+            self.saver.put(siv_code, translated)
+        self.stats.inc("saved")
+        return None
+
+    @staticmethod
+    def _bulk_save(notes):
+        try:
+            return bulk_update_product_notes(notes)
+        except Exception as e:
+            # Transakce se vrátila celá → uložíme stejnou dávku klasickým UPDATE
+            logger.error("Hromadný import přes staging tabulku selhal: %s", e, exc_info=True)
+            return update_product_notes_batch(notes)
+
+    def _saved(self, notes, latency, result):
+        """Dávka je v DB - produkty už nemusí být zabrané"""
+        if self.journal is not None:
+            self.journal.record_flush(notes, result)
+        self.leases.release(siv_code for siv_code, _ in notes)
+
+    def _release(self, siv_code):
+        if self.leases is not None:
+            self.leases.release([siv_code])
+
+    def _stage_failed(self, siv_codes):
+        """Fáze spadla na výjimce - produkty se uvolní, jinak by je obnova leasů držela do konce běhu"""
+        if self.leases is None:
+            return
+        try:
+            self.leases.release(siv_codes)
+        except Exception as e:
+            logger.warning("Uvolnění leasů %s selhalo: %s", siv_codes, e)
+
+    def _scrape_failed(self, siv_code, reason, kind):
+        """Přechodná chyba scrapu: produkt se neignoruje, jen uvolní pro další běh"""
+        logger.warning("Scrape produktu %s selhal: %s", siv_code, reason, extra={"siv_code": siv_code})
+        self.stats.inc("scrape_errors")
+        self.metrics.inc("scrape_errors_total", supplier=self.supplier_name, reason=kind)
+        self._release(siv_code)
+
+    def _skip(self, siv_code, reason, kind):
+        """Produkt se trvale ignoruje; kind = krátký důvod pro metriky (reason je celý text)"""
+        logger.warning("Přeskakuji produkt %s: %s", siv_code, reason, extra={"siv_code": siv_code})
+        self.stats.inc("skipped")
+        self.metrics.inc("products_skipped_total", supplier=self.supplier_name, reason=kind)
+        if not self.dry_run:
+            add_ignored_siv_code(self.supplier_code, siv_code, reason=reason)
+        self._release(siv_code)
+
+    def run(self):
+        """Spustí celou dávku a počká na její dokončení. Vrací slovník statistik."""
+        logger.info("Dávka pro dodavatele %s (%s), limit=%s, workers=%d/%d/%d", self.supplier_name, self.supplier_code,
+                    self.limit, self.scrape_workers, self.translate_workers, self.save_workers)
+
+        stages = [
+            _Stage("scrape", self._scrape, self.scrape_queue, self.translate_queue,
+                   self.scrape_workers, self.translate_workers, on_error=self._stage_failed),
+            _Stage("translate",
+                   self._translate_batch if self.batch_tokens else self._translate,
+                   self.translate_queue, self.save_queue,
+                   self.translate_workers, self.save_workers,
+                   batch_tokens=self.batch_tokens,
+                   cost=lambda item: estimate_tokens(item[1]),
+                   on_error=self._stage_failed),
+            _Stage("save", self._save, self.save_queue, None,
+                   self.save_workers, 0, on_error=self._stage_failed),
+        ]
+        for stage in stages:
+            stage.start()
+
+        feeder = threading.Thread(target=self._feed, name="feed", daemon=True)
+        feeder.start()
+
+        feeder.join()
+        for stage in stages:
+            for t in stage.threads:
+                t.join()
+        if self.saver is not None:
+            # Zapíše poslední neúplnou dávku
+            self.saver.close()
+        if self.leases is not None:
+            self.leases.close()
+
+        stats = self.stats.snapshot()
+        kosatec_paths = get_kosatec_path_stats()
+        if kosatec_paths:
+            stats["kosatec_paths"] = kosatec_paths
+        cache = get_scrape_cache()
+        if cache:
+            stats["scrape_cache"] = cache.stats()
+        if self.memory is not None:
+            stats["translation_memory"] = self.memory.stats()
+        if self.saver is not None:
+            stats["save_queue"] = self.saver.stats()
+        if self.leases is not None:
+            stats["work_leases"] = self.leases.stats()
+        if self.journal is not None:
+            stats["work_journal"] = self.journal.stats()
+        stats["db_pool"] = get_db_pool().stats()
+        stats["llm_limits"] = get_limiter_stats()
+        stats["prompt_version"] = PROMPT_VERSION
+        stats["llm_tokens"] = get_token_stats()
+        if self.translate_function is routed_ai_response:
+            stats["llm_routes"] = get_router().stats()
+        logger.info("Dávka dokončena: %s", stats)
+        return stats
+
+
+def build_arg_parser(description="Dávkový překlad produktových popisků bez GUI"):
+    """Argumenty dávky (sdílí je i shardedRunner)"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--dodavatel", required=True, choices=list(DODAVATELE.keys()),
+                        help="Název dodavatele ze slovníku DODAVATELE")
+    parser.add_argument("--limit", type=int, default=None, help="Maximální počet produktů (default: vše)")
+    parser.add_argument("--page-size", type=int, default=50, help="Počet produktů načtených z DB najednou")
+    parser.add_argument("--scrape-workers", type=int, default=4)
+    parser.add_argument("--translate-workers", type=int, default=2)
+    parser.add_argument("--save-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=20, help="Kapacita front mezi fázemi")
+    parser.add_argument("--provider", choices=list(PREKLADACE.keys()), default="router",
+                        help="router = Gemini i Together s hedgingem a failoverem")
+    parser.add_argument("--batch-tokens", type=int, default=6000,
+                        help="Rozpočet tokenů na jeden LLM požadavek s více produkty (0 = produkt po produktu)")
+    parser.add_argument("--dry-run", action="store_true", help="Nic neukládat do DB ani do ignore listu")
+    parser.add_argument("--bulk-save", action="store_true",
+                        help="Ukládat velké dávky přes staging tabulku (noční importy)")
+    parser.add_argument("--bulk-batch", type=int, default=1000, help="Počet překladů v jedné dávce --bulk-save")
+    return parser
+
+
+def pipeline_kwargs(args):
+    """Parametry BatchPipeline z naparsovaných argumentů"""
+    return dict(
+        limit=args.limit,
+        page_size=args.page_size,
+        scrape_workers=args.scrape_workers,
+        translate_workers=args.translate_workers,
+        save_workers=args.save_workers,
+        queue_size=args.queue_size,
+        provider=args.provider,
+        batch_tokens=args.batch_tokens,
+        dry_run=args.dry_run,
+        bulk_save=args.bulk_save,
+        bulk_batch=args.bulk_batch,
+    )
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    setup_logging()
+    start_metrics_exporter()
+    pipeline = BatchPipeline(args.dodavatel, **pipeline_kwargs(args))
+    pipeline.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,579 @@
+"""
+Offline benchmark dávkového workflow (scrape → překlad → uložení) bez produkčních služeb.
+
+- lokální HTTP server servíruje nahrané stránky api.de / Kosatec z benchFixtures/
+  (scrapery na něj míří přes API_BASE_URL / KOSATEC_BASE_URL)
+- LLM nahrazuje FakeLLMProvider s profilem latence, chybovosti a throttlingu
+  (FAKE_LLM_PROFILES); volá se přes stejný router, rate limiter a retry jako produkce
+- DB nahrazuje LocalProductStore v paměti (get_products, update_product_notes_batch, ...)
+
+Měří latenci jednotlivých fází a celého průchodu produktu (p50/p90/p99) a propustnost.
+Výsledek se zapíše do JSON; s --baseline se porovná s předchozím během a při zhoršení
+nad --tolerance skončí s kódem 1.
+
+Použití:
+    python benchmark.py --products 500 --llm-profile realistic --output bench.json
+    python benchmark.py --products 500 --llm-profile realistic --baseline bench.json
+    python benchmark.py --dodavatel kosatec --llm-profile throttled --batch-tokens 0
+    python benchmark.py --parse-only --products 2000 --output parse.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from logConfig import setup_logging
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchFixtures")
+# Stránky api.de se špatným HTML, které libxml2 opravuje jinak než html.parser
+PARSER_CASES_DIR = os.path.join(FIXTURES_DIR, "api_parser_cases")
+
+# Profily falešného LLM:
+# latence = (base + per_1k_tokens * tokeny/1000) * log-normální jitter
+# error_rate = podíl požadavků, které skončí 503; rpm = kvóta "serveru", nad ní vrací 429
+FAKE_LLM_PROFILES = {
+    "instant": dict(base=0.0, per_1k_tokens=0.0, jitter=0.0, error_rate=0.0, rpm=0),
+    "fast": dict(base=0.05, per_1k_tokens=0.02, jitter=0.2, error_rate=0.0, rpm=0),
+    "realistic": dict(base=0.8, per_1k_tokens=1.5, jitter=0.35, error_rate=0.02, rpm=0),
+    "flaky": dict(base=0.8, per_1k_tokens=1.5, jitter=0.5, error_rate=0.15, rpm=0),
+    "throttled": dict(base=0.5, per_1k_tokens=1.0, jitter=0.3, error_rate=0.0, rpm=60),
+}
+
+SUPPLIERS = {
+    "api": "api",
+    "kosatec": "Kosatec (selenium)",
+}
+
+_DETAIL_RE = re.compile(r"-artikel-(\d+)$")
+
+
+def percentiles(samples):
+    """Souhrn latencí v ms (počet, průměr, p50/p90/p99, max)"""
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+
+    def pick(q):
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+        "p50_ms": pick(0.5),
+        "p90_ms": pick(0.9),
+        "p99_ms": pick(0.99),
+        "max_ms": round(samples[-1] * 1000, 2),
+    }
+
+
+class LatencyRecorder:
+    """Thread-safe sběr latencí a chyb podle názvu fáze"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def error(self, name):
+        with self._lock:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def timed(self, name, function):
+        """Obalí funkci měřením latence (výjimky se počítají a propadají dál)"""
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                self.error(name)
+                raise
+            finally:
+                self.add(name, time.monotonic() - start)
+        return wrapper
+
+    def summary(self, elapsed):
+        with self._lock:
+            names = set(self.samples) | set(self.errors)
+            data = {}
+            for name in sorted(names):
+                stage = percentiles(self.samples.get(name, []))
+                stage["errors"] = self.errors.get(name, 0)
+                stage["per_s"] = round(stage["count"] / elapsed, 2) if elapsed else 0.0
+                data[name] = stage
+        return data
+
+
+# ---------- Stand-in dodavatelských webů ----------
+class FixtureServer:
+    """Lokální HTTP server s nahranými stránkami; {{PNUMBER}} se nahradí číslem z URL"""
+
+    def __init__(self, page_latency=0.0, fixtures_dir=FIXTURES_DIR):
+        self.page_latency = page_latency
+        self.pages = {}
+        for name in ("api_product", "kosatec_search", "kosatec_detail"):
+            with open(os.path.join(fixtures_dir, f"{name}.html"), encoding="utf-8") as f:
+                self.pages[name] = f.read()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fixture-server", daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def render(self, path, query):
+        """Vrací HTML stránky pro cestu, nebo None (404)"""
+        if path.startswith("/product/details/"):
+            pnumber = path.rsplit("/", 1)[-1]
+            return self.pages["api_product"].replace("{{PNUMBER}}", pnumber)
+        if path == "/factfinder/result":
+            pnumber = (query.get("query") or [""])[0]
+            # Druhá karta ve výsledcích patří jinému produktu (scraper musí vybrat správnou)
+            other = str(int(pnumber) + 1) if pnumber.isdigit() else "0"
+            return self.pages["kosatec_search"].replace("{{PNUMBER}}", pnumber).replace("{{OTHER}}", other)
+        m = _DETAIL_RE.search(path)
+        if m:
+            return self.pages["kosatec_detail"].replace("{{PNUMBER}}", m.group(1))
+        return None
+
+    def _handle(self, handler):
+        with self._lock:
+            self.requests += 1
+        if self.page_latency:
+            time.sleep(self.page_latency)
+        url = urlparse(handler.path)
+        html = self.render(url.path, parse_qs(url.query))
+        body = (html or "Not Found").encode("utf-8")
+        handler.send_response(200 if html is not None else 404)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+# ---------- Stand-in LLM ----------
+class FakeLLMProvider:
+    """
+    Falešný LLM provider se stejným rozhraním jako TogetherProvider/GeminiProvider.
+    "Překlad" vrací vstup beze změny ve formátu, který čeká volající (HTML, JSON pole
+    segmentů, dávka se značkami), takže zbytek pipeline běží jako s opravdovým modelem.
+    """
+
+    name = "fake"
+    default_model = "fake-echo"
+
+    def __init__(self, profile="fast", seed=None, recorder=None):
+        self.profile_name = profile
+        self.profile = FAKE_LLM_PROFILES[profile]
+        self.recorder = recorder
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = deque()
+        self.counters = {"requests": 0, "errors": 0, "throttled": 0}
+
+    def _inc(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    @staticmethod
+    def _response(prompt):
+        from LLMTranslate import split_prompt
+
+        _, user = split_prompt(prompt)
+        head, marker, segments = user.partition("Segmenty k překladu:\n\n")
+        if marker:
+            return json.dumps(json.loads(segments), ensure_ascii=False)
+        head, marker, products = user.partition("Produkty k překladu:\n\n")
+        if marker:
+            return products
+        return user
+
+    def _admit(self):
+        """Kvóta "serveru" za poslední minutu; nad ní požadavek dostane 429"""
+        from LLMTranslate import LLMError
+
+        rpm = self.profile["rpm"]
+        if not rpm:
+            return
+        now = time.monotonic()
+        with self._lock:
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            if len(self._window) >= rpm:
+                self.counters["throttled"] += 1
+                raise LLMError("429 rate limit exceeded (fake)", provider=self.name, status=429, retryable=True)
+            self._window.append(now)
+
+    def _latency(self, tokens):
+        profile = self.profile
+        latency = profile["base"] + profile["per_1k_tokens"] * tokens / 1000
+        with self._lock:
+            jitter = self._random.lognormvariate(0, profile["jitter"]) if profile["jitter"] else 1.0
+            failed = self._random.random() < profile["error_rate"]
+        return latency * jitter, failed
+
+    def complete(self, prompt, model=None, timeout=None):
+        from LLMTranslate import LLMError, split_prompt, estimate_tokens, record_token_usage
+
+        self._inc("requests")
+        self._admit()
+        system, user = split_prompt(prompt)
+        prompt_tokens = (estimate_tokens(system) if system else 0) + estimate_tokens(user)
+        latency, failed = self._latency(prompt_tokens * 2)
+        start = time.monotonic()
+        time.sleep(latency)
+        if self.recorder is not None:
+            self.recorder.add("llm_service", time.monotonic() - start)
+        if failed:
+            self._inc("errors")
+            raise LLMError("503 service unavailable (fake)", provider=self.name, status=503, retryable=True)
+        text = self._response(prompt)
+        record_token_usage(self.name, model or self.default_model, prompt_tokens, estimate_tokens(text))
+        return text
+
+    def stream(self, prompt, model=None, timeout=None):
+        text = self.complete(prompt, model=model, timeout=timeout)
+        for i in range(0, len(text), 200):
+            yield text[i:i + 200]
+
+    async def acomplete(self, prompt, model=None, timeout=None):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, lambda: self.complete(prompt, model=model, timeout=timeout))
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+# ---------- Stand-in databáze ----------
+class LocalProductStore:
+    """
+    Produkty dodavatele v paměti se stejnými funkcemi jako database.py.
+    Zápis trvá flush_latency + row_latency * počet řádků (simulace round-tripu a UPDATE).
+    """
+
+    def __init__(self, siv_codes, flush_latency=0.005, row_latency=0.0002, recorder=None):
+        self.siv_codes = sorted(siv_codes)
+        self.flush_latency = flush_latency
+        self.row_latency = row_latency
+        self.recorder = recorder
+        self.notes = {}
+        self.ignored = {}
+        self.fetched_at = {}
+        self.saved_at = {}
+        self._lock = threading.Lock()
+        self.counters = {"pages": 0, "flushes": 0}
+
+    def get_products(self, supplier_code, limit=20, after=None, shard=None):
+        now = time.monotonic()
+        with self._lock:
+            self.counters["pages"] += 1
+            rows = []
+            for code in self.siv_codes:
+                if after is not None and code <= after:
+                    continue
+                if code in self.notes or code in self.ignored:
+                    continue
+                if shard is not None and zlib.crc32(code.encode()) % shard[1] != shard[0]:
+                    continue
+                rows.append((code, f"Produkt {code}", code, "Skener", f"PN-{code}"))
+                self.fetched_at.setdefault(code, now)
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    def _write(self, notes):
+        time.sleep(self.flush_latency + self.row_latency * len(notes))
+        now = time.monotonic()
+        with self._lock:
+            self.counters["flushes"] += 1
+            for siv_code, note_text in notes:
+                self.notes[siv_code] = note_text
+                self.saved_at[siv_code] = now
+                if self.recorder is not None and siv_code in self.fetched_at:
+                    self.recorder.add("end_to_end", now - self.fetched_at[siv_code])
+
+    def update_product_notes_batch(self, notes):
+        self._write(notes)
+        return {"failed": 0, "failed_codes": []}
+
+    def bulk_update_product_notes(self, notes):
+        self._write(notes)
+        return {"applied": len(notes), "unchanged": 0, "missing": 0, "missing_codes": []}
+
+    def add_ignored_siv_code(self, supplier_code, siv_code, reason=None):
+        with self._lock:
+            self.ignored[siv_code] = reason
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+            data["saved"] = len(self.notes)
+            data["ignored"] = len(self.ignored)
+        return data
+
+
+def run_benchmark(args):
+    """Spustí stand-iny a jeden BatchPipeline nad nimi; vrací slovník výsledků"""
+    server = FixtureServer(page_latency=args.page_latency_ms / 1000).start()
+
+    # Moduly pipeline čtou konfiguraci při importu → env se nastaví dřív, než se načtou
+    os.environ["API_BASE_URL"] = server.base_url
+    os.environ["KOSATEC_BASE_URL"] = server.base_url
+    os.environ["LLM_ROUTES"] = FakeLLMProvider.name
+    os.environ["WORK_LEASE"] = "0"
+    os.environ["WORK_JOURNAL"] = "0"
+    os.environ["SCRAPE_CACHE"] = "0"
+    os.environ["TRANSLATION_MEMORY"] = "1" if args.translation_memory else "0"
+    if args.translation_memory:
+        os.environ["TRANSLATION_MEMORY_PATH"] = args.translation_memory
+    # Klientský limiter nesmí brzdit víc než kvóta falešného serveru
+    os.environ.setdefault("LLM_RPM_FAKE", "100000")
+    os.environ.setdefault("LLM_TPM_FAKE", "100000000")
+    os.environ.setdefault("LLM_CONCURRENCY_FAKE", "16")
+
+    from LLMTranslate import register_provider
+    recorder = LatencyRecorder()
+    provider = FakeLLMProvider(args.llm_profile, seed=args.seed, recorder=recorder)
+    register_provider(provider)
+
+    import batchPipeline
+    import workLease
+    from metrics import get_metrics
+
+    siv_codes = [str(args.first_code + i) for i in range(args.products)]
+    store = LocalProductStore(siv_codes, flush_latency=args.db_flush_ms / 1000,
+                              row_latency=args.db_row_ms / 1000, recorder=recorder)
+    # Benchmark běží jako samostatný proces, takže DB funkce stačí přepsat na úrovni modulů
+    batchPipeline.get_products = store.get_products
+    batchPipeline.update_product_notes_batch = store.update_product_notes_batch
+    batchPipeline.bulk_update_product_notes = store.bulk_update_product_notes
+    batchPipeline.add_ignored_siv_code = store.add_ignored_siv_code
+    batchPipeline.get_db_pool = lambda: store
+    workLease.get_products = store.get_products
+
+    pipeline = batchPipeline.BatchPipeline(
+        SUPPLIERS[args.dodavatel],
+        limit=args.products,
+        page_size=args.page_size,
+        scrape_workers=args.scrape_workers,
+        translate_workers=args.translate_workers,
+        save_workers=args.save_workers,
+        queue_size=args.queue_size,
+        provider="router",
+        batch_tokens=args.batch_tokens,
+        bulk_save=args.bulk_save,
+    )
+    pipeline.scrape_function = recorder.timed("scrape", pipeline.scrape_function)
+    pipeline.translate_function = recorder.timed("translate", pipeline.translate_function)
+    store._write = recorder.timed("save", store._write)
+
+    started = time.monotonic()
+    try:
+        stats = pipeline.run()
+    finally:
+        server.close()
+    elapsed = time.monotonic() - started
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "dodavatel": args.dodavatel,
+            "products": args.products,
+            "llm_profile": args.llm_profile,
+            "seed": args.seed,
+            "batch_tokens": args.batch_tokens,
+            "bulk_save": args.bulk_save,
+            "translation_memory": bool(args.translation_memory),
+            "workers": [args.scrape_workers, args.translate_workers, args.save_workers],
+            "page_size": args.page_size,
+            "db_flush_ms": args.db_flush_ms,
+            "db_row_ms": args.db_row_ms,
+            "page_latency_ms": args.page_latency_ms,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "products_per_s": round(stats.get("saved", 0) / elapsed, 2) if elapsed else 0.0,
+        "stages": recorder.summary(elapsed),
+        "fake_llm": provider.stats(),
+        "fixture_requests": server.requests,
+        "store": store.stats(),
+        "pipeline": stats,
+        "metrics": get_metrics().snapshot(),
+    }
+
+
+def run_parse_benchmark(args):
+    """
+    Mikro-benchmark parseru detailu api.de: stejné stránky z benchFixtures/ projdou
+    původní cestou (BeautifulSoup) i výchozí (lxml, pokud je nainstalované).
+    Výstupy se musí shodovat; latence na stránku jdou do "stages" (parse_soup/parse_default).
+    Navíc se obě cesty porovnají na stránkách z benchFixtures/api_parser_cases/ ("case_mismatches").
+    """
+    from webScrapeDescriptions import parse_api_product_html, _parse_api_product_soup, etree
+
+    with open(os.path.join(FIXTURES_DIR, "api_product.html"), encoding="utf-8") as f:
+        template = f.read()
+    # Stránky jako response.content (bytes), každá s jiným číslem produktu
+    pages = [template.replace("{{PNUMBER}}", str(args.first_code + i)).encode("utf-8")
+             for i in range(args.products)]
+    engines = {"parse_soup": _parse_api_product_soup, "parse_default": parse_api_product_html}
+
+    samples = {name: [] for name in engines}
+    outputs = {name: [] for name in engines}
+    elapsed = {}
+    for name, function in engines.items():
+        function(pages[0])
+        started = time.perf_counter()
+        for page in pages:
+            start = time.perf_counter()
+            outputs[name].append(function(page))
+            samples[name].append(time.perf_counter() - start)
+        elapsed[name] = time.perf_counter() - started
+
+    mismatches = sum(1 for old, new in zip(outputs["parse_soup"], outputs["parse_default"]) if old != new)
+    case_mismatches = []
+    for name in sorted(os.listdir(PARSER_CASES_DIR)):
+        with open(os.path.join(PARSER_CASES_DIR, name), encoding="utf-8") as f:
+            page = f.read().replace("{{PNUMBER}}", str(args.first_code)).replace("{{NUL}}", "\x00")
+        page = page.encode("utf-8")
+        if _parse_api_product_soup(page) != parse_api_product_html(page):
+            case_mismatches.append(name)
+    stages = {name: percentiles(values) for name, values in samples.items()}
+    soup_p50, default_p50 = stages["parse_soup"]["p50_ms"], stages["parse_default"]["p50_ms"]
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"parse_only": True, "pages": len(pages), "lxml": etree is not None},
+        "elapsed_s": round(elapsed["parse_default"], 3),
+        "products_per_s": round(len(pages) / elapsed["parse_default"], 2) if elapsed["parse_default"] else 0.0,
+        "stages": stages,
+        "speedup_p50": round(soup_p50 / default_p50, 2) if default_p50 else None,
+        "mismatches": mismatches,
+        "case_mismatches": case_mismatches,
+    }
+
+
+def compare(result, baseline, tolerance=0.1):
+    """
+    Porovná výsledek s baseline. Vrací seznam zhoršení (text) - latence p50/p90 fází
+    vyšší nebo propustnost nižší o víc než `tolerance` (poměr).
+    """
+    regressions = []
+    old, new = baseline.get("products_per_s", 0), result.get("products_per_s", 0)
+    if old:
+        change = (new - old) / old
+        logger.info("Propustnost: %s → %s produktů/s (%+.1f %%)", old, new, change * 100)
+        if change < -tolerance:
+            regressions.append(f"propustnost {old} → {new} produktů/s ({change:+.1%})")
+
+    for name, stage in sorted(result.get("stages", {}).items()):
+        base_stage = baseline.get("stages", {}).get(name)
+        if not base_stage:
+            continue
+        for key in ("p50_ms", "p90_ms"):
+            old, new = base_stage.get(key), stage.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            logger.info("%s %s: %s → %s (%+.1f %%)", name, key, old, new, change * 100)
+            if change > tolerance:
+                regressions.append(f"{name} {key} {old} → {new} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark scrape → překlad → uložení")
+    parser.add_argument("--dodavatel", choices=list(SUPPLIERS), default="api")
+    parser.add_argument("--products", type=int, default=200, help="Počet produktů v lokální DB")
+    parser.add_argument("--first-code", type=int, default=400000, help="První SivCode (čísla jdou po sobě)")
+    parser.add_argument("--llm-profile", choices=list(FAKE_LLM_PROFILES), default="fast")
+    parser.add_argument("--seed", type=int, default=1, help="Seed jitteru a chyb falešného LLM")
+    parser.add_argument("--page-latency-ms", type=float, default=0.0, help="Zpoždění lokálního webu na stránku")
+    parser.add_argument("--db-flush-ms", type=float, default=5.0, help="Latence jednoho zápisu do DB")
+    parser.add_argument("--db-row-ms", type=float, default=0.2, help="Latence na řádek zápisu do DB")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--scrape-workers", type=int, default=4)
+    parser.add_argument("--translate-workers", type=int, default=2)
+    parser.add_argument("--save-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=20)
+    parser.add_argument("--batch-tokens", type=int, default=6000)
+    parser.add_argument("--bulk-save", action="store_true")
+    parser.add_argument("--translation-memory", metavar="PATH", default=None,
+                        help="Zapnout překladovou paměť s databází v PATH (default: vypnutá)")
+    parser.add_argument("--output", default="bench_results.json", help="Kam zapsat výsledky (JSON)")
+    parser.add_argument("--baseline", default=None, help="Výsledky předchozího běhu k porovnání")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Povolené zhoršení proti baseline (0.1 = 10 %%)")
+    parser.add_argument("--parse-only", action="store_true",
+                        help="Jen mikro-benchmark parseru stránky api.de (--products stránek, bez sítě)")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    result = run_parse_benchmark(args) if args.parse_only else run_benchmark(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+    logger.info("Výsledky benchmarku zapsány do %s: %s produktů/s za %s s",
+                args.output, result["products_per_s"], result["elapsed_s"])
+    if args.parse_only:
+        logger.info("Parser api.de: p50 %s ms (BeautifulSoup) → %s ms (výchozí), zrychlení %sx",
+                    result["stages"]["parse_soup"]["p50_ms"], result["stages"]["parse_default"]["p50_ms"],
+                    result["speedup_p50"])
+        if result["mismatches"]:
+            logger.error("Výstup parseru se liší od BeautifulSoup u %d stránek", result["mismatches"])
+            return 1
+        if result["case_mismatches"]:
+            logger.error("Výstup parseru se liší od BeautifulSoup u %s", ", ".join(result["case_mismatches"]))
+            return 1
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, tolerance=args.tolerance)
+        if regressions:
+            for line in regressions:
+                logger.warning("Zhoršení proti baseline: %s", line)
+            return 1
+        logger.info("Bez zhoršení proti baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
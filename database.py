@@ -1,45 +1,42 @@
 import pyodbc
 import os
+import atexit
+import logging
+import threading
 from tabulate import tabulate
-import json
+from dotenv import load_dotenv
 
-IGNORE_FILE = "ignoreSivCode.json"
+from dbPool import ConnectionPool, is_disconnect_error
+from ignoreStore import get_ignore_store
+from metrics import get_metrics
 
-def add_ignored_siv_code(supplier_code, siv_code):
+# Načtení proměnných z .env souboru (jednou při importu, ne při každém spojení)
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+def add_ignored_siv_code(supplier_code, siv_code, reason=None):
     """
-    Přidá daný SivCode (PNumber) do ignoreSivCode.json pod klíč dodavatele.
-    Vytvoří soubor pokud neexistuje, hodnoty udržuje jako unikátní seznam stringů.
+    Přidá daný SivCode (PNumber) mezi ignorované kódy dodavatele.
+    Args:
+        supplier_code: kód dodavatele
+        siv_code: kód produktu
+        reason: proč se produkt ignoruje (chyba scraperu, přeskočeno uživatelem, ...)
     """
     try:
-        data = {}
-        if os.path.exists(IGNORE_FILE):
-            with open(IGNORE_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f) or {}
-
-        key = str(supplier_code)
-        values = set(map(str, data.get(key, [])))
-        values.add(str(siv_code))
-        data[key] = sorted(values)
-
-        with open(IGNORE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-
-        print(f"[INFO] Přidán ignorovaný kód {siv_code} pro dodavatele {supplier_code}")
+        if get_ignore_store().add(supplier_code, siv_code, reason):
+            logger.info("Přidán ignorovaný kód %s pro dodavatele %s", siv_code, supplier_code,
+                        extra={"siv_code": siv_code})
     except Exception as e:
-        print(f"[WARNING] Nepodařilo se zapsat do {IGNORE_FILE}: {e}")
+        logger.warning("Nepodařilo se zapsat ignorovaný kód %s: %s", siv_code, e, extra={"siv_code": siv_code})
 
 def get_ignored_siv_codes(supplier_code):
-    """Načte ignorované SivCodes pro daného dodavatele ze souboru"""
-    if not os.path.exists(IGNORE_FILE):
-        return []
-
+    """Vrátí množinu ignorovaných SivCodes pro daného dodavatele (z paměti)"""
     try:
-        with open(IGNORE_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get(str(supplier_code), [])
+        return get_ignore_store().codes(supplier_code)
     except Exception as e:
-        print(f"[WARNING] Chyba při čtení {IGNORE_FILE}: {e}")
-        return []
+        logger.warning("Chyba při čtení ignorovaných kódů: %s", e)
+        return set()
 
 def get_suppliers():
     """Vrátí seznam dostupných dodavatelů"""
@@ -47,42 +44,229 @@ def get_suppliers():
             #("jeho kod", "další dodavatel")
             ]
 
-def get_products(supplier_code, limit=20):
-    """Načte produkty pro překlad s vynecháním ignorovaných SivCodes"""
-    conn = connect_to_db()
-    cursor = conn.cursor()
+# Ignorované kódy nahrané do #IgnoredCodes jednotlivých (poolovaných) spojení:
+# id(conn) -> (supplier_code, set kódů). Temp tabulka žije se session, takže se při dalším
+# volání na stejném spojení dohrají jen nově ignorované kódy.
+_session_ignored = {}
+_session_ignored_lock = threading.Lock()
+
+def _sync_ignored_codes(conn, cursor, supplier_code, table):
+    """Zajistí, že #IgnoredCodes na tomto spojení obsahuje všechny ignorované kódy dodavatele"""
+    ignored = get_ignored_siv_codes(supplier_code)
+    with _session_ignored_lock:
+        state = _session_ignored.get(id(conn))
+    exists = cursor.execute("SELECT OBJECT_ID('tempdb..#IgnoredCodes')").fetchone()[0] is not None
+
+    created = not exists or state is None or state[0] != str(supplier_code)
+    if created:
+        if exists:
+            cursor.execute("DROP TABLE #IgnoredCodes")
+        # Sloupec se stejným typem i kolací jako SivCode → JOIN bez konverzí, seek přes index
+        cursor.execute(f"SELECT TOP 0 SivCode INTO #IgnoredCodes FROM {table}")
+        cursor.execute("CREATE UNIQUE CLUSTERED INDEX IX_IgnoredCodes ON #IgnoredCodes (SivCode) "
+                       "WITH (IGNORE_DUP_KEY = ON)")
+        state = (str(supplier_code), set())
+
+    missing = ignored - state[1]
+    if missing:
+        cursor.fast_executemany = True
+        cursor.executemany("INSERT INTO #IgnoredCodes (SivCode) VALUES (?)", [(code,) for code in missing])
+        cursor.fast_executemany = False
+        state[1].update(missing)
+    if created or missing:
+        # Temp tabulka přežije rollback při vrácení spojení do poolu jen po commitu
+        conn.commit()
+    with _session_ignored_lock:
+        _session_ignored[id(conn)] = state
+
+def _fetch_products(cursor, supplier_code, limit, after, exclude_leased=False, shard=None):
+    """
+    Společný SELECT stránky produktů pro get_products i claim_products.
+    #IgnoredCodes musí být na spojení už synchronizovaná (_sync_ignored_codes).
+    """
+    table = os.getenv('DB_TABLE', '')
+
+    # Dvě varianty dotazu místo "? IS NULL OR ...", aby predikát na SivCode zůstal sargable
+    params = [limit, supplier_code]
+    after_clause = ""
+    if after is not None:
+        after_clause = "AND siv.SivCode > ?"
+        params.append(after)
+    shard_clause = ""
+    if shard is not None:
+        # Rozdělení katalogu mezi procesy podle hashe SivCode (počítá server → stejné všude)
+        # (maska místo ABS - ABS(-2147483648) končí aritmetickým přetečením)
+        shard_clause = "AND (CHECKSUM(siv.SivCode) & 0x7FFFFFFF) % ? = ?"
+        params.extend([shard[1], shard[0]])
+    lease_clause = ""
+    if exclude_leased:
+        lease_clause = f"""AND NOT EXISTS (
+                    SELECT 1 FROM {LEASE_TABLE} AS lease WHERE lease.SivCode = siv.SivCode
+                )"""
+
+    query = f"""
+        SELECT TOP (?) siv.SivCode, SivName, SivCode2, StiName, StiPartNo
+        FROM {table} AS siv
+        JOIN StoItem ON SivStiId = StiId
+        WHERE SivComId = ?
+        {after_clause}
+        {shard_clause}
+        AND ISNULL(StiPLNote,'')=''
+        AND (SivPLNote IS NULL OR SivPLNote = '')
+        AND NOT EXISTS (
+            SELECT 1 FROM #IgnoredCodes AS ign WHERE ign.SivCode = siv.SivCode
+        )
+        {lease_clause}
+        ORDER BY siv.SivCode
+    """
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+def get_products(supplier_code, limit=20, after=None, shard=None):
+    """
+    Načte další stránku produktů pro překlad s vynecháním ignorovaných SivCodes.
+
+    Stránkuje se podle SivCode (keyset): další stránku vrátí volání s after = SivCode
+    posledního produktu předchozí stránky. after=None začíná od začátku.
+    shard=(index, count) vrací jen produkty dané části katalogu.
+    """
+    def query_products(conn):
+        cursor = conn.cursor()
+        try:
+            _sync_ignored_codes(conn, cursor, supplier_code, os.getenv('DB_TABLE', ''))
+            return _fetch_products(cursor, supplier_code, limit, after, shard=shard)
+        finally:
+            cursor.close()
+
+    metrics = get_metrics()
     try:
-        table = os.getenv('DB_TABLE', '')
-
-        # Získat ignorované SivCodes pro tohoto dodavatele
-        ignored_codes = get_ignored_siv_codes(supplier_code)
-
-        cursor.execute("CREATE TABLE #IgnoredCodes (SivCode NVARCHAR(MAX))")
-        for code in ignored_codes:
-            cursor.execute("INSERT INTO #IgnoredCodes (SivCode) VALUES (?)", (code,))
-
-        # Opravený dotaz s explicitní kolací
-        query = f"""
-            SELECT TOP {limit} SivCode, SivName, SivCode2, StiName, StiPartNo
-            FROM {table}
-            JOIN StoItem ON SivStiId = StiId
-            WHERE SivComId = ? 
-            AND ISNULL(StiPLNote,'')=''
-            AND (SivPLNote IS NULL OR SivPLNote = '')
-            AND SivCode COLLATE Czech_CI_AS NOT IN (
-                SELECT SivCode COLLATE Czech_CI_AS 
-                FROM #IgnoredCodes
-            ) ORDER BY NEWID()
-        """
-        print(f"[DEBUG] SQL Query: {query}")
-        cursor.execute(query, (supplier_code,))
-        return cursor.fetchall()
+        with metrics.timer("db_fetch_seconds", op="get_products"):
+            return run_with_connection(query_products)
     except Exception as e:
-        print(f"[ERROR] Chyba při načítání produktů: {str(e)}")
+        metrics.inc("db_errors_total", op="get_products")
+        logger.error("Chyba při načítání produktů: %s", e)
         return []
-    finally:
-        cursor.close()
-        conn.close()
+
+# ---------- Leasing práce mezi více pracovníky/procesy ----------
+LEASE_TABLE = os.getenv("LEASE_TABLE", "TranslationLease")
+_lease_table_ready = False
+_lease_table_lock = threading.Lock()
+
+
+class LeaseUnavailableError(Exception):
+    """Tabulku leasů nejde vytvořit ani použít (typicky chybějící práva) - leasing nelze zapnout"""
+
+def _ensure_lease_table(conn, cursor):
+    """Vytvoří tabulku leasů (SivCode, WorkerId, ExpiresAt), pokud ještě neexistuje"""
+    global _lease_table_ready
+    if _lease_table_ready:
+        return
+    with _lease_table_lock:
+        if _lease_table_ready:
+            return
+        if cursor.execute("SELECT OBJECT_ID(?)", (LEASE_TABLE,)).fetchone()[0] is None:
+            table = os.getenv('DB_TABLE', '')
+            # SivCode se stejným typem a kolací jako v DB_TABLE
+            cursor.execute(f"SELECT TOP 0 SivCode INTO {LEASE_TABLE} FROM {table}")
+            cursor.execute(f"ALTER TABLE {LEASE_TABLE} ADD WorkerId NVARCHAR(200) NOT NULL, "
+                           f"ExpiresAt DATETIME2 NOT NULL")
+            cursor.execute(f"CREATE UNIQUE CLUSTERED INDEX IX_{LEASE_TABLE}_SivCode ON {LEASE_TABLE} (SivCode)")
+            cursor.execute(f"CREATE INDEX IX_{LEASE_TABLE}_WorkerId ON {LEASE_TABLE} (WorkerId)")
+            conn.commit()
+            logger.info("Vytvořena tabulka leasů %s", LEASE_TABLE)
+        _lease_table_ready = True
+
+def claim_products(supplier_code, worker_id, limit=20, after=None, lease_seconds=600, shard=None):
+    """
+    Jako get_products, ale vrácené produkty zároveň atomicky zabere (lease) pro worker_id
+    na lease_seconds sekund. Produkty zabrané jiným pracovníkem se přeskočí; leasy
+    s prošlou platností se vrací zpět do poolu.
+
+    Raises:
+        LeaseUnavailableError: tabulka leasů není k dispozici (volající se může vrátit k get_products)
+        Exception: jiná chyba DB (včetně nezískaného zámku) - produkty nejsou zabrané
+    """
+    def claim(conn):
+        cursor = conn.cursor()
+        try:
+            try:
+                _ensure_lease_table(conn, cursor)
+            except pyodbc.Error as e:
+                if is_disconnect_error(e):
+                    raise
+                raise LeaseUnavailableError(str(e)) from e
+            # Synchronizace může commitovat → musí proběhnout před zámkem, jinak by commit
+            # ukončil transakci a uvolnil applock dřív, než se leasy zapíšou
+            _sync_ignored_codes(conn, cursor, supplier_code, os.getenv('DB_TABLE', ''))
+            # Zabírání jednoho dodavatele se serializuje (zámek drží transakce, jen na pár ms).
+            # DECLARE/EXEC implicitní transakci neotevřou a applock s @LockOwner='Transaction'
+            # by mimo transakci vrátil -999 → transakce se otevírá explicitně
+            cursor.execute("""
+                IF @@TRANCOUNT = 0 BEGIN TRANSACTION;
+                DECLARE @result INT;
+                EXEC @result = sp_getapplock @Resource = ?, @LockMode = 'Exclusive',
+                                             @LockOwner = 'Transaction', @LockTimeout = 30000;
+                IF @result < 0 THROW 50000, 'Zámek pro zabírání produktů se nepodařilo získat', 1;
+            """, (f"{LEASE_TABLE}:{supplier_code}",))
+            cursor.execute(f"DELETE FROM {LEASE_TABLE} WHERE ExpiresAt < SYSUTCDATETIME()")
+            rows = _fetch_products(cursor, supplier_code, limit, after, exclude_leased=True, shard=shard)
+            if rows:
+                cursor.fast_executemany = True
+                cursor.executemany(
+                    f"INSERT INTO {LEASE_TABLE} (SivCode, WorkerId, ExpiresAt) "
+                    f"VALUES (?, ?, DATEADD(second, ?, SYSUTCDATETIME()))",
+                    [(row[0], worker_id, lease_seconds) for row in rows],
+                )
+                cursor.fast_executemany = False
+            conn.commit()
+            return rows
+        finally:
+            cursor.close()
+
+    metrics = get_metrics()
+    try:
+        with metrics.timer("db_fetch_seconds", op="claim"):
+            return run_with_connection(claim)
+    except Exception:
+        metrics.inc("db_errors_total", op="claim")
+        raise
+
+def renew_leases(worker_id, lease_seconds=600):
+    """Prodlouží všechny leasy pracovníka; vrací jejich počet"""
+    def renew(conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"UPDATE {LEASE_TABLE} SET ExpiresAt = DATEADD(second, ?, SYSUTCDATETIME()) "
+                           f"WHERE WorkerId = ?", (lease_seconds, worker_id))
+            count = cursor.rowcount
+            conn.commit()
+            return count
+        finally:
+            cursor.close()
+
+    return run_with_connection(renew)
+
+def release_leases(worker_id, siv_codes=None):
+    """Uvolní leasy pracovníka (vybrané SivCodes, nebo všechny při siv_codes=None)"""
+    def release(conn):
+        cursor = conn.cursor()
+        try:
+            if siv_codes is None:
+                cursor.execute(f"DELETE FROM {LEASE_TABLE} WHERE WorkerId = ?", (worker_id,))
+            else:
+                cursor.executemany(f"DELETE FROM {LEASE_TABLE} WHERE WorkerId = ? AND SivCode = ?",
+                                   [(worker_id, code) for code in siv_codes])
+            conn.commit()
+        finally:
+            cursor.close()
+
+    if siv_codes is not None and not siv_codes:
+        return
+    try:
+        run_with_connection(release)
+    except Exception as e:
+        # Neuvolněný lease po vypršení stejně propadne
+        logger.warning("Uvolnění leasů selhalo: %s", e)
 
 def update_product_note(siv_code, note_text):
     """
@@ -91,77 +275,204 @@ def update_product_note(siv_code, note_text):
         siv_code: kód produktu
         note_text: přeložený text
     """
-    conn = connect_to_db()
-    cursor = conn.cursor()
+    def update_note(conn):
+        cursor = conn.cursor()
+        try:
+            table = os.getenv('DB_TABLE', '')
+            query = f"UPDATE {table} SET SivPLNote = ? WHERE SivCode = ?"
+            cursor.execute(query, (note_text, siv_code))
+            conn.commit()
+        finally:
+            cursor.close()
+
+    metrics = get_metrics()
     try:
-        table = os.getenv('DB_TABLE', '')
-        query = f"UPDATE {table} SET SivPLNote = ? WHERE SivCode = ?"
-        cursor.execute(query, (note_text, siv_code))
-        conn.commit()
-        print(f"[SUCCESS] Uložen překlad pro produkt {siv_code}")
+        with metrics.timer("db_save_seconds", op="single"):
+            run_with_connection(update_note)
+        metrics.inc("db_saved_rows_total", op="single")
+        logger.info("Uložen překlad pro produkt %s", siv_code, extra={"siv_code": siv_code})
+        return True
     except Exception as e:
-        print(f"[ERROR] Chyba při ukládání překladu: {str(e)}")
-        conn.rollback()
-    finally:
-        cursor.close()
-        conn.close()
+        metrics.inc("db_errors_total", op="single")
+        # Nepotvrzenou transakci vrátí pool při vrácení spojení
+        logger.error("Chyba při ukládání překladu: %s", e, extra={"siv_code": siv_code})
+        return False
 
 def update_product_notes_batch(notes):
     """
     Hromadné ukládání překladů
     Args:
         notes: seznam n-tic (siv_code, note_text)
+    Returns:
+        dict: {"failed": n, "failed_codes": [...]} - překlady, které se nepodařilo uložit
     """
-    conn = connect_to_db()
-    cursor = conn.cursor()
-    try:
-        table = os.getenv('DB_TABLE', '')
-
-        # Zde je klíčová úprava - přidej CAST pro SivCode
-        query = f"""
-           UPDATE {table} 
-           SET SivPLNote = CAST(? AS NVARCHAR(MAX)) 
-           WHERE CAST(SivCode AS NVARCHAR(MAX)) = ?
-           """
-
-        # Spustíme hromadný update
-        # Připrav data ve správném pořadí (note_text, siv_code)
-        data = [(note_text, siv_code) for siv_code, note_text in notes]
-        cursor.executemany(query, data)
-        conn.commit()
-        print(f"[SUCCESS] Uloženo {len(notes)} překladů najednou")
+    def update_notes(conn):
+        cursor = conn.cursor()
+        try:
+            table = os.getenv('DB_TABLE', '')
+
+            # Predikát přímo na sloupci (bez CAST), aby UPDATE hledal řádek přes index SivCode
+            query = f"UPDATE {table} SET SivPLNote = ? WHERE SivCode = ?"
 
+            # Spustíme hromadný update
+            # Připrav data ve správném pořadí (note_text, siv_code)
+            data = [(note_text, siv_code) for siv_code, note_text in notes]
+            cursor.executemany(query, data)
+            conn.commit()
+        finally:
+            cursor.close()
+
+    metrics = get_metrics()
+    failed = []
+    try:
+        with metrics.timer("db_save_seconds", op="batch"):
+            run_with_connection(update_notes)
+        metrics.inc("db_saved_rows_total", len(notes), op="batch")
+        logger.info("Uloženo %d překladů najednou", len(notes))
     except Exception as e:
-        print(f"[ERROR] Chyba při hromadném ukládání: {str(e)}")
-        conn.rollback()
+        metrics.inc("db_errors_total", op="batch")
+        logger.error("Chyba při hromadném ukládání: %s", e)
         # Fallback na jednotlivé updaty pokud hromadný selže
         for siv_code, note_text in notes:
             try:
-                update_product_note(siv_code, note_text)
+                if not update_product_note(siv_code, note_text):
+                    failed.append(siv_code)
             except Exception as fallback_error:
-                print(f"[ERROR] Fallback uložení pro {siv_code} selhalo: {str(fallback_error)}")
-    finally:
-        cursor.close()
-        conn.close()
+                logger.error("Fallback uložení pro %s selhalo: %s", siv_code, fallback_error,
+                             extra={"siv_code": siv_code})
+                failed.append(siv_code)
+    return {"failed": len(failed), "failed_codes": failed}
+
+# Kolik řádků se posílá do staging tabulky v jednom executemany
+BULK_STAGE_CHUNK = int(os.getenv("BULK_STAGE_CHUNK", "1000"))
+
+def bulk_update_product_notes(notes):
+    """
+    Hromadné uložení velkého množství překladů (noční importy).
+
+    Překlady se nahrají přes fast_executemany do staging temp tabulky a na DB_TABLE
+    se aplikují jedním set-based UPDATE v jedné transakci.
+
+    Args:
+        notes: seznam n-tic (siv_code, note_text); u opakovaného SivCode platí poslední
+
+    Returns:
+        dict: {"applied": n, "unchanged": n, "missing": n, "missing_codes": [...]}
+              (applied = překlad se změnil, unchanged = v DB už je stejný text,
+               missing = SivCode v DB_TABLE neexistuje)
+
+    Raises:
+        Exception: při chybě se transakce vrátí a nic se neuloží
+    """
+    staged = list(dict((str(siv_code), note_text) for siv_code, note_text in notes).items())
+
+    def bulk_update(conn):
+        cursor = conn.cursor()
+        try:
+            table = os.getenv('DB_TABLE', '')
+
+            cursor.execute("IF OBJECT_ID('tempdb..#NoteStaging') IS NOT NULL DROP TABLE #NoteStaging")
+            # SivCode se stejným typem a kolací jako v DB_TABLE → JOIN přes index bez konverzí
+            cursor.execute(f"SELECT TOP 0 SivCode INTO #NoteStaging FROM {table}")
+            cursor.execute("ALTER TABLE #NoteStaging ADD Note NVARCHAR(MAX) NOT NULL, Status CHAR(1) NULL")
+
+            cursor.fast_executemany = True
+            # NVARCHAR(MAX) jako long data, jinak by fast_executemany alokoval buffer podle nejdelšího textu
+            cursor.setinputsizes([None, (pyodbc.SQL_WLONGVARCHAR, 0, 0)])
+            for i in range(0, len(staged), BULK_STAGE_CHUNK):
+                cursor.executemany("INSERT INTO #NoteStaging (SivCode, Note) VALUES (?, ?)",
+                                   staged[i:i + BULK_STAGE_CHUNK])
+            cursor.fast_executemany = False
+            cursor.execute("CREATE CLUSTERED INDEX IX_NoteStaging ON #NoteStaging (SivCode)")
+
+            # Klasifikace každého SivCode: A = změní se, U = beze změny, M = chybí v DB_TABLE
+            cursor.execute(f"""
+                UPDATE stg SET Status = CASE
+                    WHEN NOT EXISTS (SELECT 1 FROM {table} AS siv WHERE siv.SivCode = stg.SivCode) THEN 'M'
+                    WHEN EXISTS (
+                        SELECT 1 FROM {table} AS siv
+                        WHERE siv.SivCode = stg.SivCode
+                        AND (siv.SivPLNote IS NULL
+                             OR CAST(siv.SivPLNote AS NVARCHAR(MAX)) COLLATE Latin1_General_BIN2 <> stg.Note)
+                    ) THEN 'A'
+                    ELSE 'U' END
+                FROM #NoteStaging AS stg
+            """)
+            cursor.execute(f"""
+                UPDATE siv SET SivPLNote = stg.Note
+                FROM {table} AS siv
+                JOIN #NoteStaging AS stg ON siv.SivCode = stg.SivCode
+                WHERE stg.Status = 'A'
+            """)
+
+            counts = {"A": 0, "U": 0, "M": 0}
+            for status, count in cursor.execute("SELECT Status, COUNT(*) FROM #NoteStaging GROUP BY Status").fetchall():
+                counts[status] = count
+            missing_codes = [row[0] for row in cursor.execute(
+                "SELECT SivCode FROM #NoteStaging WHERE Status = 'M'").fetchall()]
+            cursor.execute("DROP TABLE #NoteStaging")
+            conn.commit()
+            return {"applied": counts["A"], "unchanged": counts["U"], "missing": counts["M"],
+                    "missing_codes": missing_codes}
+        finally:
+            cursor.close()
+
+    if not staged:
+        return {"applied": 0, "unchanged": 0, "missing": 0, "missing_codes": []}
+    metrics = get_metrics()
+    try:
+        with metrics.timer("db_save_seconds", op="bulk"):
+            result = run_with_connection(bulk_update)
+    except Exception:
+        metrics.inc("db_errors_total", op="bulk")
+        raise
+    metrics.inc("db_saved_rows_total", result["applied"], op="bulk")
+    logger.info("Hromadný import: uloženo %d, beze změny %d, chybí v DB %d",
+                result["applied"], result["unchanged"], result["missing"])
+    return result
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_db_pool():
+    """Sdílený pool spojení do databáze (vytvoří se při prvním použití)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(connect_to_db)
+                atexit.register(_pool.close)
+                get_metrics().gauge("db_pool_connections", lambda: _pool.stats()["open"], state="open")
+                get_metrics().gauge("db_pool_connections", lambda: _pool.stats()["idle"], state="idle")
+    return _pool
+
+def run_with_connection(operation):
+    """
+    Provede operation(conn) na spojení z poolu. Když se spojení během operace přeruší,
+    zopakuje ji jednou na novém spojení (operace proto musí být opakovatelné).
+    """
+    pool = get_db_pool()
+    try:
+        with pool.connection() as conn:
+            return operation(conn)
+    except pyodbc.Error as e:
+        if not is_disconnect_error(e):
+            raise
+        logger.warning("Spojení s databází bylo přerušeno (%s) - opakuji na novém spojení", e)
+    with pool.connection() as conn:
+        return operation(conn)
 
 def connect_to_db():
-    from dotenv import load_dotenv
-    load_dotenv()
+    """Otevře nové spojení do databáze (běžně se používá přes get_db_pool())"""
     server = os.getenv('DB_SERVER', '')
     database = os.getenv('DB_DATABASE', '')
     username = os.getenv('DB_USERNAME', '')
     password = os.getenv('DB_PASSWORD', '')
     table = os.getenv('DB_TABLE', '')
 
-    # Debug print connection details with more visibility
-    # print("\n[DEBUG] Attempting database connection with:")
-    # print("=" * 50)
-    # print(f"  Server:    '{server}'")
-    # print(f"  Database:  '{database}'")
-    # print(f"  Username:  '{username}'")
-    # print(f"  Table:     '{table if table else '<default table>'}'")
-    # print(f"  Password:  {'*****' if password else '<not set>'}")
-    # print("=" * 50)
+    # Heslo se nikdy neloguje
+    logger.debug("Připojuji se k databázi: server=%s, databáze=%s, uživatel=%s, tabulka=%s",
+                 server, database, username, table or "<default table>")
 
     if not all([server, database, username, password]):
         missing = []
@@ -170,7 +481,7 @@ def connect_to_db():
         if not username: missing.append("DB_USERNAME")
         if not password: missing.append("DB_PASSWORD")
         error_msg = f"Missing required environment variables: {', '.join(missing)}"
-        print(f"[ERROR] {error_msg}")
+        logger.error("%s", error_msg)
         raise Exception(error_msg)
 
     try:
@@ -182,39 +493,30 @@ def connect_to_db():
             f'PWD={password}'
         )
 
-        print("[DEBUG] Connection string:", conn_str.replace(password, '*****'))
-
         # Add connection timeout and other parameters
         conn_str += ';Connection Timeout=30;'
 
-        print("[DEBUG] Attempting to connect...")
         conn = pyodbc.connect(conn_str)
 
-        # Test the connection immediately
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        if cursor.fetchone()[0] == 1:
-            print("[DEBUG] Connection test successful")
-        cursor.close()
-
-        print("[SUCCESS] Database connection established")
+        # Spojení ověřuje pool až při půjčení po nečinnosti
+        logger.debug("Otevřeno nové spojení do databáze")
         return conn
 
     except pyodbc.InterfaceError as e:
         error_msg = f"Interface error (check driver): {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.error("%s", error_msg)
         raise Exception(error_msg)
     except pyodbc.OperationalError as e:
         error_msg = f"Operational error (server unavailable/wrong credentials): {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.error("%s", error_msg)
         raise Exception(error_msg)
     except pyodbc.DatabaseError as e:
         error_msg = f"Database error (permissions/configuration): {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.error("%s", error_msg)
         raise Exception(error_msg)
     except Exception as e:
         error_msg = f"Unexpected connection error: {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.error("%s", error_msg)
         raise Exception(error_msg)
 
 def diagnose_database(conn):
@@ -227,13 +529,13 @@ def diagnose_database(conn):
                   if row.table_type == 'TABLE' and not row.table_name.startswith('sys')]
 
         if not tables:
-            print("[WARNING] No tables found in the database")
+            logger.warning("No tables found in the database")
             return []
 
         # Default to first table if DB_TABLE not set
         table = os.getenv('DB_TABLE', tables[0])
         if table not in tables:
-            print(f"[WARNING] Table '{table}' not found, using first available table")
+            logger.warning("Table '%s' not found, using first available table", table)
             table = tables[0]
 
         print(f"\n[DIAGNOSTIC] Analyzing table: {table}")
@@ -243,7 +545,7 @@ def diagnose_database(conn):
         columns = [col.column_name for col in cursor.fetchall()]
 
         if not columns:
-            print("[WARNING] No columns found in the table")
+            logger.warning("No columns found in the table")
             return []
 
         # 1. Basic table structure info
@@ -299,7 +601,7 @@ def diagnose_database(conn):
                 else:
                     print("\n[INFO] No rows found with SivCode = 161784")
             except Exception as e:
-                print(f"\n[WARNING] Couldn't fetch sample rows: {str(e)}")
+                logger.warning("Couldn't fetch sample rows: %s", e)
 
         # 3. Random sample of 5 rows
         try:
@@ -317,22 +619,24 @@ def diagnose_database(conn):
                     display_data.append(display_row)
                 print(tabulate(display_data, headers="keys", tablefmt="grid"))
         except Exception as e:
-            print(f"\n[WARNING] Couldn't fetch random rows: {str(e)}")
+            logger.warning("Couldn't fetch random rows: %s", e)
 
         return structure_results
 
     except Exception as e:
-        print(f"[ERROR] Database diagnosis failed: {str(e)}")
+        logger.error("Database diagnosis failed: %s", e)
         raise Exception(f"Database diagnosis failed: {str(e)}")
     finally:
         cursor.close()
-        print("[DEBUG] Diagnosis cursor closed")
+        logger.debug("Diagnosis cursor closed")
 
 if __name__ == "__main__":
+    from logConfig import setup_logging
+    setup_logging()
     # Example usage
     try:
         conn = connect_to_db()
         diagnose_database(conn)
         conn.close()
     except Exception as e:
-        print(f"[ERROR] Main execution failed: {str(e)}")
\ No newline at end of file
+        logger.error("Main execution failed: %s", e)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Thread-safe pool databázových (ODBC) spojení.
+
+- spojení se vytvářejí až při potřebě, nejvýš DB_POOL_SIZE současně
+- spojení nečinné déle než DB_POOL_IDLE_CHECK sekund se při půjčení ověří (SELECT 1)
+- spojení, na kterém nastala chyba přenosu (SQLSTATE 08xxx), se zahodí a místo něj
+  se otevře nové
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_POOL_IDLE_CHECK = float(os.getenv("DB_POOL_IDLE_CHECK", "30"))
+
+
+def is_disconnect_error(e):
+    """True, pokud výjimka znamená ztrátu spojení se serverem (SQLSTATE třídy 08)"""
+    state = e.args[0] if getattr(e, "args", None) else ""
+    return isinstance(state, str) and state.startswith("08")
+
+
+class _PooledConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """Pool spojení s omezenou velikostí; factory() vrací nové spojení"""
+
+    def __init__(self, factory, size=DB_POOL_SIZE, idle_check=DB_POOL_IDLE_CHECK):
+        self.factory = factory
+        self.size = max(1, size)
+        self.idle_check = idle_check
+
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.counters = {"created": 0, "reused": 0, "validated": 0, "discarded": 0}
+
+    def _inc(self, key):
+        with self._cond:
+            self.counters[key] += 1
+
+    @staticmethod
+    def _is_alive(pooled):
+        cursor = None
+        try:
+            cursor = pooled.conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            return True
+        except Exception:
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def _destroy(self, pooled):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._created -= 1
+            self.counters["discarded"] += 1
+            self._cond.notify()
+
+    def acquire(self, timeout=None):
+        """Půjčí spojení (blokuje, dokud není nějaké volné)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Pool databázových spojení je uzavřený")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._created < self.size:
+                        self._created += 1
+                        pooled = None
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("Žádné volné databázové spojení")
+                    self._cond.wait(remaining)
+
+            if pooled is None:
+                try:
+                    pooled = _PooledConnection(self.factory())
+                except Exception:
+                    with self._cond:
+                        self._created -= 1
+                        self._cond.notify()
+                    raise
+                self._inc("created")
+                return pooled
+
+            if time.monotonic() - pooled.last_used > self.idle_check:
+                self._inc("validated")
+                if not self._is_alive(pooled):
+                    logger.warning("Databázové spojení po nečinnosti neodpovídá - otevírám nové")
+                    self._destroy(pooled)
+                    continue
+            self._inc("reused")
+            return pooled
+
+    def release(self, pooled, broken=False):
+        """Vrátí spojení do poolu; rozbité spojení zahodí"""
+        if not broken:
+            try:
+                # Nepotvrzená transakce nesmí přejít k dalšímu uživateli spojení
+                pooled.conn.rollback()
+            except Exception:
+                broken = True
+        if broken or self._closed:
+            self._destroy(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager: with pool.connection() as conn: ..."""
+        pooled = self.acquire(timeout)
+        broken = False
+        try:
+            yield pooled.conn
+        except Exception as e:
+            broken = is_disconnect_error(e)
+            raise
+        finally:
+            self.release(pooled, broken=broken)
+
+    def stats(self):
+        with self._cond:
+            data = dict(self.counters)
+            data["open"] = self._created
+            data["idle"] = len(self._idle)
+        return data
+
+    def close(self):
+        """Zavře nečinná spojení a zabrání dalšímu půjčování"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._destroy(pooled)
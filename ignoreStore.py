@@ -0,0 +1,121 @@
+"""
+Úložiště ignorovaných SivCodes (SQLite na disku + množina v paměti).
+
+- přidání kódu je jeden INSERT (žádné přepisování celého souboru)
+- dotazy "je kód ignorovaný" / "všechny ignorované kódy dodavatele" jdou z paměti
+- u každého kódu se ukládá důvod a čas, kdy byl ignorován
+- původní ignoreSivCode.json se při prvním spuštění automaticky naimportuje
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+IGNORE_STORE_PATH = os.getenv("IGNORE_STORE_PATH", "ignoreStore.sqlite")
+# Původní JSON úložiště ({dodavatel: [SivCode, ...]}) - importuje se jednou
+IGNORE_FILE = "ignoreSivCode.json"
+
+
+class IgnoreStore:
+    """Thread-safe perzistentní seznam ignorovaných kódů podle dodavatele"""
+
+    def __init__(self, path=IGNORE_STORE_PATH, legacy_file=IGNORE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # timeout: soubor sdílí i worker procesy shardedRunneru
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ignored (
+                supplier TEXT NOT NULL,
+                siv_code TEXT NOT NULL,
+                reason TEXT,
+                ignored_at REAL NOT NULL,
+                PRIMARY KEY (supplier, siv_code)
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self._import_legacy(legacy_file)
+
+        self._codes = {}
+        for supplier, siv_code in self._conn.execute("SELECT supplier, siv_code FROM ignored"):
+            self._codes.setdefault(supplier, set()).add(siv_code)
+
+    def _import_legacy(self, legacy_file):
+        """Jednorázový import ignoreSivCode.json (soubor zůstává beze změny)"""
+        if not legacy_file or not os.path.exists(legacy_file):
+            return
+        done = self._conn.execute("SELECT value FROM meta WHERE key = 'legacy_import'").fetchone()
+        if done:
+            return
+        try:
+            with open(legacy_file, "r", encoding="utf-8") as f:
+                data = json.load(f) or {}
+        except Exception as e:
+            logger.warning("Chyba při čtení %s: %s", legacy_file, e)
+            return
+
+        imported_at = os.path.getmtime(legacy_file)
+        rows = [(str(supplier), str(code), f"import z {legacy_file}", imported_at)
+                for supplier, codes in data.items() for code in codes]
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO ignored (supplier, siv_code, reason, ignored_at) VALUES (?, ?, ?, ?)", rows)
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_import', ?)",
+                           (str(time.time()),))
+        self._conn.commit()
+        logger.info("Naimportováno %d ignorovaných kódů z %s", len(rows), legacy_file)
+
+    def add(self, supplier_code, siv_code, reason=None):
+        """Přidá kód; vrací False, pokud už ignorovaný byl (důvod se nepřepisuje)"""
+        supplier_code, siv_code = str(supplier_code), str(siv_code)
+        with self._lock:
+            codes = self._codes.setdefault(supplier_code, set())
+            if siv_code in codes:
+                return False
+            self._conn.execute(
+                "INSERT OR IGNORE INTO ignored (supplier, siv_code, reason, ignored_at) VALUES (?, ?, ?, ?)",
+                (supplier_code, siv_code, reason, time.time()),
+            )
+            self._conn.commit()
+            codes.add(siv_code)
+            return True
+
+    def contains(self, supplier_code, siv_code):
+        with self._lock:
+            return str(siv_code) in self._codes.get(str(supplier_code), ())
+
+    def codes(self, supplier_code):
+        """Kopie množiny ignorovaných kódů dodavatele"""
+        with self._lock:
+            return set(self._codes.get(str(supplier_code), ()))
+
+    def details(self, supplier_code, siv_code):
+        """(reason, ignored_at) nebo None"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT reason, ignored_at FROM ignored WHERE supplier = ? AND siv_code = ?",
+                (str(supplier_code), str(siv_code)),
+            ).fetchone()
+
+    def stats(self):
+        with self._lock:
+            return {supplier: len(codes) for supplier, codes in self._codes.items()}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_ignore_store():
+    """Sdílená instance úložiště (vytvoří se při prvním použití)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = IgnoreStore()
+    return _store
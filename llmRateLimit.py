@@ -0,0 +1,230 @@
+"""
+Sdílené omezování rychlosti a opakování požadavků na LLM providery.
+
+- token bucket pro požadavky/min (RPM) a tokeny/min (TPM) pro každou dvojici provider+model
+- adaptivní souběžnost (AIMD): při úspěchu pomalu přidává, při 429 sníží na polovinu
+- opakování při 429/5xx/timeoutu s exponenciálním backoffem a náhodným jitterem
+
+Limity lze nastavit v .env, např. LLM_RPM_GEMINI=30, LLM_TPM_GEMINI=1000000,
+LLM_CONCURRENCY_GEMINI=4 (suffix = název providera velkými písmeny).
+Když kvótu sdílí více procesů, LLM_QUOTA_SHARE (0-1) určuje podíl RPM/TPM tohoto procesu.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Výchozí limity podle providera: (RPM, TPM, max. souběžnost)
+DEFAULT_LIMITS = {
+    "gemini": (30, 1_000_000, 4),
+    "together": (60, 180_000, 4),
+}
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+
+
+class TokenBucket:
+    """Klasický token bucket: `rate_per_minute` jednotek za minutu, zásobník `capacity`"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        """Blokuje, dokud nejsou k dispozici tokeny. Větší požadavek než capacity projde po naplnění."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(min(wait, 1.0))
+
+
+class AdaptiveConcurrency:
+    """AIMD limit souběžných požadavků (additive increase, multiplicative decrease)"""
+
+    def __init__(self, max_limit, min_limit=1, initial=None):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial or max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            # +1 zhruba za každé "okno" úspěšných požadavků
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(self.min_limit, self.limit / 2.0)
+
+
+class ProviderLimiter:
+    """Limity jedné dvojice provider+model"""
+
+    def __init__(self, name, rpm, tpm, max_concurrency):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.counters = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0}
+        self._lock = threading.Lock()
+
+    def _inc(self, key):
+        with self._lock:
+            self.counters[key] += 1
+        get_metrics().inc("llm_limiter_events_total", route=self.name, event=key)
+
+    def acquire(self, tokens):
+        start = time.monotonic()
+        self.concurrency.acquire()
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+        # Čas strávený čekáním na kvótu/souběžnost (ne samotným požadavkem)
+        get_metrics().observe("llm_limiter_wait_seconds", time.monotonic() - start, route=self.name)
+        self._inc("requests")
+
+    def release(self):
+        self.concurrency.release()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+        data["concurrency_limit"] = round(self.concurrency.limit, 2)
+        return data
+
+
+def _env_limit(provider, key, default):
+    value = os.getenv(f"LLM_{key}_{provider.upper()}")
+    return type(default)(value) if value else default
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider, model):
+    """Sdílený limiter pro dvojici provider+model"""
+    key = (provider, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            rpm, tpm, concurrency = DEFAULT_LIMITS.get(provider, (60, 100_000, 4))
+            # Čte se až tady (ne při importu), aby ho mohl nastavit worker proces shardedRunneru
+            share = float(os.getenv("LLM_QUOTA_SHARE", "1"))
+            limiter = ProviderLimiter(
+                f"{provider}/{model}",
+                rpm=max(1, int(_env_limit(provider, "RPM", rpm) * share)),
+                tpm=max(1, int(_env_limit(provider, "TPM", tpm) * share)),
+                max_concurrency=_env_limit(provider, "CONCURRENCY", concurrency),
+            )
+            _limiters[key] = limiter
+        return limiter
+
+
+def get_limiter_stats():
+    """Počítadla všech limiterů: {"provider/model": {...}}"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def backoff_delay(attempt):
+    """Exponenciální backoff s plným jitterem"""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _is_retryable(e):
+    return bool(getattr(e, "retryable", False))
+
+
+def _is_throttle(e):
+    return getattr(e, "status", None) == 429
+
+
+def call_with_retry(fn, limiter, tokens, max_retries=LLM_MAX_RETRIES):
+    """
+    Zavolá fn() v rámci limitů; při opakovatelné chybě (429/5xx/timeout) čeká a zkouší znovu.
+    Neopakovatelné chyby a poslední neúspěch propadají volajícímu.
+    """
+    attempt = 0
+    while True:
+        limiter.acquire(tokens)
+        try:
+            result = fn()
+        except Exception as e:
+            if _is_throttle(e):
+                limiter._inc("throttled")
+                limiter.concurrency.on_throttle()
+            if not _is_retryable(e) or attempt >= max_retries:
+                limiter._inc("failures")
+                raise
+            delay = backoff_delay(attempt)
+            attempt += 1
+            limiter._inc("retries")
+            logger.warning("%s: %s - pokus %d/%d za %.1fs", limiter.name, e, attempt, max_retries, delay)
+        else:
+            limiter.concurrency.on_success()
+            return result
+        finally:
+            limiter.release()
+        time.sleep(delay)
+
+
+async def acall_with_retry(coro_fn, limiter, tokens, max_retries=LLM_MAX_RETRIES):
+    """Async varianta call_with_retry (čekání na limity běží mimo event loop)"""
+    attempt = 0
+    while True:
+        # run_in_executor místo asyncio.to_thread (až od Pythonu 3.9)
+        await asyncio.get_running_loop().run_in_executor(None, limiter.acquire, tokens)
+        try:
+            result = await coro_fn()
+        except Exception as e:
+            if _is_throttle(e):
+                limiter._inc("throttled")
+                limiter.concurrency.on_throttle()
+            if not _is_retryable(e) or attempt >= max_retries:
+                limiter._inc("failures")
+                raise
+            delay = backoff_delay(attempt)
+            attempt += 1
+            limiter._inc("retries")
+            logger.warning("%s: %s - pokus %d/%d za %.1fs", limiter.name, e, attempt, max_retries, delay)
+        else:
+            limiter.concurrency.on_success()
+            return result
+        finally:
+            limiter.release()
+        await asyncio.sleep(delay)
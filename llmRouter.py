@@ -0,0 +1,254 @@
+"""
+Směrování překladů mezi více LLM providery (Gemini, Together).
+
+- primární je route s nejnižší očekávanou latencí vynásobenou váhou ceny
+  (LLM_ROUTE_COST_<PROVIDER>_<MODEL> nebo LLM_ROUTE_COST_<PROVIDER>, default 1.0) mezi zdravými routami
+- když primární požadavek přesáhne percentil své latence, pošle se záložní (hedged)
+  požadavek na další route a použije se odpověď, která přijde první
+- route, která opakovaně selhává, se na chvíli vyřadí (circuit breaker) a provoz jde jinam;
+  požadavky odmítnuté kvůli obsahu (LLMError.rejected) se do breakeru nepočítají
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from LLMTranslate import LLMError, complete_with_limits, stream_with_limits, get_provider, strip_think
+
+logger = logging.getLogger(__name__)
+
+# Pořadí = preference při stejné latenci; formát "provider:model" nebo jen "provider"
+LLM_ROUTES = os.getenv("LLM_ROUTES", "gemini,together")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))
+# Než má route dost měření, hedguje se po tolika sekundách
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "15"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+
+# Circuit breaker: po tolika chybách v řadě se route vyřadí na COOLDOWN sekund
+FAILURES_TO_OPEN = 3
+COOLDOWN_SECONDS = 60
+MIN_SAMPLES = 10
+
+
+class Route:
+    """Jeden provider+model s historií latencí a stavem circuit breakeru"""
+
+    def __init__(self, provider, model, cost=1.0):
+        self.provider = provider
+        self.model = model
+        self.cost = cost
+        self.latencies = deque(maxlen=200)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.counters = {"requests": 0, "wins": 0, "errors": 0, "rejected": 0, "hedges": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return f"{self.provider}/{self.model}"
+
+    def healthy(self):
+        return time.monotonic() >= self.open_until
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def expected_latency(self):
+        p50 = self.percentile(0.5)
+        return (p50 if p50 is not None else LLM_HEDGE_DEFAULT_DELAY) * self.cost
+
+    def hedge_delay(self):
+        p = self.percentile(LLM_HEDGE_PERCENTILE)
+        return max(LLM_HEDGE_MIN_DELAY, p if p is not None else LLM_HEDGE_DEFAULT_DELAY)
+
+    def record_success(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.counters["errors"] += 1
+            if isinstance(error, LLMError) and error.rejected:
+                # Chyba konkrétního produktu (safety, špatný požadavek), ne route
+                self.counters["rejected"] += 1
+                return
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= FAILURES_TO_OPEN:
+                self.open_until = time.monotonic() + COOLDOWN_SECONDS
+                logger.warning("LLM route %s vyřazena na %ss", self.name, COOLDOWN_SECONDS)
+
+    def inc(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+        p50, p90 = self.percentile(0.5), self.percentile(0.9)
+        data["p50_s"] = round(p50, 2) if p50 is not None else None
+        data["p90_s"] = round(p90, 2) if p90 is not None else None
+        data["healthy"] = self.healthy()
+        return data
+
+
+def _route_cost(provider, model):
+    """Váha ceny route z .env (nižší = preferovaná); bez nastavení 1.0"""
+    for key in (f"{provider}_{model}", provider):
+        value = os.getenv("LLM_ROUTE_COST_" + re.sub(r"\W", "_", key).upper())
+        if value:
+            return float(value)
+    return 1.0
+
+
+def _parse_routes(spec):
+    routes = []
+    for item in filter(None, (x.strip() for x in spec.split(","))):
+        provider, _, model = item.partition(":")
+        try:
+            # Provider bez API klíče do poolu nezařadíme
+            instance = get_provider(provider)
+        except LLMError as e:
+            logger.warning("LLM provider %s není k dispozici: %s", provider, e)
+            continue
+        model = model or instance.default_model
+        routes.append(Route(provider, model, cost=_route_cost(provider, model)))
+    return routes
+
+
+class LLMRouter:
+    """Pool LLM rout s hedged požadavky a automatickým failoverem"""
+
+    def __init__(self, routes=None, max_workers=16):
+        self.routes = routes if routes is not None else _parse_routes(LLM_ROUTES)
+        if not self.routes:
+            raise LLMError("Žádný LLM provider není nakonfigurovaný (chybí API klíče?)")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-route")
+
+    def _ordered_routes(self):
+        healthy = [r for r in self.routes if r.healthy()]
+        # Když jsou všechny vyřazené, zkusíme je i tak (lepší než okamžitá chyba)
+        candidates = healthy or list(self.routes)
+        return sorted(candidates, key=lambda r: r.expected_latency())
+
+    def _call(self, route, prompt, timeout):
+        route.inc("requests")
+        start = time.monotonic()
+        try:
+            text = complete_with_limits(route.provider, prompt, model=route.model, timeout=timeout)
+        except Exception as e:
+            route.record_failure(e)
+            raise
+        route.record_success(time.monotonic() - start)
+        return text
+
+    def complete(self, prompt, timeout=None):
+        """
+        Vrátí první úspěšnou odpověď (surový text včetně případných <think> částí).
+
+        Raises:
+            LLMError: pokud selžou všechny routy
+        """
+        pending_routes = self._ordered_routes()
+        running = {}
+        errors = []
+
+        def launch(hedge=False):
+            route = pending_routes.pop(0)
+            if hedge:
+                route.inc("hedges")
+            running[self._executor.submit(self._call, route, prompt, timeout)] = route
+
+        launch()
+        while running:
+            # Primární route má na odpověď svůj percentil latence, pak se přidá hedge
+            first_route = next(iter(running.values()))
+            hedge_timeout = first_route.hedge_delay() if pending_routes else None
+            done, _ = wait(list(running), timeout=hedge_timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                logger.debug("%s neodpověděla do %.1fs - posílám hedged požadavek", first_route.name, hedge_timeout)
+                launch(hedge=True)
+                continue
+
+            for future in done:
+                route = running.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    errors.append(f"{route.name}: {e}")
+                    continue
+                route.inc("wins")
+                return text
+
+            # Vše hotové selhalo → failover na další route hned
+            if pending_routes and not running:
+                launch()
+
+        raise LLMError("Všechny LLM routy selhaly: " + "; ".join(errors))
+
+    def stats(self):
+        return {route.name: route.stats() for route in self.routes}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Sdílený router (vytvoří se při prvním použití)"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = LLMRouter()
+    return _router
+
+
+def stream_routed_ai_response(user_message: str, delete_think: bool = True, timeout: float = None):
+    """
+    Streamovaná odpověď z nejrychlejší zdravé route. Hedging se u streamu nepoužívá;
+    pokud route selže ještě před prvním chunkem, přejde se na další.
+
+    Yields:
+        str: chunky textu (bez <think> částí)
+    """
+    router = get_router()
+    errors = []
+    for route in router._ordered_routes():
+        route.inc("requests")
+        start = time.monotonic()
+        started = False
+        try:
+            for chunk in stream_with_limits(route.provider, user_message, model=route.model,
+                                            timeout=timeout, delete_think=delete_think):
+                started = True
+                yield chunk
+        except LLMError as e:
+            route.record_failure(e)
+            if started:
+                raise
+            errors.append(f"{route.name}: {e}")
+            continue
+        route.record_success(time.monotonic() - start)
+        route.inc("wins")
+        return
+    raise LLMError("Všechny LLM routy selhaly: " + "; ".join(errors))
+
+
+def routed_ai_response(user_message: str, delete_think: bool = True, timeout: float = None) -> str:
+    """
+    Získá odpověď od nejrychlejšího dostupného providera (s hedgingem a failoverem).
+
+    Raises:
+        LLMError: pokud selžou všichni provideři
+    """
+    ai_response = get_router().complete(user_message, timeout=timeout)
+    return strip_think(ai_response) if delete_think else ai_response
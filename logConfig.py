@@ -0,0 +1,113 @@
+"""
+Nastavení logování pro GUI, dávku i pomocné skripty.
+
+- každý modul loguje přes vlastní logger: logger = logging.getLogger(__name__)
+- zprávy se formátují líně (logger.debug("... %s", x)), takže vypnutý DEBUG skoro nic nestojí
+- SivCode zpracovávaného produktu nese contextvar (product_context) a filtr ho přidá
+  ke každému záznamu jako record.siv_code - jeden produkt jde dohledat přes scrape,
+  překlad i uložení
+- LOG_LEVEL určuje úroveň konzole (default INFO), LOG_JSON_PATH zapne JSON sink
+  (jeden záznam na řádek, úroveň LOG_JSON_LEVEL, default DEBUG)
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_JSON_PATH = os.getenv("LOG_JSON_PATH", "")
+LOG_JSON_LEVEL = os.getenv("LOG_JSON_LEVEL", "DEBUG").upper()
+
+CONSOLE_FORMAT = "%(asctime)s [%(levelname)s] %(name)s%(siv_code_tag)s: %(message)s"
+
+# SivCode produktu, který aktuální vlákno/úloha zpracovává
+_siv_code = contextvars.ContextVar("siv_code", default=None)
+
+_setup_lock = threading.Lock()
+_configured = False
+
+
+@contextmanager
+def product_context(siv_code):
+    """Záznamy logované uvnitř bloku nesou siv_code (vnořené bloky se obnoví správně)"""
+    token = _siv_code.set(None if siv_code is None else str(siv_code))
+    try:
+        yield
+    finally:
+        _siv_code.reset(token)
+
+
+def current_siv_code():
+    return _siv_code.get()
+
+
+class SivCodeFilter(logging.Filter):
+    """Doplní record.siv_code (z extra={"siv_code": ...} nebo z product_context)"""
+
+    def filter(self, record):
+        siv_code = getattr(record, "siv_code", None)
+        if siv_code is None:
+            siv_code = _siv_code.get()
+        elif not isinstance(siv_code, str):
+            siv_code = str(siv_code)
+        record.siv_code = siv_code
+        record.siv_code_tag = f" [{siv_code}]" if siv_code is not None else ""
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Jeden JSON objekt na řádek (čas, úroveň, logger, SivCode, zpráva, případná výjimka)"""
+
+    def format(self, record):
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "siv_code": getattr(record, "siv_code", None),
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def setup_logging(level=None, json_path=None):
+    """
+    Nastaví root logger (jednou za proces; volají ho vstupní body main.py,
+    batchPipeline.py, shardedRunner.py a benchmark.py).
+    """
+    global _configured
+    with _setup_lock:
+        if _configured:
+            return
+        _configured = True
+
+        root = logging.getLogger()
+        console_level = getattr(logging, (level or LOG_LEVEL), logging.INFO)
+        json_path = json_path if json_path is not None else LOG_JSON_PATH
+
+        console = logging.StreamHandler()
+        console.setLevel(console_level)
+        console.setFormatter(logging.Formatter(CONSOLE_FORMAT, datefmt="%H:%M:%S"))
+        console.addFilter(SivCodeFilter())
+        root.addHandler(console)
+        root_level = console_level
+
+        if json_path:
+            json_level = getattr(logging, LOG_JSON_LEVEL, logging.DEBUG)
+            sink = logging.FileHandler(json_path, encoding="utf-8")
+            sink.setLevel(json_level)
+            sink.setFormatter(JsonFormatter())
+            sink.addFilter(SivCodeFilter())
+            root.addHandler(sink)
+            root_level = min(root_level, json_level)
+
+        # Root propustí jen to, co chce nejpodrobnější handler → ostatní zprávy se ani neformátují
+        root.setLevel(root_level)
+        # Knihovny s upovídaným DEBUG logováním
+        for name in ("urllib3", "selenium", "httpx", "httpcore"):
+            logging.getLogger(name).setLevel(max(root_level, logging.INFO))
@@ -1,17 +1,44 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-from database import get_suppliers, get_products, update_product_note, add_ignored_siv_code
-from webScrapeDescriptions import get_kosatec_product_data, api_scrape_product_details
-from LLMTranslate import get_ai_response, gemini_ai_response
+from database import get_suppliers, update_product_notes_batch, add_ignored_siv_code
+from webScrapeDescriptions import DODAVATELE, SCRAPE_ERROR_PREFIX, normalize_scrape_result
+from LLMTranslate import build_translation_prompt
+from llmRouter import routed_ai_response, stream_routed_ai_response
+from translationMemory import get_translation_memory
+from saveQueue import WriteBehindSaver
+from workLease import WorkLeases
+from workJournal import get_work_journal
+from metrics import get_metrics, start_metrics_exporter
+from logConfig import setup_logging, product_context
+import logging
 import threading
 import queue
 import time
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Kolik následujících produktů se scrapuje a překládá v předstihu
+PREFETCH_AHEAD = int(os.getenv("PREFETCH_AHEAD", "3"))
+
+# Překlad právě zobrazeného produktu se vypisuje průběžně (stream); "0" vypne
+STREAM_TRANSLATION = os.getenv("STREAM_TRANSLATION", "1") != "0"
+
+
+class PrefetchEntry:
+    """Produkt rozpracovaný na pozadí (scrape + překlad), klíčovaný SivCode"""
+
+    def __init__(self, siv_code):
+        self.siv_code = siv_code
+        self.original_html = None
+        self.scraped = threading.Event()
+        self.future = None
+        # stream=True: překlad se posílá do GUI po částech (jen pro zobrazený produkt)
+        self.stream = False
+        self.cancelled = False
 
-DODAVATELE = {
-    "api": {"kod": "161784", "funkce": api_scrape_product_details},
-    "Kosatec (selenium)": {"kod": "165463", "funkce": get_kosatec_product_data},
-}
 
 class TranslationApp:
     def __init__(self, root):
@@ -21,7 +48,11 @@ class TranslationApp:
 
         self.current_products = []
         self.current_index = 0
+        # Keyset kurzor do DB (SivCode posledního načteného produktu)
+        self.product_cursor = None
+        self.cursor_wrapped = False
         self.supplier_code = None
+        self.supplier_name = None
         self.scrape_function = None
         self.loading = False
         self.translation_in_progress = False
@@ -32,6 +63,26 @@ class TranslationApp:
         self.scrape_in_progress = False
         self.current_siv_code = None
 
+        # Look-ahead: SivCode -> PrefetchEntry; +1 vlákno pro aktuální produkt
+        self.prefetch_ahead = PREFETCH_AHEAD
+        self.prefetch_cache = {}
+        self.prefetch_lock = threading.Lock()
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=self.prefetch_ahead + 1)
+
+        self.metrics = get_metrics()
+        self.metrics.gauge("queue_depth", lambda: len(self.prefetch_cache), queue="prefetch")
+        self.metrics.gauge("queue_depth", self.result_queue.qsize, queue="gui_results")
+
+        # Potvrzené překlady se ukládají po dávkách na pozadí
+        self.saver = WriteBehindSaver(update_product_notes_batch, on_flushed=self.on_translations_saved)
+        # Načtené produkty jsou zabrané (lease), aby je nepřekládal někdo jiný současně
+        self.leases = WorkLeases()
+        # Žurnál stavů produktů: potvrzené a neuložené překlady z minulého běhu se uloží hned;
+        # na pozadí, protože put() při nedostupné DB čeká na místo ve frontě a GUI by nenaběhlo
+        self.journal = get_work_journal()
+        if self.journal is not None:
+            threading.Thread(target=self.replay_journal, name="journal-replay", daemon=True).start()
+
         self.style = ttk.Style()
         try:
             self.style.configure("Big.TButton", font=("Arial", 14), padding=(20, 12))
@@ -43,6 +94,15 @@ class TranslationApp:
 
         self.create_widgets()
         self.check_queue()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def replay_journal(self):
+        """Vlákno pro opakované uložení překladů, které minulý běh nestihl zapsat do DB"""
+        try:
+            self.journal.replay_pending(self.saver)
+        except Exception as e:
+            # Záznamy zůstávají v žurnálu jako potvrzené → zkusí se znovu při dalším startu
+            logger.warning("Opakované uložení překladů ze žurnálu selhalo: %s", e)
 
     def create_widgets(self):
         control_frame = ttk.Frame(self.root)
@@ -167,7 +227,7 @@ class TranslationApp:
     def toggle_auto_confirm(self):
         """Přepíná stav automatického potvrzování"""
         self.auto_confirm = self.auto_confirm_var.get()
-        print(f"[DEBUG] Automatické potvrzování: {'ZAPNUTO' if self.auto_confirm else 'VYPNUTO'}")
+        logger.debug("Automatické potvrzování: %s", "ZAPNUTO" if self.auto_confirm else "VYPNUTO")
 
         # Pokud je automatické potvrzování zapnuto a máme aktuální překlad, potvrdíme ho
         if self.auto_confirm and self.translated_text.get("1.0", tk.END).strip():
@@ -183,8 +243,18 @@ class TranslationApp:
         if supplier_name in DODAVATELE:
             dodavatel = DODAVATELE[supplier_name]
             self.supplier_code = dodavatel["kod"]
+            self.supplier_name = supplier_name
             self.scrape_function = dodavatel["funkce"]
-            print(f"[DEBUG] Vybrán dodavatel: {supplier_name}, kód: {self.supplier_code}")
+            logger.debug("Vybrán dodavatel: %s, kód: %s", supplier_name, self.supplier_code)
+            # Nezpracované produkty předchozího dodavatele uvolníme pro ostatní
+            self.leases.release(row[0] for row in self.current_products[self.current_index:])
+            self.current_products = []
+            self.current_index = 0
+            self.product_cursor = None
+            self.cursor_wrapped = False
+            # Rozpracované produkty předchozího dodavatele už nepotřebujeme
+            for siv_code in list(self.prefetch_cache.keys()):
+                self.discard_prefetched(siv_code)
         else:
             messagebox.showerror("Chyba", f"Neznámý dodavatel: {supplier_name}")
             return
@@ -199,14 +269,20 @@ class TranslationApp:
     def load_products_thread(self):
         """Vlákno pro načítání produktů z DB"""
         try:
-            print(f"[DEBUG] Začínám načítat produkty pro dodavatele {self.supplier_code}")
+            logger.debug("Začínám načítat produkty pro dodavatele %s", self.supplier_code)
             start_time = time.time()
 
-            products = get_products(self.supplier_code)
-            print("Vráceno z SQL dotazu:")
-            print(products)
+            products = self.leases.fetch(self.supplier_code, after=self.product_cursor)
+            if not products and self.product_cursor is not None and not self.cursor_wrapped:
+                # Konec seznamu → jednou znovu od začátku (produkty, které zůstaly nepřeložené)
+                logger.debug("Konec seznamu produktů - načítám znovu od začátku")
+                self.cursor_wrapped = True
+                self.product_cursor = None
+                products = self.leases.fetch(self.supplier_code)
+            if products:
+                self.product_cursor = products[-1][0]
 
-            print(f"[DEBUG] Načteno {len(products)} produktů za {time.time() - start_time:.2f}s")
+            logger.debug("Načteno %d produktů za %.2fs", len(products), time.time() - start_time)
 
             if not products:
                 self.result_queue.put(("error", "Žádné produkty k překladu"))
@@ -216,15 +292,16 @@ class TranslationApp:
             self.current_index = 0
             self.result_queue.put(("products_loaded", products))
         except Exception as e:
-            print(f"[ERROR] Chyba při načítání produktů: {str(e)}")
+            logger.error("Chyba při načítání produktů: %s", e, exc_info=True)
             self.result_queue.put(("error", str(e)))
         finally:
+            self.scrape_in_progress = False
             self.set_loading(False)
 
     def load_product_details(self):
         """Načte detaily produktu a připraví překlad"""
         if self.current_index >= len(self.current_products):
-            print("[DEBUG] Načítám další produkty...")
+            logger.debug("Načítám další produkty...")
             self.set_loading(True, "Načítám další produkty...")
             if self.scrape_in_progress:
                 return
@@ -258,7 +335,7 @@ class TranslationApp:
         self.status1_var.set(left_text)
         self.status2_var.set(right_text)
 
-        print(f"[DEBUG] Načítám produkt: {pnumber} ({left_text}) ({right_text})")
+        logger.debug("Načítám produkt: %s (%s) (%s)", pnumber, left_text, right_text, extra={"siv_code": pnumber})
 
         # Vymazání textových polí
         self.clear_texts()
@@ -266,100 +343,185 @@ class TranslationApp:
         self.set_loading(True, f"Načítám originál pro {pnumber}…")
         self.translation_progress.start()
 
-        # Spustíme nejprve načtení originálu
+        # Aktuální produkt (pokud už není rozpracovaný v předstihu) + look-ahead okno
+        entry = self.get_or_start_product(pnumber, stream=STREAM_TRANSLATION)
+        self.prefetch_next_products()
+
         threading.Thread(
-            target=self.scrape_original_thread,
-            args=(pnumber, None),
+            target=self.wait_for_product_thread,
+            args=(entry,),
             daemon=True
         ).start()
 
-    def scrape_original_thread(self, siv_code, siv_name_unused):
+    def get_or_start_product(self, siv_code, stream=False):
+        """Vrátí rozpracovaný produkt z cache, případně spustí jeho scrape + překlad"""
+        with self.prefetch_lock:
+            entry = self.prefetch_cache.get(siv_code)
+            if entry is None:
+                entry = PrefetchEntry(siv_code)
+                entry.stream = stream
+                entry.future = self.prefetch_executor.submit(self.process_product, entry)
+                self.prefetch_cache[siv_code] = entry
+            return entry
+
+    def prefetch_next_products(self):
+        """Spustí na pozadí scrape + překlad dalších PREFETCH_AHEAD produktů"""
+        ahead = self.current_products[self.current_index + 1:self.current_index + 1 + self.prefetch_ahead]
+        for row in ahead:
+            siv_code = row[0]
+            with self.prefetch_lock:
+                already = siv_code in self.prefetch_cache
+            if not already:
+                logger.debug("Prefetch produktu %s", siv_code, extra={"siv_code": siv_code})
+                self.get_or_start_product(siv_code)
+
+    def discard_prefetched(self, siv_code):
+        """Zahodí rozpracovanou/hotovou práci pro daný produkt"""
+        with self.prefetch_lock:
+            entry = self.prefetch_cache.pop(siv_code, None)
+        if entry is not None:
+            # Běžící stream se při dalším chunku ukončí
+            entry.cancelled = True
+        if entry is not None and entry.future is not None and entry.future.cancel():
+            # Úloha se ještě nespustila → probudíme případné čekající vlákno
+            entry.scraped.set()
+
+    def process_product(self, entry):
+        """Běží v poolu: scrapuje originál a přeloží ho. Vrací přeložený text."""
+        with product_context(entry.siv_code):
+            return self._process_product(entry)
+
+    def _process_product(self, entry):
+        siv_code = entry.siv_code
+        # Originál už stažený v minulém běhu se bere ze žurnálu
+        cached_html = self.journal.reuse_original(siv_code) if self.journal is not None else None
         try:
-            print(f"[DEBUG] Začínám scrapovat originál produktu {siv_code}")
-            original_result = self.scrape_function(siv_code)
-
-            # Podpora obou návratových typů:
-            # - nový: (html, product_number, product_title)
-            # - původní: "html"
-            original_html, prod_num, prod_title = "", "", ""
-            if isinstance(original_result, tuple):
-                if len(original_result) >= 1:
-                    original_html = original_result[0] or ""
-                if len(original_result) >= 2:
-                    prod_num = original_result[1] or ""
-                if len(original_result) >= 3:
-                    prod_title = original_result[2] or ""
+            if cached_html is not None:
+                entry.original_html = cached_html
             else:
-                original_html = original_result or ""
+                logger.debug("Začínám scrapovat originál produktu")
+                with self.metrics.timer("scrape_seconds", supplier=self.supplier_name):
+                    original_result = self.scrape_function(siv_code)
+
+                # Podpora obou návratových typů:
+                # - nový: (html, product_number, product_title)
+                # - původní: "html"
+                original_html, prod_num, prod_title = normalize_scrape_result(original_result)
+                entry.original_html = f"{original_html}"
+                # Chybová hláška scraperu (timeout, 5xx) se do žurnálu neukládá - příště se scrapuje znovu
+                if (self.journal is not None and entry.original_html.strip()
+                        and not entry.original_html.startswith(SCRAPE_ERROR_PREFIX)):
+                    self.journal.record_scraped(self.supplier_code, siv_code, entry.original_html)
+        finally:
+            entry.scraped.set()
+
+        # Prázdný originál se nepřekládá (produkt se přeskočí)
+        if not entry.original_html.strip():
+            return ""
+
+        if cached_html is not None:
+            # Produkt přeložený v minulém běhu (aktuální verzí promptu) se do LLM neposílá
+            translated = self.journal.reuse_translation(siv_code)
+            if translated:
+                logger.debug("Překlad produktu převzat ze žurnálu")
+                return translated
+
+        with self.metrics.timer("translate_seconds", supplier=self.supplier_name,
+                                mode="stream" if entry.stream else "single"):
+            translated = self.translate_html(entry.original_html, siv_code,
+                                             stream_entry=entry if entry.stream else None)
+        if self.journal is not None and translated and not entry.cancelled:
+            self.journal.record_translated(siv_code, translated)
+        return translated
+
+    def stream_translation(self, original_html, entry):
+        """Streamovaný překlad celého HTML - chunky jdou rovnou do GUI"""
+        chunks = []
+        stream = stream_routed_ai_response(build_translation_prompt(original_html))
+        try:
+            for chunk in stream:
+                if entry.cancelled:
+                    logger.debug("Stream překladu ukončen (produkt přeskočen)")
+                    return ""
+                chunks.append(chunk)
+                self.result_queue.put(("translation_chunk", chunk, entry.siv_code))
+        finally:
+            stream.close()
+        return "".join(chunks).strip()
+
+    def translate_html(self, original_html, siv_code, stream_entry=None):
+        """Přeloží originál produktu pomocí AI"""
+        logger.debug("Začínám překlad produktu %s", siv_code)
+        start_time = time.time()
+
+        memory = get_translation_memory()
+
+        # Zobrazený produkt se streamuje, pokud ho paměť nepokryje celý
+        if stream_entry is not None and (memory is None or memory.count_missing(original_html)):
+            translated = self.stream_translation(original_html, stream_entry)
+            logger.debug("Překlad (stream) dokončen za %.2fs", time.time() - start_time)
+            if memory is not None and translated:
+                # Stream jde mimo paměť → segmenty výsledku do ní aspoň doplníme
+                learned = memory.learn(original_html, translated)
+                logger.debug("Překladová paměť: doplněno %d segmentů ze streamu", learned)
+            return translated
+
+        def translate_whole(html):
+            # Příprava promptu pro překlad
+            prompt = build_translation_prompt(html)
 
-            full_html = f"{original_html}"
+            # Překlad pomocí AI (router volí Gemini/Together, hedging + failover)
+            return routed_ai_response(prompt)
 
-            # (Status bary už nenastavujeme, necháváme pouze dvojici z SQL)
-            self.result_queue.put(("original_loaded", full_html, siv_code))
-            self.start_translation(full_html, siv_code)
+        # Překladová paměť: LLM dostane jen segmenty, které ještě nezná
+        if memory is not None:
+            translated = memory.translate_html(original_html, routed_ai_response, fallback_function=translate_whole)
+            logger.debug("Překladová paměť: %s", memory.stats())
+        else:
+            translated = translate_whole(original_html)
 
-        except Exception as e:
-            # Zachováme původní tiché přeskočení s logem
-            msg = f"Scraper selhal u produktu {siv_code}: {e}"
-            print(f"[WARN] {msg}")
-            self.result_queue.put(("skip", msg))
-        finally:
-            self.scrape_in_progress = False
+        logger.debug("Překlad dokončen za %.2fs", time.time() - start_time)
+        return translated
 
-    def start_translation(self, original_html, siv_code):
-        """Spustí proces překladu"""
-        if self.translation_in_progress:
-            return
+    def wait_for_product_thread(self, entry):
+        """Počká na (případně už hotový) produkt a předá originál a překlad do GUI"""
+        with product_context(entry.siv_code):
+            self._wait_for_product(entry)
 
-        # 🚀 Nová kontrola – prázdný originál → rovnou přeskočit
-        if not original_html or not original_html.strip():
-            print(f"[DEBUG] Originál pro {siv_code} je prázdný – přeskočeno")
-            self.skip_product()
+    def _wait_for_product(self, entry):
+        siv_code = entry.siv_code
+        entry.scraped.wait()
+
+        if entry.original_html is None:
+            # Zachováme původní tiché přeskočení s logem
+            try:
+                entry.future.result()
+                err = "neznámá chyba"
+            except Exception as e:
+                err = e
+            msg = f"Scraper selhal u produktu {siv_code}: {err}"
+            logger.warning("%s", msg)
+            self.result_queue.put(("skip", msg, siv_code, "scrape_error"))
             return
 
-        self.translation_in_progress = True
-        self.translation_progress.start()
+        # 🚀 Prázdný originál → rovnou přeskočit
+        if not entry.original_html.strip():
+            logger.debug("Originál je prázdný – přeskočeno")
+            self.result_queue.put(("skip", f"Originál pro {siv_code} je prázdný", siv_code, "empty_original"))
+            return
 
-        threading.Thread(
-            target=self.translate_thread,
-            args=(original_html, siv_code),
-            daemon=True
-        ).start()
+        # (Status bary už nenastavujeme, necháváme pouze dvojici z SQL)
+        self.result_queue.put(("original_loaded", entry.original_html, siv_code))
 
-    def translate_thread(self, original_html, siv_code):
-        """Vlákno pro překlad"""
         try:
-            print(f"[DEBUG] Začínám překlad produktu {siv_code}")
-            start_time = time.time()
-
-            # Příprava promptu pro překlad
-            prompt = (
-                    "Přelož následující text z **němčiny** do češtiny. Zachovej přesnou strukturu HTML:"\
-                    "\n1. VŠECHNY HTML tagy, atributy a entity (jako `&nbsp;`) ponech beze změny"\
-                    "\n2. Překládej POUZE textový obsah mezi tagy"\
-                    "\n3. Zachovej číselné hodnoty, kódy (IP42, USB), technické parametry (3.5 mil, 100 řádků/s) a firemní názvy (Honeywell) beze změny"\
-                    "\n4. Nikdy nepřidávej cizojazyčné znaky (jako 几乎) ani znaky mimo českou znakovou sadu, drž se českého jazyka"\
-                    "\n5. V technických termínech použij standardní českou terminologii (např. 'lineární imager', 'IP42')"\
-                    "\n6. Pokud v textu je 3.5 cm, přelož to jako 3,5 cm (s čárkou), pokud je 3.5 mil, přelož to jako 3,5 mil (s čárkou)"\
-                    "\n7. Nepřidávej nic co není v původním textu například: ```html to nepřidavej"\
-                    "\n\nText k překladu:\n\n" + original_html
-            )
-
-            # Překlad pomocí AI
-            if prompt :
-                # translated = get_ai_response(prompt)
-                translated = gemini_ai_response(prompt)
-
-            print(f"[DEBUG] Překlad dokončen za {time.time() - start_time:.2f}s")
-
+            translated = entry.future.result()
             self.result_queue.put(("translation_loaded", translated, siv_code))
-
         except Exception as e:
-            print(f"[ERROR] Chyba při překladu produktu {siv_code}: {str(e)}")
-            self.result_queue.put(("error", f"Chyba při překladu produktu {siv_code}: {str(e)}"))
+            logger.error("Chyba při překladu produktu %s: %s", siv_code, e, exc_info=True)
+            self.metrics.inc("translate_errors_total", supplier=self.supplier_name, reason="llm_error")
+            self.result_queue.put(("error", f"Chyba při překladu produktu {siv_code}: {str(e)}", siv_code))
         finally:
-            self.translation_in_progress = False
-            self.result_queue.put(("translation_finished",))
+            self.result_queue.put(("translation_finished", siv_code))
 
     def check_queue(self):
         """Kontrola fronty pro aktualizaci GUI"""
@@ -367,26 +529,34 @@ class TranslationApp:
             while True:
                 result = self.result_queue.get_nowait()
 
+                # Výsledky pro produkt, který už není zobrazený (přeskočený), zahodíme
+                if self.is_stale_result(result):
+                    logger.debug("Zahazuji zastaralou zprávu %s", result[0])
+                    continue
+
                 if result[0] == "products_loaded":
                     products = result[1]
                     if not products:
                         messagebox.showinfo("Info", "Žádné další produkty k překladu")
                         self.reset_ui()
                     else:
-                        print(f"[DEBUG] Zobrazuji načtené produkty")
+                        logger.debug("Zobrazuji načtené produkty")
                         self.skip_btn["state"] = "normal"
                         self.confirm_btn["state"] = "normal"
                         self.load_product_details()
 
                 elif result[0] == "skip":
                     warn_msg = result[1]
-                    print(f"[DEBUG] {warn_msg} -> přeskakuji")
+                    logger.debug("%s -> přeskakuji", warn_msg, extra={"siv_code": self.current_siv_code})
+                    self.metrics.inc("products_skipped_total", supplier=self.supplier_name, reason=result[3])
                     # ✅ zapiš ignorovaný kód pro aktuálního dodavatele
                     try:
                         if self.supplier_code and self.current_siv_code:
-                            add_ignored_siv_code(self.supplier_code, self.current_siv_code)
+                            add_ignored_siv_code(self.supplier_code, self.current_siv_code, reason=warn_msg)
+                            self.leases.release([self.current_siv_code])
                     except Exception as e:
-                        print(f"[WARN] Zápis ignoreSivCode selhal: {e}")
+                        logger.warning("Zápis ignoreSivCode selhal: %s", e)
+                    self.discard_prefetched(self.current_siv_code)
                     self.set_loading(False)
                     self.translation_progress.stop()
                     self.translation_in_progress = False
@@ -396,7 +566,7 @@ class TranslationApp:
                 elif result[0] == "original_loaded":
                     original, siv_code = result[1], result[2]
 
-                    print(f"[DEBUG] Zobrazuji originál produktu {siv_code}")
+                    logger.debug("Zobrazuji originál produktu %s", siv_code, extra={"siv_code": siv_code})
 
                     # Zobrazení původního textu
                     self.original_text.config(state="normal")
@@ -411,7 +581,7 @@ class TranslationApp:
                 elif result[0] == "translation_loaded":
                     translated, siv_code = result[1], result[2]
 
-                    print(f"[DEBUG] Zobrazuji překlad produktu {siv_code}")
+                    logger.debug("Zobrazuji překlad produktu %s", siv_code, extra={"siv_code": siv_code})
 
                     # Zobrazení překladu
                     self.translated_text.delete(1.0, tk.END)
@@ -419,22 +589,37 @@ class TranslationApp:
 
                     # Automatické potvrzení pokud je aktivní
                     if self.auto_confirm:
-                        print("[DEBUG] Automaticky potvrzuji překlad")
+                        logger.debug("Automaticky potvrzuji překlad")
                         self.confirm_translation()
 
+                elif result[0] == "translation_chunk":
+                    # Průběžný výpis streamovaného překladu
+                    self.translated_text.insert(tk.END, result[1])
+                    self.translated_text.see(tk.END)
+
                 elif result[0] == "translation_finished":
                     self.translation_progress.stop()
                     self.set_loading(False)
 
                 elif result[0] == "error":
                     err_msg = result[1]
-                    print(f"[ERROR] {err_msg}")
+                    logger.error("%s", err_msg)
+                    # Rozepsaný stream by šlo omylem potvrdit jako celý překlad
+                    self.translated_text.delete(1.0, tk.END)
                     # Chybovou hlášku zobrazíme v loading řádku
                     self.set_loading(False, None)
                     self.loading_label.config(text=f"Chyba: {err_msg}")
                     self.translation_progress.stop()
                     if self.auto_confirm:
-                        # Tiché přeskočení problémového produktu a pokračování
+                        # Tiché přeskočení problémového produktu a pokračování; lease se uvolní,
+                        # jinak by ho obnova na pozadí držela celou session
+                        code = getattr(self, "current_siv_code", None)
+                        if code:
+                            try:
+                                self.leases.release([code])
+                            except Exception as e:
+                                logger.warning("Uvolnění leasu %s selhalo: %s", code, e)
+                        self.discard_prefetched(code)
                         self.current_index += 1
                         self.load_product_details()
                     else:
@@ -442,7 +627,7 @@ class TranslationApp:
                         messagebox.showerror("Chyba", err_msg)
 
                 elif result[0] == "info":
-                    print(f"[INFO] {result[1]}")
+                    logger.info("%s", result[1])
                     # Necháváme jen v loading hlášce
                     self.loading_label.config(text=result[1])
 
@@ -451,16 +636,37 @@ class TranslationApp:
 
         self.root.after(100, self.check_queue)
 
+    # Pozice SivCode ve zprávách z pracovních vláken
+    _MESSAGE_SIV_INDEX = {
+        "skip": 2,
+        "original_loaded": 2,
+        "translation_loaded": 2,
+        "translation_chunk": 2,
+        "error": 2,
+        "translation_finished": 1,
+    }
+
+    def is_stale_result(self, result):
+        """True, pokud zpráva patří k jinému než právě zobrazenému produktu"""
+        idx = self._MESSAGE_SIV_INDEX.get(result[0])
+        if idx is None or len(result) <= idx:
+            return False
+        return result[idx] != self.current_siv_code
+
     def skip_product(self):
         """Přeskočí aktuální produkt"""
         code = getattr(self, "current_siv_code", None)
-        print(f"[DEBUG] Přeskakuji produkt {code if code else '<neznámý>'}")
+        logger.debug("Přeskakuji produkt %s", code if code else "<neznámý>", extra={"siv_code": code})
+        self.metrics.inc("products_skipped_total", supplier=self.supplier_name, reason="user")
         # ✅ zapiš ignorovaný kód pro aktuálního dodavatele
         try:
             if self.supplier_code and code:
-                add_ignored_siv_code(self.supplier_code, code)
+                add_ignored_siv_code(self.supplier_code, code, reason="Přeskočeno uživatelem")
+                self.leases.release([code])
         except Exception as e:
-            print(f"[WARN] Zápis ignoreSivCode selhal: {e}")
+            logger.warning("Zápis ignoreSivCode selhal: %s", e)
+        # Rozpracovaný scrape/překlad přeskočeného produktu zahodíme
+        self.discard_prefetched(code)
         self.clear_texts()
         self.translation_progress.stop()
         self.translation_in_progress = False
@@ -469,20 +675,37 @@ class TranslationApp:
 
     def confirm_translation(self):
         """Potvrdí překlad a uloží do DB"""
+        # Během streamu by se uložil jen rozepsaný překlad
+        entry = self.prefetch_cache.get(self.current_siv_code)
+        if entry is not None and entry.future is not None and not entry.future.done():
+            if not self.auto_confirm:
+                messagebox.showwarning("Varování", "Překlad se ještě generuje")
+            return
+        if (entry is not None and entry.future is not None and not entry.future.cancelled()
+                and entry.future.exception() is not None):
+            # Překlad selhal (např. uprostřed streamu) - v poli může být jen jeho část
+            if not self.auto_confirm:
+                messagebox.showwarning("Varování", "Překlad selhal - nelze ho potvrdit")
+            return
+
         translated = self.translated_text.get(1.0, tk.END).strip()
-        print(f"[DEBUG] Potvrzuji překlad pro produkt {self.current_siv_code}")
+        logger.debug("Potvrzuji překlad pro produkt %s", self.current_siv_code, extra={"siv_code": self.current_siv_code})
 
         if not translated:
             if self.auto_confirm:
-                print("[DEBUG] Prázdný překlad – automaticky přeskočeno")
+                logger.debug("Prázdný překlad – automaticky přeskočeno", extra={"siv_code": self.current_siv_code})
+                self.metrics.inc("products_skipped_total", supplier=self.supplier_name, reason="empty_translation")
 
                 # ✅ zapiš ignorovaný kód pro aktuálního dodavatele
                 try:
                     if self.supplier_code and self.current_siv_code:
-                        add_ignored_siv_code(self.supplier_code, self.current_siv_code)
+                        add_ignored_siv_code(self.supplier_code, self.current_siv_code,
+                                             reason="Prázdný překlad")
+                        self.leases.release([self.current_siv_code])
                 except Exception as e:
-                    print(f"[WARN] Zápis ignoreSivCode selhal: {e}")
+                    logger.warning("Zápis ignoreSivCode selhal: %s", e)
 
+                self.discard_prefetched(self.current_siv_code)
                 self.clear_texts()
                 self.translation_progress.stop()
                 self.translation_in_progress = False
@@ -492,29 +715,38 @@ class TranslationApp:
                 messagebox.showwarning("Varování", "Překlad je prázdný")
             return
 
-        # Uložení v novém vlákně
-        threading.Thread(
-            target=self.save_translation_thread,
-            args=(self.current_siv_code, translated),
-            daemon=True
-        ).start()
+        # Uložení přes write-behind frontu (zapíše se v další dávce)
+        logger.debug("Řadím překlad produktu %s k uložení", self.current_siv_code, extra={"siv_code": self.current_siv_code})
+        if self.journal is not None:
+            # Do žurnálu jde text po úpravách v GUI - po pádu se uloží právě ten
+            self.journal.record_confirmed(self.current_siv_code, translated, supplier=self.supplier_code)
+        # Neblokující zařazení - při výpadku DB by čekání na místo ve frontě zamrazilo GUI
+        if not self.saver.put(self.current_siv_code, translated, block=False):
+            msg = "Fronta ukládání je plná (databáze nestíhá nebo neběží) - zkuste potvrdit znovu později"
+            logger.warning("%s", msg, extra={"siv_code": self.current_siv_code})
+            self.loading_label.config(text=msg)
+            if not self.auto_confirm:
+                messagebox.showwarning("Varování", msg)
+            return
 
-        # Přesun na další produkt
+        # Přesun na další produkt (výsledek z cache už není potřeba)
+        self.discard_prefetched(self.current_siv_code)
         self.clear_texts()
         self.translation_progress.stop()
         self.translation_in_progress = False
         self.current_index += 1
         self.load_product_details()
 
-    def save_translation_thread(self, siv_code, translation):
-        """Uložení překladu do DB"""
-        try:
-            print(f"[DEBUG] Ukládám překlad pro produkt {siv_code}")
-            update_product_note(siv_code, translation)
-            self.result_queue.put(("info", f"Překlad pro produkt {siv_code} uložen"))
-        except Exception as e:
-            print(f"[ERROR] Chyba při ukládání: {str(e)}")
-            self.result_queue.put(("error", str(e)))
+    def on_translations_saved(self, notes, latency, result):
+        """Volá ukládací vlákno po zápisu dávky do DB"""
+        if self.journal is not None:
+            self.journal.record_flush(notes, result)
+        self.leases.release(siv_code for siv_code, _ in notes)
+        if len(notes) == 1:
+            message = f"Překlad pro produkt {notes[0][0]} uložen"
+        else:
+            message = f"Uloženo {len(notes)} překladů"
+        self.result_queue.put(("info", f"{message} ({latency * 1000:.0f} ms)"))
 
     def clear_texts(self):
         """Vymaže obě textová pole"""
@@ -525,7 +757,7 @@ class TranslationApp:
 
     def reset_ui(self):
         """Resetuje UI do výchozího stavu"""
-        print("[DEBUG] Resetuji UI")
+        logger.debug("Resetuji UI")
         self.clear_texts()
         self.skip_btn["state"] = "disabled"
         self.confirm_btn["state"] = "disabled"
@@ -535,6 +767,20 @@ class TranslationApp:
         self.translation_progress.stop()
         self.translation_in_progress = False
 
+    def on_close(self):
+        """Zavření okna - zruší rozpracovaný prefetch a uloží překlady čekající ve frontě"""
+        # Ručně místo shutdown(cancel_futures=True), které je až od Pythonu 3.9
+        with self.prefetch_lock:
+            entries = list(self.prefetch_cache.values())
+        for entry in entries:
+            entry.cancelled = True
+            if entry.future is not None:
+                entry.future.cancel()
+        self.prefetch_executor.shutdown(wait=False)
+        self.saver.close()
+        self.leases.close()
+        self.root.destroy()
+
     def set_loading(self, loading, message=None):
         """Nastaví stav načítání (bez změny layoutu)"""
         self.loading = loading
@@ -555,6 +801,8 @@ class TranslationApp:
 
 
 if __name__ == "__main__":
+    setup_logging()
+    start_metrics_exporter()
     root = tk.Tk()
     app = TranslationApp(root)
     root.mainloop()
@@ -0,0 +1,323 @@
+"""
+Metriky běhu (GUI, dávka, shardy): počítadla, histogramy latencí a gauge.
+
+- počítadla a histogramy nesou labely (dodavatel, provider/model, důvod přeskočení, ...)
+- gauge se počítá až při čtení funkcí (hloubky front, otevřená spojení)
+- export: Prometheus text na http://METRICS_HOST:METRICS_PORT/metrics (JSON na /metrics.json)
+  a/nebo periodický JSON dump do METRICS_DUMP_PATH každých METRICS_DUMP_SECONDS
+- bez METRICS_PORT a METRICS_DUMP_PATH se metriky jen sbírají (snapshot() ve statistikách)
+
+Použití:
+    metrics = get_metrics()
+    metrics.inc("products_skipped_total", supplier="api", reason="empty_original")
+    with metrics.timer("db_fetch_seconds", op="get_products"):
+        ...
+    metrics.gauge("queue_depth", queue.qsize, queue="scrape")
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = "translator_"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_DUMP_PATH = os.getenv("METRICS_DUMP_PATH", "")
+METRICS_DUMP_SECONDS = float(os.getenv("METRICS_DUMP_SECONDS", "30"))
+
+# Hranice bucketů latence v sekundách (od lokálních dotazů po pomalé LLM odpovědi)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Výsledky cache, které se počítají jako zásah
+_CACHE_HIT_RESULTS = ("hit", "revalidated")
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """Histogram s pevnými buckety (jako Prometheus) + součet, počet a maximum"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Odhad kvantilu = horní hranice bucketu, do kterého padne (přesnost dle bucketů)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum_s": round(self.sum, 4),
+            "mean_ms": round(self.sum / self.count * 1000, 2) if self.count else None,
+            "p50_ms": _ms(self.quantile(0.5)),
+            "p90_ms": _ms(self.quantile(0.9)),
+            "p99_ms": _ms(self.quantile(0.99)),
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class Metrics:
+    """Thread-safe registr metrik: name -> {labely: hodnota}"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.started = time.time()
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Změří dobu bloku do histogramu `name` (i když blok skončí výjimkou)"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def gauge(self, name, function, **labels):
+        """Zaregistruje gauge - hodnotu vrací function() v okamžiku čtení metrik"""
+        with self._lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = function
+
+    def _read_gauges(self):
+        with self._lock:
+            gauges = {name: dict(series) for name, series in self.gauges.items()}
+        values = {}
+        for name, series in gauges.items():
+            for key, function in series.items():
+                try:
+                    values.setdefault(name, {})[key] = float(function())
+                except Exception:
+                    # Gauge objektu, který už neexistuje (zavřený pool) se vynechá
+                    continue
+        return values
+
+    def cache_hit_rates(self):
+        """Podíl zásahů podle cache z počítadla cache_requests_total"""
+        totals = {}
+        with self._lock:
+            for key, value in self.counters.get("cache_requests_total", {}).items():
+                labels = dict(key)
+                cache = labels.get("cache", "")
+                hits, total = totals.get(cache, (0, 0))
+                if labels.get("result") in _CACHE_HIT_RESULTS:
+                    hits += value
+                totals[cache] = (hits, total + value)
+        return {cache: round(hits / total, 4) for cache, (hits, total) in totals.items() if total}
+
+    def snapshot(self):
+        """Všechny metriky jako slovník (JSON dump, statistiky dávky)"""
+        gauges = self._read_gauges()
+        with self._lock:
+            data = {
+                "uptime_s": round(time.time() - self.started, 2),
+                "counters": {name: [dict(key, value=value) for key, value in sorted(series.items())]
+                             for name, series in sorted(self.counters.items())},
+                "histograms": {name: [dict(key, **histogram.snapshot()) for key, histogram in sorted(series.items())]
+                               for name, series in sorted(self.histograms.items())},
+            }
+        data["gauges"] = {name: [dict(key, value=value) for key, value in sorted(series.items())]
+                          for name, series in sorted(gauges.items())}
+        data["cache_hit_rate"] = self.cache_hit_rates()
+        return data
+
+    def render_prometheus(self):
+        """Metriky v textovém formátu Prometheus (exposition format 0.0.4)"""
+        gauges = self._read_gauges()
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {METRICS_PREFIX}{name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{METRICS_PREFIX}{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {METRICS_PREFIX}{name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{METRICS_PREFIX}{name}_bucket{_format_labels(key, [('le', str(bound))])} "
+                                     f"{cumulative}")
+                    lines.append(f"{METRICS_PREFIX}{name}_bucket{_format_labels(key, [('le', '+Inf')])} "
+                                 f"{histogram.count}")
+                    lines.append(f"{METRICS_PREFIX}{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{METRICS_PREFIX}{name}_count{_format_labels(key)} {histogram.count}")
+        for name, series in sorted(gauges.items()):
+            lines.append(f"# TYPE {METRICS_PREFIX}{name} gauge")
+            for key, value in sorted(series.items()):
+                lines.append(f"{METRICS_PREFIX}{name}{_format_labels(key)} {value}")
+        for cache, rate in sorted(self.cache_hit_rates().items()):
+            lines.append(f"{METRICS_PREFIX}cache_hit_ratio{_format_labels((('cache', cache),))} {rate}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Zapíše snapshot do JSON souboru (atomicky přes dočasný soubor)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+class MetricsExporter:
+    """HTTP endpoint (/metrics, /metrics.json) a/nebo periodický JSON dump"""
+
+    def __init__(self, metrics, host=METRICS_HOST, port=METRICS_PORT,
+                 dump_path=METRICS_DUMP_PATH, dump_seconds=METRICS_DUMP_SECONDS):
+        self.metrics = metrics
+        self.dump_path = dump_path
+        self.dump_seconds = dump_seconds
+        self._stop = threading.Event()
+        self._httpd = None
+
+        if port:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    exporter._handle(self)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self._httpd = ThreadingHTTPServer((host, port), Handler)
+            self._httpd.daemon_threads = True
+            threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info("Metriky na http://%s:%s/metrics", host, port)
+        if dump_path:
+            threading.Thread(target=self._dump_loop, name="metrics-dump", daemon=True).start()
+            logger.info("Metriky se zapisují do %s každých %.0fs", dump_path, dump_seconds)
+
+    def _handle(self, handler):
+        path = handler.path.split("?", 1)[0]
+        if path == "/metrics":
+            body = self.metrics.render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body = json.dumps(self.metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        else:
+            handler.send_error(404)
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _dump(self):
+        try:
+            self.metrics.dump(self.dump_path)
+        except Exception as e:
+            logger.warning("Zápis metrik do %s selhal: %s", self.dump_path, e)
+
+    def _dump_loop(self):
+        while not self._stop.wait(self.dump_seconds):
+            self._dump()
+
+    def close(self):
+        """Zastaví export; JSON dump se zapíše ještě jednou s konečnými hodnotami"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        if self.dump_path:
+            self._dump()
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_metrics():
+    """Sdílený registr metrik procesu"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics()
+    return _metrics
+
+
+def start_metrics_exporter(instance=None):
+    """
+    Spustí export metrik podle METRICS_PORT / METRICS_DUMP_PATH (jednou za proces).
+    instance = index worker procesu shardedRunneru: port se posune o instance + 1
+    a dump jde do vlastního souboru, aby se procesy nepřepisovaly.
+    """
+    global _exporter
+    with _exporter_lock:
+        if _exporter is not None or not (METRICS_PORT or METRICS_DUMP_PATH):
+            return _exporter
+        port, dump_path = METRICS_PORT, METRICS_DUMP_PATH
+        if instance is not None:
+            port = port + instance + 1 if port else 0
+            if dump_path:
+                root, ext = os.path.splitext(dump_path)
+                dump_path = f"{root}.shard{instance}{ext}"
+        try:
+            _exporter = MetricsExporter(get_metrics(), port=port, dump_path=dump_path)
+        except OSError as e:
+            logger.warning("Export metrik se nepodařilo spustit: %s", e)
+            return None
+        atexit.register(_exporter.close)
+        return _exporter
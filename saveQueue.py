@@ -0,0 +1,196 @@
+"""
+Write-behind fronta pro ukládání potvrzených překladů do DB.
+
+- put() jen zařadí překlad, ukládá vlákno na pozadí
+- fronta se zapíše jedním dávkovým UPDATE, jakmile má SAVE_BATCH_SIZE položek
+  nebo nejstarší položka čeká déle než SAVE_FLUSH_SECONDS
+- stejný SivCode potvrzený vícekrát se zapíše jednou (poslední verze)
+- překlady, které se nezapsaly (výjimka nebo failed_codes), se vrátí do fronty,
+  nejvýš SAVE_MAX_RETRIES pokusů
+- close() zapíše zbytek fronty (volá se při ukončení GUI i dávky a přes atexit)
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+SAVE_BATCH_SIZE = int(os.getenv("SAVE_BATCH_SIZE", "50"))
+SAVE_FLUSH_SECONDS = float(os.getenv("SAVE_FLUSH_SECONDS", "2"))
+# Kolikrát se neuložený překlad zkusí znovu zapsat, než se v tomto běhu vzdáme
+# (potvrzený překlad pak dohraje až žurnál při dalším startu)
+SAVE_MAX_RETRIES = int(os.getenv("SAVE_MAX_RETRIES", "3"))
+
+
+class WriteBehindSaver:
+    """Sbírá (siv_code, překlad) a ukládá je po dávkách funkcí flush_function(notes)"""
+
+    def __init__(self, flush_function, batch_size=SAVE_BATCH_SIZE, flush_seconds=SAVE_FLUSH_SECONDS,
+                 on_flushed=None, max_retries=SAVE_MAX_RETRIES):
+        self.flush_function = flush_function
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        # Volá se po každém zápisu: on_flushed(notes, latency_s, výsledek flush_function)
+        self.on_flushed = on_flushed
+        self.max_retries = max_retries
+
+        self._pending = {}
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flushing = False
+        self._latencies = []
+        # siv_code -> počet neúspěšných pokusů o zápis
+        self._attempts = {}
+        self.counters = {"queued": 0, "saved": 0, "flushes": 0, "coalesced": 0,
+                         "failed": 0, "retried": 0, "dropped": 0}
+
+        self._thread = threading.Thread(target=self._run, name="save-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        get_metrics().gauge("queue_depth", self._pending_size, queue="save_behind")
+
+    def _pending_size(self):
+        with self._cond:
+            return len(self._pending)
+
+    def put(self, siv_code, note_text, block=True):
+        """
+        Zařadí překlad k uložení. Když fronta překročí desetinásobek dávky (DB nestíhá
+        nebo neběží), block=True počká na místo; block=False vrátí False a nezařadí nic
+        (GUI vlákno nesmí zamrznout). Jinak vrací True.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Fronta ukládání je uzavřená")
+            # Když DB nestíhá, zdržíme producenta místo neomezeného růstu fronty
+            while len(self._pending) >= self.batch_size * 10 and siv_code not in self._pending:
+                if not block:
+                    return False
+                self._cond.wait()
+                if self._closed:
+                    raise RuntimeError("Fronta ukládání je uzavřená")
+            if siv_code in self._pending:
+                self.counters["coalesced"] += 1
+            else:
+                self.counters["queued"] += 1
+            self._pending[siv_code] = note_text
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def _take_batch(self):
+        """Čeká na plnou dávku nebo vypršení času; vrací dávku nebo None při ukončení"""
+        with self._cond:
+            while True:
+                if self._pending:
+                    waited = time.monotonic() - self._oldest
+                    if self._closed or len(self._pending) >= self.batch_size or waited >= self.flush_seconds:
+                        break
+                    self._cond.wait(self.flush_seconds - waited)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+
+            items = list(self._pending.items())
+            batch, rest = items[:self.batch_size], items[self.batch_size:]
+            self._pending = dict(rest)
+            self._oldest = time.monotonic() if rest else None
+            self._flushing = True
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            start = time.monotonic()
+            result = None
+            try:
+                result = self.flush_function(batch)
+                failed = set(map(str, result.get("failed_codes", ()))) if isinstance(result, dict) else set()
+            except Exception as e:
+                logger.error("Dávkové uložení %d překladů selhalo: %s", len(batch), e, exc_info=True)
+                failed = {str(siv_code) for siv_code, _ in batch}
+            latency = time.monotonic() - start
+            logger.debug("Uloženo %d/%d překladů za %.0f ms", len(batch) - len(failed), len(batch), latency * 1000)
+            with self._cond:
+                self.counters["flushes"] += 1
+                self.counters["saved"] += len(batch) - len(failed)
+                # Počty, které vrací flush_function (např. applied/unchanged/missing u bulk režimu)
+                if isinstance(result, dict):
+                    for key, value in result.items():
+                        if isinstance(value, int) and key != "failed":
+                            self.counters[key] = self.counters.get(key, 0) + value
+                self._requeue_failed(batch, failed)
+                self._latencies.append(latency)
+                self._flushing = False
+                self._cond.notify_all()
+            if self.on_flushed:
+                try:
+                    self.on_flushed(batch, latency, result)
+                except Exception as e:
+                    logger.warning("on_flushed selhal: %s", e, exc_info=True)
+
+    def _requeue_failed(self, batch, failed):
+        """Vrátí nezapsané překlady do fronty (volá se pod self._cond)"""
+        self.counters["failed"] += len(failed)
+        for siv_code, note_text in batch:
+            if str(siv_code) not in failed:
+                self._attempts.pop(siv_code, None)
+                continue
+            attempts = self._attempts.get(siv_code, 0) + 1
+            if siv_code in self._pending:
+                # Mezitím přišla novější verze překladu - ta se zapíše sama
+                self._attempts.pop(siv_code, None)
+            elif attempts > self.max_retries or self._closed:
+                logger.warning("Překlad %s se nepodařilo uložit ani po %d pokusech", siv_code, attempts,
+                               extra={"siv_code": siv_code})
+                self._attempts.pop(siv_code, None)
+                self.counters["dropped"] += 1
+            else:
+                self._attempts[siv_code] = attempts
+                self._pending[siv_code] = note_text
+                self.counters["retried"] += 1
+                if self._oldest is None:
+                    # Opakovaný pokus až po SAVE_FLUSH_SECONDS, ne hned
+                    self._oldest = time.monotonic()
+
+    def flush(self, timeout=None):
+        """Vynutí okamžitý zápis všeho ve frontě a počká na jeho dokončení"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pending:
+                self._oldest = time.monotonic() - self.flush_seconds
+                self._cond.notify_all()
+            while self._pending or self._flushing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Zapíše zbytek fronty a ukončí vlákno (opakované volání nevadí)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            data = dict(self.counters)
+            latencies = sorted(self._latencies)
+            data["pending"] = len(self._pending)
+        if latencies:
+            data["flush_p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 1)
+            data["flush_max_ms"] = round(latencies[-1] * 1000, 1)
+        return data
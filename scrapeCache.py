@@ -0,0 +1,185 @@
+"""
+Perzistentní cache scrapovaných stránek (SQLite na disku).
+
+- klíč: (dodavatel, PNumber)
+- ukládá zdrojové HTML, výsledek parsování a HTTP validátory (ETag / Last-Modified)
+- čerstvý záznam (mladší než TTL) se vrací bez síťového požadavku
+- starší záznam s validátorem se revaliduje podmíněným GET (304 = bez stahování i parsování)
+- velikost je omezená, při překročení se mažou nejdéle nepoužité záznamy (LRU)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import get_metrics
+
+SCRAPE_CACHE_ENABLED = os.getenv("SCRAPE_CACHE", "1") != "0"
+SCRAPE_CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH", "scrapeCache.sqlite")
+SCRAPE_CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", str(7 * 24 * 3600)))
+SCRAPE_CACHE_MAX_MB = float(os.getenv("SCRAPE_CACHE_MAX_MB", "500"))
+# Po kolika zápisech se velikost cache přepočítá z DB (sdílí ji víc procesů)
+SIZE_RECHECK_STORES = 100
+
+
+class CacheEntry:
+    def __init__(self, row, ttl):
+        (self.supplier, self.pnumber, self.url, self.body, result,
+         self.etag, self.last_modified, self.fetched_at, self.last_access, self.size) = row
+        self.result = json.loads(result) if result is not None else None
+        self.fresh = (time.time() - self.fetched_at) < ttl
+
+    @property
+    def has_validators(self):
+        return bool(self.etag or self.last_modified)
+
+
+class ScrapeCache:
+    """Thread-safe SQLite cache s TTL, LRU evikcí a počítadly zásahů"""
+
+    def __init__(self, path=SCRAPE_CACHE_PATH, ttl=SCRAPE_CACHE_TTL, max_bytes=SCRAPE_CACHE_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # timeout: soubor sdílí i worker procesy shardedRunneru
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                supplier TEXT NOT NULL,
+                pnumber TEXT NOT NULL,
+                url TEXT,
+                body BLOB,
+                result TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (supplier, pnumber)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_pages_last_access ON pages(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+        self.counters = {"hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _inc(self, key, amount=1):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def get(self, supplier, pnumber):
+        """Vrátí CacheEntry nebo None (bez ohledu na čerstvost, tu nese entry.fresh)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT supplier, pnumber, url, body, result, etag, last_modified, fetched_at, last_access, size "
+                "FROM pages WHERE supplier = ? AND pnumber = ?",
+                (str(supplier), str(pnumber)),
+            ).fetchone()
+        return CacheEntry(row, self.ttl) if row else None
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Hlavičky pro podmíněný GET podle uložených validátorů"""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def hit(self, entry):
+        """Záznam byl použit bez síťového požadavku"""
+        with self._lock:
+            self._inc("hits")
+            get_metrics().inc("cache_requests_total", cache="scrape", result="hit")
+            self._conn.execute(
+                "UPDATE pages SET last_access = ? WHERE supplier = ? AND pnumber = ?",
+                (time.time(), entry.supplier, entry.pnumber),
+            )
+            self._conn.commit()
+
+    def revalidated(self, entry):
+        """Server odpověděl 304 - záznam je znovu čerstvý"""
+        now = time.time()
+        with self._lock:
+            self._inc("revalidated")
+            get_metrics().inc("cache_requests_total", cache="scrape", result="revalidated")
+            self._conn.execute(
+                "UPDATE pages SET fetched_at = ?, last_access = ? WHERE supplier = ? AND pnumber = ?",
+                (now, now, entry.supplier, entry.pnumber),
+            )
+            self._conn.commit()
+
+    def miss(self):
+        with self._lock:
+            self._inc("misses")
+        get_metrics().inc("cache_requests_total", cache="scrape", result="miss")
+
+    def put(self, supplier, pnumber, result, url=None, body=None, etag=None, last_modified=None):
+        """Uloží/aktualizuje záznam a případně uvolní místo (LRU)"""
+        now = time.time()
+        result_json = json.dumps(result, ensure_ascii=False)
+        size = len(body or b"") + len(result_json.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM pages WHERE supplier = ? AND pnumber = ?",
+                (str(supplier), str(pnumber)),
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages "
+                "(supplier, pnumber, url, body, result, etag, last_modified, fetched_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(supplier), str(pnumber), url, body, result_json, etag, last_modified, now, now, size),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self._inc("stores")
+            # Lokální součet nevidí zápisy jiných procesů → občas se velikost ověří v DB
+            if self._total_bytes > self.max_bytes or self.counters["stores"] % SIZE_RECHECK_STORES == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Maže nejdéle nepoužité záznamy, dokud velikost neklesne na 90 % limitu"""
+        target = self.max_bytes * 0.9
+        # Do cache zapisují i jiné procesy → skutečná velikost z DB, ne jen lokální součet
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if self._total_bytes <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT supplier, pnumber, size FROM pages ORDER BY last_access"
+        ).fetchall()
+        for supplier, pnumber, size in rows:
+            if self._total_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM pages WHERE supplier = ? AND pnumber = ?", (supplier, pnumber))
+            self._total_bytes -= size
+            self._inc("evictions")
+
+    def stats(self):
+        """Počítadla cache + hit rate (čerstvé zásahy i 304 se počítají jako zásah)"""
+        with self._lock:
+            data = dict(self.counters)
+        lookups = data["hits"] + data["revalidated"] + data["misses"]
+        data["hit_rate"] = round((data["hits"] + data["revalidated"]) / lookups, 3) if lookups else 0.0
+        data["size_mb"] = round(self._total_bytes / (1024 * 1024), 2)
+        return data
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_scrape_cache():
+    """Sdílená instance cache, nebo None pokud je vypnutá (SCRAPE_CACHE=0)"""
+    global _cache
+    if not SCRAPE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ScrapeCache()
+    return _cache
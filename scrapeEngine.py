@@ -0,0 +1,100 @@
+"""
+Sdílený HTTP klient pro scrapery dodavatelů.
+
+- jedna requests.Session s poolem keep-alive spojení (sdílená mezi vlákny)
+- explicitní timeout na každý požadavek
+- limit souběžných požadavků na jeden host + minimální rozestup mezi nimi (politeness)
+"""
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Konfigurace (lze přepsat v .env)
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", "20"))
+SCRAPE_MAX_PER_HOST = int(os.getenv("SCRAPE_MAX_PER_HOST", "8"))
+SCRAPE_DELAY = float(os.getenv("SCRAPE_DELAY", "0.05"))
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) TranslateDescriptions/1.0"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Vrátí sdílenou Session (vytvoří ji při prvním volání)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                retry = Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=("GET", "HEAD"),
+                )
+                # Pool musí pojmout všechna souběžná spojení na jeden host
+                adapter = HTTPAdapter(
+                    pool_connections=10,
+                    pool_maxsize=max(SCRAPE_MAX_PER_HOST, 10),
+                    max_retries=retry,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"User-Agent": USER_AGENT})
+                _session = session
+    return _session
+
+
+class HostLimiter:
+    """Omezí počet souběžných požadavků na host a vynutí rozestup mezi jejich starty"""
+
+    def __init__(self, max_concurrent=SCRAPE_MAX_PER_HOST, delay=SCRAPE_DELAY):
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.delay = delay
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        if self.delay > 0:
+            with self._lock:
+                now = time.monotonic()
+                start_at = max(now, self._next_start)
+                self._next_start = start_at + self.delay
+            if start_at > now:
+                time.sleep(start_at - now)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+        return False
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_host_limiter(host):
+    """Vrátí (a případně vytvoří) limiter pro daný host"""
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = HostLimiter()
+            _limiters[host] = limiter
+        return limiter
+
+
+def polite_get(url, timeout=None, **kwargs):
+    """
+    GET přes sdílenou Session s limitem na host a timeoutem.
+    Výjimky requests propadají volajícímu (stejně jako u requests.get).
+    """
+    host = urlparse(url).netloc
+    with get_host_limiter(host):
+        return get_session().get(url, timeout=timeout or SCRAPE_TIMEOUT, **kwargs)
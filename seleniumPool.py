@@ -0,0 +1,209 @@
+"""
+Pool dlouhožijících headless Chrome driverů pro scrapery, které potřebují prohlížeč.
+
+- driver se půjčuje na jeden produkt (acquire/release nebo context manager driver())
+- při půjčení po nečinnosti se ověří, že driver ještě žije, jinak se nahradí
+- po KOSATEC_DRIVER_MAX_USES použitích nebo po pádu se driver recykluje
+- cookies (consent, session) se předávají i do nově vytvořených driverů
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+KOSATEC_DRIVERS = int(os.getenv("KOSATEC_DRIVERS", "2"))
+KOSATEC_DRIVER_MAX_USES = int(os.getenv("KOSATEC_DRIVER_MAX_USES", "50"))
+
+# Driver nečinný déle než tolik sekund se před půjčením ověří
+IDLE_CHECK_SECONDS = 30
+
+
+def _create_chrome_driver():
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--window-size=1920,1080")
+    return webdriver.Chrome(options=options)
+
+
+class _PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+
+class DriverPool:
+    """Thread-safe pool Selenium driverů s omezenou velikostí"""
+
+    def __init__(self, size=KOSATEC_DRIVERS, max_uses=KOSATEC_DRIVER_MAX_USES,
+                 base_url=None, factory=_create_chrome_driver):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.base_url = base_url
+        self.factory = factory
+
+        self._idle = []
+        # Půjčené drivery - close() je musí ukončit i tehdy, když se nevrátí
+        self._in_use = set()
+        self._created = 0
+        self._cookies = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+    # ---------- Interní správa driverů ----------
+    def _new_driver(self):
+        driver = self.factory()
+        # Přenesení cookies (consent apod.) z předchozích driverů; kopie, protože
+        # stejný seznam si současně berou i další vytvářené drivery
+        with self._cond:
+            cookies = [dict(cookie) for cookie in self._cookies]
+        if cookies and self.base_url:
+            try:
+                driver.get(self.base_url)
+                for cookie in cookies:
+                    cookie.pop("sameSite", None)
+                    try:
+                        driver.add_cookie(cookie)
+                    except WebDriverException:
+                        continue
+            except WebDriverException as e:
+                logger.warning("Obnova cookies do nového driveru selhala: %s", e)
+        logger.debug("Vytvořen nový Selenium driver (%d/%d)", self._created, self.size)
+        return _PooledDriver(driver)
+
+    @staticmethod
+    def _is_alive(pooled):
+        try:
+            _ = pooled.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _destroy(self, pooled):
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    # ---------- Veřejné API ----------
+    def acquire(self, timeout=None):
+        """Půjčí driver (blokuje, dokud není nějaký volný)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Pool driverů je uzavřený")
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    pooled = None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Žádný volný Selenium driver")
+                self._cond.wait(remaining)
+
+        if pooled is None:
+            try:
+                pooled = self._new_driver()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+        elif time.monotonic() - pooled.last_used > IDLE_CHECK_SECONDS and not self._is_alive(pooled):
+            logger.warning("Selenium driver po nečinnosti neodpovídá - vytvářím nový")
+            self._destroy(pooled)
+            return self.acquire(timeout)
+
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                self._in_use.add(pooled)
+        if closed:
+            self._destroy(pooled)
+            raise RuntimeError("Pool driverů je uzavřený")
+        pooled.uses += 1
+        return pooled
+
+    def release(self, pooled, crashed=False):
+        """Vrátí driver do poolu; po pádu nebo vyčerpání použití ho recykluje"""
+        with self._cond:
+            if pooled not in self._in_use:
+                # Driver už ukončil close()
+                return
+            self._in_use.discard(pooled)
+        pooled.last_used = time.monotonic()
+        if crashed and not self._is_alive(pooled):
+            logger.warning("Selenium driver spadl - recykluji")
+            self._destroy(pooled)
+            return
+
+        try:
+            cookies = pooled.driver.get_cookies()
+        except Exception:
+            cookies = None
+        if cookies is not None:
+            with self._cond:
+                self._cookies = cookies
+
+        if pooled.uses >= self.max_uses or self._closed:
+            self._destroy(pooled)
+            return
+
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """Context manager: with pool.driver() as driver: ..."""
+        pooled = self.acquire(timeout)
+        crashed = False
+        try:
+            yield pooled.driver
+        except WebDriverException:
+            crashed = True
+            raise
+        finally:
+            self.release(pooled, crashed=crashed)
+
+    def close(self):
+        """Ukončí všechny drivery (nečinné i půjčené) a zabrání dalšímu půjčování"""
+        with self._cond:
+            self._closed = True
+            drivers = self._idle + list(self._in_use)
+            self._idle = []
+            self._in_use.clear()
+        for pooled in drivers:
+            self._destroy(pooled)
+
+
+_kosatec_pool = None
+_kosatec_pool_lock = threading.Lock()
+
+
+def get_kosatec_driver_pool():
+    """Sdílený pool driverů pro Kosatec (vytvoří se při prvním použití)"""
+    global _kosatec_pool
+    if _kosatec_pool is None:
+        with _kosatec_pool_lock:
+            if _kosatec_pool is None:
+                _kosatec_pool = DriverPool(base_url=os.getenv("KOSATEC_BASE_URL", "https://shop.kosatec.de").rstrip("/") + "/")
+                atexit.register(_kosatec_pool.close)
+    return _kosatec_pool
@@ -0,0 +1,185 @@
+"""
+Dávkový běh rozdělený do více procesů (mimo GIL jednoho procesu).
+
+Katalog dodavatele se rozdělí na --shards částí podle hashe SivCode a každá část
+běží v samostatném procesu s vlastním BatchPipeline (scraper, LLM klienti, DB pool).
+Koordinátor průběžně sčítá průběh všech procesů a na konci vypíše souhrnné statistiky.
+RPM/TPM kvóta LLM se mezi procesy dělí rovným dílem (LLM_QUOTA_SHARE).
+
+Použití:
+    python shardedRunner.py --dodavatel api --shards 4
+    python shardedRunner.py --dodavatel api --shards 8 --translate-workers 2 --limit 10000
+"""
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from batchPipeline import BatchPipeline, build_arg_parser, pipeline_kwargs
+from database import update_product_notes_batch
+from logConfig import setup_logging
+from metrics import start_metrics_exporter
+from workJournal import get_work_journal
+
+logger = logging.getLogger(__name__)
+
+
+def _run_shard(supplier_name, kwargs, shard, quota_share, progress_queue, interval):
+    """Tělo worker procesu: jeden shard = jeden BatchPipeline"""
+    index = shard[0]
+    try:
+        os.environ["LLM_QUOTA_SHARE"] = str(quota_share)
+        # Proces ze "spawn" nedědí nastavení logování koordinátora
+        setup_logging()
+        # Každý proces má vlastní metriky (port METRICS_PORT + index + 1, vlastní JSON dump)
+        start_metrics_exporter(instance=index)
+        # Neuložené překlady ze žurnálu zapisuje jen koordinátor (jednou, ne v každém shardu)
+        pipeline = BatchPipeline(supplier_name, shard=shard, replay_journal=False, **kwargs)
+        result = {}
+
+        def run():
+            try:
+                result["stats"] = pipeline.run()
+            except Exception as e:
+                result["error"] = str(e)
+
+        thread = threading.Thread(target=run, name=f"shard-{index}")
+        thread.start()
+        while thread.is_alive():
+            thread.join(interval)
+            progress_queue.put(("progress", index, pipeline.stats.snapshot()))
+
+        if "error" in result:
+            progress_queue.put(("failed", index, result["error"]))
+        else:
+            progress_queue.put(("done", index, result["stats"]))
+    except Exception as e:
+        progress_queue.put(("failed", index, str(e)))
+
+
+def merge_stats(items):
+    """
+    Sečte počítadla (int, i ve vnořených slovnících); elapsed_s bere jako maximum.
+    Poměry a latence (float) se sčítat nedají, v souhrnu se vynechají.
+    """
+    merged = {}
+    for item in items:
+        for key, value in item.items():
+            if isinstance(value, bool):
+                continue
+            if key == "elapsed_s":
+                merged[key] = max(merged.get(key, 0), value)
+            elif isinstance(value, int):
+                merged[key] = merged.get(key, 0) + value
+            elif isinstance(value, dict):
+                merged[key] = merge_stats([merged.get(key, {}), value])
+    return merged
+
+
+class ShardCoordinator:
+    """Spustí worker procesy a sbírá jejich průběh a výsledky"""
+
+    def __init__(self, supplier_name, shards, kwargs, progress_interval=10.0):
+        self.supplier_name = supplier_name
+        self.shards = max(1, shards)
+        self.kwargs = dict(kwargs)
+        self.progress_interval = progress_interval
+        if self.kwargs.get("limit") is not None:
+            self.kwargs["limit"] = math.ceil(self.kwargs["limit"] / self.shards)
+
+        self.progress = {}
+        self.results = {}
+        self.failures = {}
+
+    def _report_progress(self, started):
+        total = merge_stats(self.progress.values())
+        elapsed = time.time() - started
+        saved = total.get("saved", 0)
+        logger.info("Průběh %d/%d shardů hotovo: načteno %d, přeloženo %d, uloženo %d, přeskočeno %d (%.2f produktů/s)",
+                    len(self.results), self.shards, total.get("fed", 0), total.get("translated", 0),
+                    saved, total.get("skipped", 0), saved / elapsed if elapsed else 0)
+
+    def _replay_journal(self):
+        """Uloží potvrzené překlady z minulého běhu, které se do DB nedostaly"""
+        journal = get_work_journal()
+        if journal is None or self.kwargs.get("dry_run"):
+            return
+        pending = journal.pending_saves()
+        if pending:
+            logger.info("Žurnál: ukládám %d potvrzených překladů z minulého běhu", len(pending))
+            journal.record_flush(pending, update_product_notes_batch(pending))
+
+    def run(self):
+        self._replay_journal()
+        ctx = multiprocessing.get_context("spawn")
+        progress_queue = ctx.Queue()
+        processes = {}
+        started = time.time()
+        for index in range(self.shards):
+            process = ctx.Process(
+                target=_run_shard,
+                args=(self.supplier_name, self.kwargs, (index, self.shards), 1.0 / self.shards,
+                      progress_queue, self.progress_interval),
+                name=f"shard-{index}",
+            )
+            process.start()
+            processes[index] = process
+        logger.info("Spuštěno %d worker procesů pro dodavatele %s", self.shards, self.supplier_name)
+
+        last_report = time.time()
+        while len(self.results) + len(self.failures) < self.shards:
+            try:
+                kind, index, payload = progress_queue.get(timeout=self.progress_interval)
+            except queue.Empty:
+                kind = None
+            if kind == "progress":
+                self.progress[index] = payload
+            elif kind == "done":
+                self.results[index] = payload
+                self.progress[index] = payload
+            elif kind == "failed":
+                logger.error("Shard %s selhal: %s", index, payload)
+                self.failures[index] = payload
+
+            # Proces, který skončil bez zprávy (pád interpretu, kill)
+            for index, process in processes.items():
+                if (not process.is_alive() and index not in self.results and index not in self.failures
+                        and process.exitcode not in (0, None)):
+                    logger.error("Shard %s skončil s kódem %s", index, process.exitcode)
+                    self.failures[index] = f"exitcode {process.exitcode}"
+
+            if time.time() - last_report >= self.progress_interval:
+                self._report_progress(started)
+                last_report = time.time()
+
+        for process in processes.values():
+            process.join()
+
+        stats = merge_stats(self.results.values())
+        stats["elapsed_s"] = round(time.time() - started, 2)
+        stats["shards"] = self.shards
+        stats["failed_shards"] = sorted(self.failures)
+        stats["products_per_s"] = round(stats.get("saved", 0) / stats["elapsed_s"], 2) if stats["elapsed_s"] else 0.0
+        logger.info("Všechny shardy dokončeny: %s", stats)
+        return stats
+
+
+def main(argv=None):
+    parser = build_arg_parser("Dávkový překlad rozdělený do více procesů")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 2,
+                        help="Počet worker procesů (default: počet jader)")
+    parser.add_argument("--progress-interval", type=float, default=10.0,
+                        help="Jak často (s) vypisovat souhrnný průběh")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    coordinator = ShardCoordinator(args.dodavatel, args.shards, pipeline_kwargs(args),
+                                   progress_interval=args.progress_interval)
+    coordinator.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Překladová paměť na úrovni segmentů (SQLite na disku).
+
+Scrapované HTML se rozdělí na textové segmenty mezi tagy (typicky `<li>Label: Value</li>`
+a `<b>Sekce</b>`), každý normalizovaný segment se vyhledá podle hashe a LLM dostane
+jen segmenty, které paměť ještě nezná. Výsledek se složí zpět do původní struktury HTML.
+Každý segment nese verzi promptu, kterou vznikl - po změně promptu (PROMPT_VERSION) se
+starší překlady nepoužijí a přeloží se znovu.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from LLMTranslate import build_segments_prompt, PROMPT_VERSION
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_MEMORY_ENABLED = os.getenv("TRANSLATION_MEMORY", "1") != "0"
+TRANSLATION_MEMORY_PATH = os.getenv("TRANSLATION_MEMORY_PATH", "translationMemory.sqlite")
+
+# Kolik segmentů se posílá v jednom LLM požadavku
+SEGMENTS_PER_REQUEST = int(os.getenv("TM_SEGMENTS_PER_REQUEST", "80"))
+
+_TAG_RE = re.compile(r"(<[^>]+>)")
+_LETTER_RE = re.compile(r"[^\W\d_]")
+
+
+def normalize_segment(text: str) -> str:
+    """Sjednotí bílé znaky, aby se stejné řádky z různých produktů potkaly v paměti"""
+    return " ".join(text.split())
+
+
+def segment_hash(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def split_segments(html: str):
+    """
+    Rozdělí HTML na části. Vrací seznam položek:
+        ("raw", text)                         - tag nebo text bez písmen (beze změny)
+        ("seg", leading_ws, core, trailing_ws) - text k překladu
+    Víceřádkové texty (bullet points) se dělí po řádcích.
+    """
+    parts = []
+    for token in _TAG_RE.split(html or ""):
+        if not token:
+            continue
+        if token.startswith("<") and token.endswith(">"):
+            parts.append(("raw", token))
+            continue
+        for line in re.split(r"(\n)", token):
+            if not line:
+                continue
+            core = line.strip()
+            if not core or not _LETTER_RE.search(core):
+                parts.append(("raw", line))
+                continue
+            start = line.index(core)
+            parts.append(("seg", line[:start], core, line[start + len(core):]))
+    return parts
+
+
+def parse_segments_response(ai_response: str, expected: int):
+    """Vytáhne JSON pole z odpovědi LLM a ověří počet položek"""
+    text = (ai_response or "").strip()
+    # LLM občas obalí odpověď do ```json ... ```
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end == -1:
+        raise ValueError("Odpověď neobsahuje JSON pole")
+    data = json.loads(text[start:end + 1])
+    if not isinstance(data, list) or len(data) != expected or not all(isinstance(x, str) for x in data):
+        raise ValueError(f"Očekáváno {expected} segmentů, vráceno {len(data) if isinstance(data, list) else '?'}")
+    if any(not x.strip() for x in data):
+        raise ValueError("Odpověď obsahuje prázdný segment")
+    return data
+
+
+class TranslationMemory:
+    """Thread-safe perzistentní překladová paměť s počítadly zásahů za běh"""
+
+    def __init__(self, path=TRANSLATION_MEMORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # timeout: soubor sdílí i worker procesy shardedRunneru
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS segments (
+                hash TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                prompt_version TEXT NOT NULL DEFAULT '1'
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(segments)")}
+        if "prompt_version" not in columns:
+            # Paměť z doby před verzováním promptu
+            self._conn.execute("ALTER TABLE segments ADD COLUMN prompt_version TEXT NOT NULL DEFAULT '1'")
+        self._conn.commit()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.counters = {"segments": 0, "hits": 0, "misses": 0, "llm_calls": 0, "fallbacks": 0, "learned": 0}
+
+    def _inc(self, key, amount=1):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+        data["hit_rate"] = round(data["hits"] / data["segments"], 3) if data["segments"] else 0.0
+        return data
+
+    def lookup(self, hashes):
+        """Vrátí {hash: překlad} pro známé segmenty přeložené aktuální verzí promptu"""
+        hashes = list(hashes)
+        found = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for h, target in self._conn.execute(
+                        f"SELECT hash, target FROM segments WHERE hash IN ({placeholders}) AND prompt_version = ?",
+                        chunk + [PROMPT_VERSION]):
+                    found[h] = target
+            if found:
+                self._conn.executemany("UPDATE segments SET hits = hits + 1 WHERE hash = ?",
+                                       [(h,) for h in found])
+                self._conn.commit()
+        return found
+
+    def count_missing(self, html):
+        """Počet různých segmentů HTML, které paměť nezná (bez započítání do statistik)"""
+        keys = {segment_hash(normalize_segment(part[2])) for part in split_segments(html) if part[0] == "seg"}
+        if not keys:
+            return 0
+        keys = list(keys)
+        known = 0
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                known += self._conn.execute(
+                    f"SELECT COUNT(*) FROM segments WHERE hash IN ({placeholders}) AND prompt_version = ?",
+                    chunk + [PROMPT_VERSION]).fetchone()[0]
+        return len(keys) - known
+
+    def store(self, entries):
+        """Uloží [(hash, source, target), ...]"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO segments (hash, source, target, hits, created_at, prompt_version) "
+                "VALUES (?, ?, ?, 0, ?, ?)",
+                [(h, src, tgt, now, PROMPT_VERSION) for h, src, tgt in entries],
+            )
+            self._conn.commit()
+
+    def learn(self, html, translated_html):
+        """
+        Uloží segmenty z překladu celého HTML (např. streamovaného do GUI), aby se
+        příště nemusely překládat. Páruje se jen při shodné struktuře tagů a segmentů;
+        vrací počet nově uložených segmentů.
+        """
+        source_parts, target_parts = split_segments(html), split_segments(translated_html)
+        if len(source_parts) != len(target_parts):
+            return 0
+        pairs = {}
+        for src, tgt in zip(source_parts, target_parts):
+            if src[0] != tgt[0] or (src[0] == "raw" and src[1].startswith("<") and src[1] != tgt[1]):
+                return 0
+            if src[0] == "seg":
+                normalized = normalize_segment(src[2])
+                pairs.setdefault(segment_hash(normalized), (normalized, normalize_segment(tgt[2])))
+        if not pairs:
+            return 0
+        known = set()
+        with self._lock:
+            keys = list(pairs)
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                known.update(h for (h,) in self._conn.execute(
+                    f"SELECT hash FROM segments WHERE hash IN ({placeholders}) AND prompt_version = ?",
+                    chunk + [PROMPT_VERSION]))
+        new = [(h, src, tgt) for h, (src, tgt) in pairs.items() if h not in known]
+        if new:
+            self.store(new)
+            self._inc("learned", len(new))
+        return len(new)
+
+    def _translate_missing(self, sources, ai_function):
+        """Přeloží neznámé segmenty po dávkách (JSON pole tam i zpět)"""
+        translated = []
+        for i in range(0, len(sources), SEGMENTS_PER_REQUEST):
+            chunk = sources[i:i + SEGMENTS_PER_REQUEST]
+            self._inc("llm_calls")
+            response = ai_function(build_segments_prompt(chunk))
+            translated.extend(parse_segments_response(response, len(chunk)))
+        return translated
+
+    def translate_html(self, html, ai_function, fallback_function=None):
+        """
+        Přeloží HTML s využitím paměti.
+
+        Args:
+            html (str): scrapované HTML
+            ai_function: funkce prompt -> odpověď (např. gemini_ai_response)
+            fallback_function: funkce html -> překlad celého HTML, použije se když
+                               LLM nevrátí platné JSON pole segmentů
+
+        Returns:
+            str: přeložené HTML se stejnou strukturou tagů
+        """
+        return self.translate_many([html], ai_function, fallback_function)[0]
+
+    def translate_many(self, htmls, ai_function, fallback_function=None):
+        """
+        Přeloží více HTML najednou - neznámé segmenty všech produktů se posílají
+        společně, takže pevná část promptu se platí jednou za dávku.
+
+        Returns:
+            list[str]: překlady ve stejném pořadí jako htmls
+        """
+        all_parts = []
+        all_hashes = []
+        keys = {}
+        for html in htmls:
+            parts = split_segments(html)
+            seg_hashes = []
+            for part in parts:
+                if part[0] == "seg":
+                    normalized = normalize_segment(part[2])
+                    h = segment_hash(normalized)
+                    seg_hashes.append(h)
+                    keys.setdefault(h, normalized)
+            all_parts.append(parts)
+            all_hashes.append(seg_hashes)
+
+        known = self.lookup(keys.keys())
+        missing = [h for h in keys if h not in known]
+        total = sum(len(seg_hashes) for seg_hashes in all_hashes)
+        hits = sum(1 for seg_hashes in all_hashes for h in seg_hashes if h in known)
+        self._inc("segments", total)
+        self._inc("hits", hits)
+        self._inc("misses", total - hits)
+        metrics = get_metrics()
+        metrics.inc("cache_requests_total", hits, cache="translation_memory", result="hit")
+        metrics.inc("cache_requests_total", total - hits, cache="translation_memory", result="miss")
+
+        if missing:
+            sources = [keys[h] for h in missing]
+            try:
+                targets = self._translate_missing(sources, ai_function)
+            except ValueError as e:
+                if fallback_function is None:
+                    raise
+                logger.warning("Překlad po segmentech selhal (%s) - překládám celé HTML", e)
+                self._inc("fallbacks", len(htmls))
+                return [fallback_function(html) for html in htmls]
+            self.store([(h, keys[h], target) for h, target in zip(missing, targets)])
+            known.update(zip(missing, targets))
+
+        results = []
+        for parts, seg_hashes in zip(all_parts, all_hashes):
+            out = []
+            hashes = iter(seg_hashes)
+            for part in parts:
+                if part[0] == "raw":
+                    out.append(part[1])
+                else:
+                    _, lead, _, trail = part
+                    out.append(lead + known[next(hashes)] + trail)
+            results.append("".join(out))
+        return results
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_translation_memory():
+    """Sdílená instance paměti, nebo None pokud je vypnutá (TRANSLATION_MEMORY=0)"""
+    global _memory
+    if not TRANSLATION_MEMORY_ENABLED:
+        return None
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = TranslationMemory()
+    return _memory
@@ -1,7 +1,29 @@
 import requests
 from bs4 import BeautifulSoup
+from bs4.dammit import UnicodeDammit
 import re
-from urllib.parse import urljoin
+import os
+import logging
+from html.entities import html5 as _HTML5_ENTITIES
+import threading
+from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from scrapeEngine import polite_get, SCRAPE_MAX_PER_HOST
+from scrapeCache import ScrapeCache, get_scrape_cache
+
+try:
+    from lxml import etree
+except ImportError:  # lxml je volitelné - bez něj se api.de parsuje přes BeautifulSoup (pomaleji)
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+# Prefix, kterým api_scrape_product_details hlásí chybu načtení stránky místo HTML
+SCRAPE_ERROR_PREFIX = "Chyba při načítání stránky"
+
+# Adresa shopu api.de; přepisuje se jen kvůli lokálním stand-inům (benchmark.py)
+API_BASE_URL = os.getenv("API_BASE_URL", "https://shop.api.de").rstrip("/")
 
 
 def api_scrape_product_details(PNumber):
@@ -12,28 +34,140 @@ def api_scrape_product_details(PNumber):
     - product_number: hodnota z řádku 'Artikelnr.'
     - product_title: text z <h5 class="fw-bold text-primary my-4">…</h5>
     """
-    import requests
-    from bs4 import BeautifulSoup
-    import re
+    url = f"{API_BASE_URL}/product/details/{PNumber}"
+
+    # Cache na disku: čerstvý záznam bez požadavku, starší se revaliduje (ETag/Last-Modified)
+    cache = get_scrape_cache()
+    entry = cache.get("api", PNumber) if cache else None
+    if entry is not None and entry.fresh and entry.result is not None:
+        cache.hit(entry)
+        return tuple(entry.result)
 
-    url = f"https://shop.api.de/product/details/{PNumber}"
     try:
-        response = requests.get(url)
+        response = polite_get(url, headers=ScrapeCache.conditional_headers(entry))
+        if response.status_code == 304 and entry is not None and entry.result is not None:
+            cache.revalidated(entry)
+            return tuple(entry.result)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         # zachováme staré chování (string) + prázdné identifikátory
-        return f"Chyba při načítání stránky: {e}", "", ""
+        return f"{SCRAPE_ERROR_PREFIX}: {e}", "", ""
+
+    result = parse_api_product_html(response.content)
+    if cache:
+        cache.miss()
+        cache.put(
+            "api", PNumber, list(result),
+            url=url,
+            body=response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+    return result
+
+
+# ---------- Parsování detailu api.de ----------
+# Třídy prvků stránky; víceslovná hodnota se porovnává s celým atributem class (jako BeautifulSoup)
+_API_TITLE_CLASS = "fw-bold text-primary my-4"
+_API_DESCRIPTION_CLASS = "displayTabOnPrint"
+_API_DESCRIPTION_P_CLASS = "mb-4 mt-3"
+_API_SPECS_CLASS = "mb-5 px-2 pb-5"
+_API_MORE_SPECS_CLASS = "mb-4 px-2"
+_API_SECTION_TITLE_CLASS = "fw-bold"
+_API_SPEC_ROW_CLASS = "row mb-1 ms-3 align-items-end"
+_API_SPEC_NAME_CLASS = "col col-lg-2 col-6"
+_API_SPEC_VALUE_CLASS = "col col-lg-10 col-6"
+_API_NUMBER_LABEL = "Artikelnr."
+# Texty těchto prvků get_text v BeautifulSoup nevrací
+_NON_TEXT_TAGS = frozenset(("script", "style", "template"))
+# libxml2 převádí CRLF na LF, html.parser je nechává → CR se před parsováním schová sem
+_CR_PLACEHOLDER = "\ue000"
+
+# Prvky bez obsahu - html.parser do nich nic nevnořuje
+_VOID_TAGS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem",
+    "meta", "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame",
+    "image", "isindex", "nextid", "spacer",
+))
+# Obsah těchto prvků se netokenizuje (až po uzavírací tag); <title>/<textarea> html.parser
+# podle verze Pythonu tokenizuje, takže značky v nich vedou na rozdílný tvar a fallback
+_RAW_TEXT_TAGS = frozenset(("script", "style"))
+_RAW_TEXT_END_RE = {tag: re.compile(f"</{tag}\\s*>", re.I) for tag in _RAW_TEXT_TAGS}
+# Obal dokumentu, který libxml2 doplňuje/přesouvá - do porovnání tvaru stromu se nepočítá
+_DOCUMENT_TAGS = frozenset(("html", "head", "body"))
+_HTML_TOKEN_RE = re.compile(
+    r"<!--.*?-->|<!\[|<![^>]*>|<\?[^>]*>"
+    r"|<(/?)([a-zA-Z][^\s/>]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>",
+    re.S,
+)
+_ENTITY_RE = re.compile(r"&(?:#([0-9]{1,7});|#[xX]([0-9a-fA-F]{1,6});|([A-Za-z][A-Za-z0-9]{0,31});)?")
+# Řídicí znaky (NUL apod.) libxml2 nahrazuje nebo zahazuje, html.parser je nechává
+_CONTROL_CHARS_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]")
+
+
+def _has_number_label(text):
+    return text and _API_NUMBER_LABEL in text
+
+
+def _class_matches(element, value):
+    """Stejné pravidlo jako class_=value v BeautifulSoup: celý atribut class, nebo jedna z tříd"""
+    classes = element.get("class")
+    if not classes:
+        return False
+    if _CR_PLACEHOLDER in classes:
+        classes = classes.replace(_CR_PLACEHOLDER, " ")
+    classes = classes.split()
+    return value in classes or " ".join(classes) == value
+
+
+def _find_first(element, tag, class_value):
+    """Obdoba element.find(tag, class_=class_value) nad stromem lxml"""
+    for descendant in element.iterdescendants(tag):
+        if _class_matches(descendant, class_value):
+            return descendant
+    return None
+
+
+if etree is not None:
+    # Předvýběr kandidátů na řádek "Artikelnr." (kompiluje se jednou); přesná kontrola je v _lxml_string
+    _XP_NUMBER_LABELS = etree.XPath(f"//div[contains(., '{_API_NUMBER_LABEL}')]")
+
+
+def parse_api_product_html(content):
+    """
+    Vyparsuje stránku detailu produktu z shop.api.de.
+    Vrací (final_output_html, product_number, product_title) - viz api_scrape_product_details.
+
+    S lxml se stránka parsuje v C a prvky se hledají jedním průchodem příslušného podstromu.
+    libxml2 ale opravuje špatné HTML jinak než html.parser (uzavře <p> před <div>, zahodí
+    vnořený <form>, jinak dekóduje entity bez středníku...) - proto se lxml použije jen tehdy,
+    když má strom stejný tvar jako v BeautifulSoup a text nic sporného neobsahuje;
+    jinak (a bez lxml) se stránka parsuje přes BeautifulSoup.
+    """
+    if etree is not None:
+        root = _lxml_document(content)
+        if root is not None:
+            return _parse_api_product_lxml(root)
+    return _parse_api_product_soup(content)
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+
+def _build_api_output(description, spec_parts):
+    specs_html = "".join(spec_parts)
+    return f"{description}<br><br>\n{specs_html}" if description else specs_html
+
+
+def _parse_api_product_soup(content):
+    """Původní cesta přes BeautifulSoup (html.parser) - fallback bez lxml a reference pro benchmark"""
+    soup = BeautifulSoup(content, 'html.parser')
 
     # ---------- Nově: extrakce názvu produktu ----------
-    title_tag = soup.find('h5', class_='fw-bold text-primary my-4')
+    title_tag = soup.find('h5', class_=_API_TITLE_CLASS)
     product_title = title_tag.get_text(strip=True) if title_tag else ""
 
     # ---------- Nově: extrakce Artikelnr. ----------
     product_number = ""
     try:
-        label_div = soup.find('div', string=lambda t: t and "Artikelnr." in t)
+        label_div = soup.find('div', string=_has_number_label)
         if label_div:
             num_div = label_div.find_next_sibling('div')
             if num_div:
@@ -43,46 +177,265 @@ def api_scrape_product_details(PNumber):
         product_number = ""
 
     # ---------- Původní logika stavby výstupního HTML ----------
-    description_section = soup.find('span', class_='displayTabOnPrint')
+    description_section = soup.find('span', class_=_API_DESCRIPTION_CLASS)
     description = ""
     if description_section:
-        description_p = description_section.find('p', class_='mb-4 mt-3')
+        description_p = description_section.find('p', class_=_API_DESCRIPTION_P_CLASS)
         if description_p:
             description = f"<span>{description_p.get_text(strip=True)}</span>"
 
-    specs_html = ""
-    specs_section = soup.find('div', class_='mb-5 px-2 pb-5')
-    if specs_section:
-        section_title = specs_section.find('h6', class_='fw-bold')
+    spec_parts = []
+    specs_section = soup.find('div', class_=_API_SPECS_CLASS)
+    sections = [specs_section] if specs_section else []
+    sections.extend(soup.find_all('div', class_=_API_MORE_SPECS_CLASS))
+    for section in sections:
+        section_title = section.find('h6', class_=_API_SECTION_TITLE_CLASS)
         if section_title:
-            specs_html += f"<b>{section_title.get_text(strip=True)}</b>\n<ul>\n"
+            spec_parts.append(f"<b>{section_title.get_text(strip=True)}</b>\n<ul>\n")
 
-        spec_rows = specs_section.find_all('div', class_='row mb-1 ms-3 align-items-end')
-        for row in spec_rows:
-            spec_name = row.find('div', class_='col col-lg-2 col-6')
-            spec_value = row.find('div', class_='col col-lg-10 col-6')
+        for row in section.find_all('div', class_=_API_SPEC_ROW_CLASS):
+            spec_name = row.find('div', class_=_API_SPEC_NAME_CLASS)
+            spec_value = row.find('div', class_=_API_SPEC_VALUE_CLASS)
             if spec_name and spec_value:
-                specs_html += f"<li>{spec_name.get_text(strip=True)}: {spec_value.get_text(strip=True)}</li>\n"
+                spec_parts.append(f"<li>{spec_name.get_text(strip=True)}: {spec_value.get_text(strip=True)}</li>\n")
 
-        specs_html += "</ul>"
+        spec_parts.append("</ul>")
 
-    more_sections = soup.find_all('div', class_='mb-4 px-2')
-    for section in more_sections:
-        section_title = section.find('h6', class_='fw-bold')
-        if section_title:
-            specs_html += f"<b>{section_title.get_text(strip=True)}</b>\n<ul>\n"
+    return _build_api_output(description, spec_parts), product_number, product_title
 
-        spec_rows = section.find_all('div', class_='row mb-1 ms-3 align-items-end')
-        for row in spec_rows:
-            spec_name = row.find('div', class_='col col-lg-2 col-6')
-            spec_value = row.find('div', class_='col col-lg-10 col-6')
-            if spec_name and spec_value:
-                specs_html += f"<li>{spec_name.get_text(strip=True)}: {spec_value.get_text(strip=True)}</li>\n"
 
-        specs_html += "</ul>"
+def _lxml_document(content):
+    """
+    Strom lxml ze stránky dekódované stejně jako v BeautifulSoup (UnicodeDammit);
+    None = lxml by dal jiný výsledek než BeautifulSoup (nebo stránku nezpracuje)
+    """
+    if isinstance(content, bytes):
+        content = UnicodeDammit(content, is_html=True).unicode_markup
+    if not content or not content.strip() or _CR_PLACEHOLDER in content:
+        return None
+    if _CONTROL_CHARS_RE.search(content):
+        return None
+    shape = _soup_shape(content)
+    if shape is None:
+        return None
+    if "\r" in content:
+        content = content.replace("\r", _CR_PLACEHOLDER)
+    try:
+        root = etree.HTML(content)
+    except (etree.ParserError, ValueError):
+        return None
+    if root is None or _lxml_shape(root) != shape:
+        # libxml2 strom přestavěl (implicitně uzavřené/zahozené/doplněné prvky)
+        return None
+    return root
+
 
-    final_output = f"{description}<br><br>\n{specs_html}" if description else specs_html
-    return final_output, product_number, product_title
+def _soup_shape(content):
+    """
+    Tvar stromu, jaký z content postaví BeautifulSoup s html.parser: seznam (tag, hloubka)
+    prvků a neprázdných textů ("") v pořadí dokumentu. html.parser nic implicitně neuzavírá -
+    koncový tag uzavře nejbližší otevřený prvek stejného jména, nepárový se ignoruje.
+    None = stránka obsahuje něco, co libxml2 zpracuje jinak (CDATA, sporné entity).
+    """
+    shape = []
+    stack = []
+    depth = 0  # počet otevřených prvků mimo html/head/body
+    position = 0
+    length = len(content)
+    while position < length:
+        match = _HTML_TOKEN_RE.search(content, position)
+        end = match.start() if match else length
+        if not _plain_entities(content, position, end):
+            return None
+        if content[position:end].strip():
+            shape.append(("", depth))
+        if match is None:
+            break
+        position = match.end()
+        token = match.group(0)
+        if token == "<![":
+            return None
+        name = match.group(2)
+        if name is None:
+            continue
+        name = name.lower()
+        if match.group(1):
+            if name in stack:
+                del stack[len(stack) - 1 - stack[::-1].index(name):]
+                depth = sum(1 for tag in stack if tag not in _DOCUMENT_TAGS)
+            continue
+        if name not in _DOCUMENT_TAGS:
+            shape.append((name, depth))
+        if name in _VOID_TAGS or match.group(3).rstrip().endswith("/"):
+            continue
+        if name in _RAW_TEXT_TAGS:
+            close = _RAW_TEXT_END_RE[name].search(content, position)
+            position = close.end() if close else length
+            continue
+        stack.append(name)
+        if name not in _DOCUMENT_TAGS:
+            depth += 1
+    return shape
+
+
+def _plain_entities(content, start, end):
+    """True, když text content[start:end] obsahuje jen entity, které oba parsery dekódují stejně"""
+    position = content.find("&", start, end)
+    while position != -1:
+        match = _ENTITY_RE.match(content, position, end)
+        decimal, hexadecimal, name = match.groups()
+        if name is not None:
+            if name + ";" not in _HTML5_ENTITIES:
+                return False
+        elif decimal is not None or hexadecimal is not None:
+            code = int(decimal) if decimal is not None else int(hexadecimal, 16)
+            if not (0x20 <= code < 0x7f or code in (0x09, 0x0a) or 0xa0 <= code < 0xd800
+                    or 0xe000 <= code < 0xfffe or 0x10000 <= code <= 0x10ffff):
+                return False
+        else:
+            # & bez platné entity (&euro, &copy2020, holé &) - html.parser ho čte jinak než libxml2
+            return False
+        position = content.find("&", match.end(), end)
+    return True
+
+
+def _lxml_shape(root):
+    """Tvar stromu lxml ve stejném formátu jako _soup_shape"""
+    shape = []
+    _collect_shape(root, 0, shape)
+    return shape
+
+
+def _collect_shape(element, depth, shape):
+    if element.tag not in _RAW_TEXT_TAGS and _has_text(element.text):
+        shape.append(("", depth))
+    for child in element:
+        if isinstance(child.tag, str):
+            if child.tag in _DOCUMENT_TAGS:
+                _collect_shape(child, depth, shape)
+            else:
+                shape.append((child.tag, depth))
+                _collect_shape(child, depth + 1, shape)
+        if _has_text(child.tail):
+            shape.append(("", depth))
+
+
+def _has_text(text):
+    if not text:
+        return False
+    if _CR_PLACEHOLDER in text:
+        text = text.replace(_CR_PLACEHOLDER, "")
+    return bool(text.strip())
+
+
+def _lxml_text(element):
+    """Obdoba get_text(strip=True): neprázdné oříznuté texty potomků bez komentářů a skriptů"""
+    parts = []
+    _collect_text(element, parts)
+    return "".join(parts)
+
+
+def _collect_text(element, parts):
+    if element.tag in _NON_TEXT_TAGS:
+        return
+    if element.text:
+        _add_text(element.text, parts)
+    for child in element:
+        if isinstance(child.tag, str):
+            _collect_text(child, parts)
+        if child.tail:
+            _add_text(child.tail, parts)
+
+
+def _add_text(text, parts):
+    if _CR_PLACEHOLDER in text:
+        text = text.replace(_CR_PLACEHOLDER, "\r")
+    text = text.strip()
+    if text:
+        parts.append(text)
+
+
+def _lxml_string(element):
+    """Obdoba Tag.string: text jediného potomka (rekurzivně), jinak None"""
+    while True:
+        children = len(element)
+        if children == 0:
+            return element.text
+        if children > 1 or element.text or element[0].tail:
+            return None
+        element = element[0]
+        if not isinstance(element.tag, str):
+            # Komentář je v BeautifulSoup také řetězec
+            return element.text
+
+
+def _parse_api_product_lxml(root):
+    title = _find_first(root, "h5", _API_TITLE_CLASS)
+    product_title = _lxml_text(title) if title is not None else ""
+
+    product_number = ""
+    for label_div in _XP_NUMBER_LABELS(root):
+        if not _has_number_label(_lxml_string(label_div)):
+            continue
+        num_div = next(label_div.itersiblings("div"), None)
+        if num_div is not None:
+            b = next(num_div.iterdescendants("b"), None)
+            product_number = _lxml_text(b if b is not None else num_div).strip()
+        break
+
+    description = ""
+    description_section = _find_first(root, "span", _API_DESCRIPTION_CLASS)
+    if description_section is not None:
+        description_p = _find_first(description_section, "p", _API_DESCRIPTION_P_CLASS)
+        if description_p is not None:
+            description = f"<span>{_lxml_text(description_p)}</span>"
+
+    # Jeden průchod přes div: první hlavní sekce specifikací + všechny další sekce
+    specs_section, more_sections = None, []
+    for div in root.iterdescendants("div"):
+        if _class_matches(div, _API_MORE_SPECS_CLASS):
+            more_sections.append(div)
+        elif specs_section is None and _class_matches(div, _API_SPECS_CLASS):
+            specs_section = div
+    sections = [specs_section] if specs_section is not None else []
+    sections.extend(more_sections)
+
+    spec_parts = []
+    for section in sections:
+        section_title = _find_first(section, "h6", _API_SECTION_TITLE_CLASS)
+        if section_title is not None:
+            spec_parts.append(f"<b>{_lxml_text(section_title)}</b>\n<ul>\n")
+
+        for row in section.iterdescendants("div"):
+            if not _class_matches(row, _API_SPEC_ROW_CLASS):
+                continue
+            spec_name = _find_first(row, "div", _API_SPEC_NAME_CLASS)
+            spec_value = _find_first(row, "div", _API_SPEC_VALUE_CLASS)
+            if spec_name is not None and spec_value is not None:
+                spec_parts.append(f"<li>{_lxml_text(spec_name)}: {_lxml_text(spec_value)}</li>\n")
+
+        spec_parts.append("</ul>")
+
+    return _build_api_output(description, spec_parts), product_number, product_title
+
+
+def scrape_many(pnumbers, scrape_function=api_scrape_product_details, max_workers=SCRAPE_MAX_PER_HOST):
+    """
+    Souběžně scrapuje více produktů a průběžně vrací výsledky v pořadí dokončení.
+
+    Yields:
+        (pnumber, html, product_number, product_title)
+        - při výjimce scraperu je html chybová hláška (SCRAPE_ERROR_PREFIX) a identifikátory prázdné
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(scrape_function, pnumber): pnumber for pnumber in pnumbers}
+        for future in as_completed(futures):
+            pnumber = futures[future]
+            try:
+                html, product_number, product_title = normalize_scrape_result(future.result())
+            except Exception as e:
+                html, product_number, product_title = f"{SCRAPE_ERROR_PREFIX}: {e}", "", ""
+            yield pnumber, html, product_number, product_title
 
 
 
@@ -93,38 +446,242 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import time
 
+from seleniumPool import get_kosatec_driver_pool
+
+
+KOSATEC_BASE_URL = os.getenv("KOSATEC_BASE_URL", "https://shop.kosatec.de").rstrip("/")
+
+# Rychlá cesta přes čisté HTTP (bez prohlížeče); "0" v .env ji vypne
+KOSATEC_HTTP_FAST_PATH = os.getenv("KOSATEC_HTTP_FAST_PATH", "1") != "0"
+
+# Evidence, kterou cestou se který produkt scrapoval ("http" / "selenium");
+# zásahy cache se počítají zvlášť, aby nepřepsaly skutečně použitou cestu
+KOSATEC_SCRAPE_PATHS = {}
+_kosatec_cache_hits = 0
+_kosatec_paths_lock = threading.Lock()
+
+_ARTIKEL_RE = re.compile(r"(?i)\bArtikel\b\D*([0-9]+)")
+
+
+def _only_digits(s) -> str:
+    return re.sub(r"\D+", "", str(s or ""))
+
+
+def _normalize_yes_no(text_value: str, aria_label: str = "") -> str:
+    """Převede Yes/No (ikona s aria-label nebo text Ja/Nein) na 'hat' / 'hat nicht'"""
+    text = (text_value or "").strip()
+    aria = (aria_label or "").strip().lower()
+    if not text and aria:
+        if aria == "yes":
+            return "hat"
+        if aria == "no":
+            return "hat nicht"
+        return aria
+    # Zkus textová "Ja/Nein/Yes/No"
+    lowered = text.lower()
+    if lowered in ("ja", "yes"):
+        return "hat"
+    if lowered in ("nein", "no"):
+        return "hat nicht"
+    return text
+
+
+def _record_kosatec_path(pnumber, path):
+    with _kosatec_paths_lock:
+        KOSATEC_SCRAPE_PATHS[str(pnumber)] = path
+
+
+def _record_kosatec_cache_hit():
+    global _kosatec_cache_hits
+    with _kosatec_paths_lock:
+        _kosatec_cache_hits += 1
+
+
+def get_kosatec_path_stats():
+    """
+    Vrátí počty produktů podle použité cesty, např. {'http': 120, 'selenium': 8};
+    odpovědi z cache jsou pod klíčem 'cache' (jen když nějaké byly)
+    """
+    with _kosatec_paths_lock:
+        stats = {}
+        for path in KOSATEC_SCRAPE_PATHS.values():
+            stats[path] = stats.get(path, 0) + 1
+        if _kosatec_cache_hits:
+            stats["cache"] = _kosatec_cache_hits
+        return stats
+
+
+def _kosatec_http_fast_path(pnumber: str):
+    """
+    Pokus o scrape Kosatec bez prohlížeče - stejná logika jako Selenium cesta,
+    ale nad serverově vyrenderovaným HTML.
+
+    Returns:
+        str s výstupním HTML, nebo None pokud stránka nemá potřebná data
+        (nenalezené Artikel číslo nebo chybějící Icecat tabulka) → fallback na Selenium.
+    """
+    wanted = _only_digits(pnumber)
+
+    # 1) Výsledky vyhledávání → karta s 'Artikel <pnumber>'
+    response = polite_get(f"{KOSATEC_BASE_URL}/factfinder/result?query={pnumber}")
+    response.raise_for_status()
+    soup = BeautifulSoup(response.content, "html.parser")
+
+    product_link = None
+    for card in soup.select(".product-box"):
+        artikel_num = None
+        for li in card.select("ul li"):
+            m = _ARTIKEL_RE.search(li.get_text(" ", strip=True))
+            if m:
+                artikel_num = _only_digits(m.group(1))
+                break
+        if artikel_num and artikel_num == wanted:
+            a = card.select_one("a.product-image-link, a.product-name")
+            if a and a.get("href"):
+                product_link = a["href"]
+                break
+
+    if not product_link:
+        # Stejně jako Selenium cesta: první odkaz, Artikel se ověří na detailu
+        first_a = soup.select_one("a.product-image-link, a.product-name")
+        if not first_a or not first_a.get("href"):
+            return None
+        product_link = first_a["href"]
+
+    # 2) Detail + ověření 'Artikel <num>'
+    detail_url = urljoin(KOSATEC_BASE_URL + "/", product_link)
+    response = polite_get(detail_url)
+    response.raise_for_status()
+    page_src = response.text or ""
+    detail = BeautifulSoup(page_src, "html.parser")
+
+    artikel_ok = False
+    for li in detail.select("ul.fw-light > li"):
+        m = _ARTIKEL_RE.search(li.get_text("", strip=True))
+        if m and _only_digits(m.group(1)) == wanted:
+            artikel_ok = True
+            break
+    if not artikel_ok:
+        m = re.search(r"(?i)Artikel\D*([0-9]{3,})", page_src)
+        if m and _only_digits(m.group(1)) == wanted:
+            artikel_ok = True
+    if not artikel_ok:
+        path_last = urlparse(response.url or detail_url).path.rstrip("/").split("/")[-1]
+        if _only_digits(path_last) == wanted:
+            artikel_ok = True
+    if not artikel_ok:
+        return None
+
+    table = detail.select_one(".-icecat-table")
+    if table is None:
+        return None
+
+    # 3) Extrakce obsahu (bullet points + Icecat)
+    output_parts = []
+
+    bullet_ul = detail.find(id="bullet-points-list")
+    if bullet_ul is not None:
+        bp_texts = [li.get_text(" ", strip=True) for li in bullet_ul.find_all("li")]
+        bp_texts = [txt for txt in bp_texts if txt]
+        if bp_texts:
+            output_parts.append("<span>\n" + "\n".join(bp_texts) + "\n</span>\n<br><br>")
+
+    for group in table.select(".-icecat-feature-group"):
+        head = group.select_one(".-icecat-tableRowHead")
+        section_title = head.get_text(" ", strip=True) if head else ""
+        if section_title:
+            output_parts.append(f"<b>{section_title}</b>\n<ul>")
+        else:
+            output_parts.append("<ul>")
+
+        for row in group.select(".-icecat-tableRow"):
+            label_el = row.select_one(".-icecat-ds_label")
+            value_el = row.select_one(".-icecat-ds_data")
+            if label_el is None or value_el is None:
+                continue
+            label = label_el.get_text(" ", strip=True)
+            icon = value_el.select_one("[role='img'][aria-label]")
+            value = _normalize_yes_no(
+                value_el.get_text(" ", strip=True),
+                icon.get("aria-label", "") if icon else "",
+            )
+            if label:
+                output_parts.append(f"<li>{label}: {value}</li>")
+
+        output_parts.append("</ul>")
+
+    return "\n".join(output_parts).strip()
+
 
 def get_kosatec_product_data(pnumber: str) -> str:
+    """
+    Vrátí HTML výpis Kosatec produktu (bullet points + Icecat specifikace).
+
+    Nejdřív zkusí rychlou cestu přes HTTP; Selenium se použije jen tehdy,
+    když HTTP stránka neobsahuje Artikel číslo nebo Icecat tabulku.
+    Použitá cesta se zaznamená do KOSATEC_SCRAPE_PATHS.
+    Výsledek se ukládá do cache na disku (jen TTL, stránky nenesou validátory).
+    """
+    cache = get_scrape_cache()
+    entry = cache.get("kosatec", pnumber) if cache else None
+    if entry is not None and entry.fresh and entry.result is not None:
+        cache.hit(entry)
+        _record_kosatec_cache_hit()
+        return entry.result
+    if cache:
+        cache.miss()
+
+    output = _scrape_kosatec(pnumber)
+    if cache:
+        cache.put("kosatec", pnumber, output)
+    return output
+
+
+def _scrape_kosatec(pnumber: str) -> str:
+    """HTTP cesta s fallbackem na Selenium (bez cache)"""
+    if KOSATEC_HTTP_FAST_PATH:
+        try:
+            output = _kosatec_http_fast_path(pnumber)
+        except requests.exceptions.RequestException as e:
+            logger.warning("HTTP cesta pro Kosatec %s selhala: %s", pnumber, e)
+            output = None
+        if output is not None:
+            _record_kosatec_path(pnumber, "http")
+            return output
+        logger.debug("Kosatec %s: HTTP cesta nestačí, používám Selenium", pnumber)
+
+    _record_kosatec_path(pnumber, "selenium")
+    return get_kosatec_product_data_selenium(pnumber)
+
+
+def get_kosatec_product_data_selenium(pnumber: str) -> str:
     """
     Najde správný produkt na Kosatec podle 'Artikel <pnumber>', otevře detail
     a vrátí HTML výpis s bullet points + Icecat specifikacemi.
     - Na výsledcích klikne jen na kartu, kde <li> obsahuje 'Artikel <pnumber>'.
     - Na detailu si znovu ověří, že 'Artikel' odpovídá pnumber (robustní regex).
     - V tabulce specifikací (Icecat) převádí Yes/No ikony (aria-label) na 'hat' / 'hat nicht'.
+    - Chrome se nespouští pro každý produkt, driver se půjčuje ze sdíleného poolu (seleniumPool).
     """
     # --- importy uvnitř funkce, aby byla samostatná ---
     import re
     from urllib.parse import urlparse
 
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
     from selenium.webdriver.common.by import By
     from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
-    from selenium.common.exceptions import TimeoutException, NoSuchElementException
+    from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 
     def only_digits(s: str) -> str:
         return re.sub(r"\D+", "", str(s or ""))
 
     wanted = only_digits(pnumber)
 
-    # --- Selenium driver ---
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--window-size=1920,1080")
-    driver = webdriver.Chrome(options=options)
+    # --- Selenium driver (půjčený z poolu, cookies/consent zůstávají mezi produkty) ---
+    pool = get_kosatec_driver_pool()
+    pooled = pool.acquire()
+    driver = pooled.driver
+    crashed = False
 
     try:
         wait = WebDriverWait(driver, 15)
@@ -132,7 +689,7 @@ def get_kosatec_product_data(pnumber: str) -> str:
         # =========================================================
         # 1) Vyhledání a klik na správnou kartu dle "Artikel <num>"
         # =========================================================
-        search_url = f"https://shop.kosatec.de/factfinder/result?query={pnumber}"
+        search_url = f"{KOSATEC_BASE_URL}/factfinder/result?query={pnumber}"
         driver.get(search_url)
 
         # Počkej, až se objeví aspoň jedna karta
@@ -246,26 +803,14 @@ def get_kosatec_product_data(pnumber: str) -> str:
         # --- ICECAT SPECIFIKACE ---
         # Převede Yes/No (ikony s role="img" aria-label) na 'hat' / 'hat nicht'
         def normalize_yes_no(value_el, text_value: str) -> str:
-            text = (text_value or "").strip()
             # Zkus ikonu
+            aria = ""
             try:
                 icon = value_el.find_element(By.CSS_SELECTOR, "[role='img'][aria-label]")
-                aria = (icon.get_attribute("aria-label") or "").strip().lower()
-                if not text and aria:
-                    if aria == "yes":
-                        return "hat"
-                    if aria == "no":
-                        return "hat nicht"
-                    return aria
+                aria = icon.get_attribute("aria-label") or ""
             except NoSuchElementException:
                 pass
-            # Zkus textová "Ja/Nein/Yes/No"
-            lowered = text.lower()
-            if lowered in ("ja", "yes"):
-                return "hat"
-            if lowered in ("nein", "no"):
-                return "hat nicht"
-            return text
+            return _normalize_yes_no(text_value, aria)
 
         try:
             table = driver.find_element(By.CLASS_NAME, "-icecat-table")
@@ -312,10 +857,40 @@ def get_kosatec_product_data(pnumber: str) -> str:
             return ""
         return output
 
+    except WebDriverException:
+        # Timeout/NoSuchElement jsou také WebDriverException - pool si driver ověří
+        crashed = True
+        raise
     finally:
-        driver.quit()
+        pool.release(pooled, crashed=crashed)
 
 
+def normalize_scrape_result(result):
+    """
+    Sjednotí návratové hodnoty scraperů na (html, product_number, product_title).
+
+    - nový formát: (html, product_number, product_title)
+    - původní formát: "html"
+    """
+    original_html, prod_num, prod_title = "", "", ""
+    if isinstance(result, tuple):
+        if len(result) >= 1:
+            original_html = result[0] or ""
+        if len(result) >= 2:
+            prod_num = result[1] or ""
+        if len(result) >= 3:
+            prod_title = result[2] or ""
+    else:
+        original_html = result or ""
+    return original_html, prod_num, prod_title
+
+
+# Dodavatelé: název -> kód dodavatele (SivComId) + scrapovací funkce
+DODAVATELE = {
+    "api": {"kod": "161784", "funkce": api_scrape_product_details},
+    "Kosatec (selenium)": {"kod": "165463", "funkce": get_kosatec_product_data},
+}
+
 
 # Test
 if __name__ == "__main__":
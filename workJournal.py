@@ -0,0 +1,218 @@
+"""
+Lokální žurnál rozpracovaných produktů (SQLite ve WAL režimu).
+
+Každý produkt prochází stavy scraped → translated → confirmed → saved a každý
+přechod se hned zapíše na disk (tabulka products = aktuální stav, events = historie).
+Díky tomu:
+- po pádu nebo zavření aplikace se potvrzené, ale neuložené překlady při startu
+  znovu zapíšou do DB (pending_saves)
+- už přeložený produkt se znovu nescrapuje ani neposílá do LLM (lookup)
+- překlad nese verzi promptu, kterou vznikl; starší verze se znovu nepoužije
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from LLMTranslate import PROMPT_VERSION
+from metrics import get_metrics
+from webScrapeDescriptions import SCRAPE_ERROR_PREFIX
+
+logger = logging.getLogger(__name__)
+
+WORK_JOURNAL_ENABLED = os.getenv("WORK_JOURNAL", "1") != "0"
+WORK_JOURNAL_PATH = os.getenv("WORK_JOURNAL_PATH", "workJournal.sqlite")
+# Uložené produkty starší než tolik dní se z žurnálu mažou
+WORK_JOURNAL_RETENTION_DAYS = float(os.getenv("WORK_JOURNAL_RETENTION_DAYS", "30"))
+
+
+class JournalEntry:
+    def __init__(self, row):
+        (self.siv_code, self.supplier, self.stage, self.original_html, self.translation,
+         self.prompt_version, self.updated_at) = row
+
+    @property
+    def has_translation(self):
+        """Překlad je použitelný jen z aktuální verze promptu (potvrzený text vždy)"""
+        if not self.translation:
+            return False
+        return self.stage in ("confirmed", "saved") or self.prompt_version == PROMPT_VERSION
+
+
+class WorkJournal:
+    """Thread-safe žurnál stavů produktů"""
+
+    def __init__(self, path=WORK_JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # timeout: žurnál sdílí i worker procesy shardedRunneru
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commit přežije pád aplikace (ne výpadek napájení) bez fsync na každý zápis
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                siv_code TEXT PRIMARY KEY,
+                supplier TEXT,
+                stage TEXT NOT NULL,
+                original_html TEXT,
+                translation TEXT,
+                prompt_version TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_products_stage ON products(stage)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                siv_code TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self.counters = {"reused_translations": 0, "reused_originals": 0, "replayed": 0}
+        self.prune()
+
+    def _inc(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def _events(self, siv_codes, stage, now):
+        self._conn.executemany("INSERT INTO events (siv_code, stage, at) VALUES (?, ?, ?)",
+                               [(str(code), stage, now) for code in siv_codes])
+
+    def lookup(self, siv_code):
+        """Aktuální stav produktu (JournalEntry) nebo None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT siv_code, supplier, stage, original_html, translation, prompt_version, updated_at "
+                "FROM products WHERE siv_code = ?", (str(siv_code),)).fetchone()
+        return JournalEntry(row) if row else None
+
+    def reuse_original(self, siv_code):
+        """Už jednou stažený originál produktu, nebo None (znovupoužití se počítá)"""
+        entry = self.lookup(siv_code)
+        # Chybová hláška scraperu z dřívějších verzí se jako originál nepoužije
+        if entry is None or not entry.original_html or entry.original_html.startswith(SCRAPE_ERROR_PREFIX):
+            get_metrics().inc("cache_requests_total", cache="journal_original", result="miss")
+            return None
+        get_metrics().inc("cache_requests_total", cache="journal_original", result="hit")
+        self._inc("reused_originals")
+        return entry.original_html
+
+    def reuse_translation(self, siv_code):
+        """Použitelný překlad ze žurnálu, nebo None - takový produkt se do LLM znovu neposílá"""
+        entry = self.lookup(siv_code)
+        if entry is None or not entry.has_translation:
+            get_metrics().inc("cache_requests_total", cache="journal_translation", result="miss")
+            return None
+        get_metrics().inc("cache_requests_total", cache="journal_translation", result="hit")
+        self._inc("reused_translations")
+        return entry.translation
+
+    def record_scraped(self, supplier, siv_code, original_html):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO products (siv_code, supplier, stage, original_html, updated_at) VALUES (?, ?, 'scraped', ?, ?) "
+                "ON CONFLICT(siv_code) DO UPDATE SET supplier = excluded.supplier, stage = 'scraped', "
+                "original_html = excluded.original_html, translation = NULL, prompt_version = NULL, "
+                "updated_at = excluded.updated_at "
+                # Potvrzený, ještě neuložený překlad se novým scrapem nepřepíše
+                "WHERE products.stage <> 'confirmed'",
+                (str(siv_code), str(supplier), original_html, now))
+            self._events([siv_code], "scraped", now)
+            self._conn.commit()
+
+    def record_translated(self, siv_code, translation):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE products SET stage = 'translated', translation = ?, prompt_version = ?, updated_at = ? "
+                "WHERE siv_code = ? AND stage IN ('scraped', 'translated')",
+                (translation, PROMPT_VERSION, now, str(siv_code)))
+            self._events([siv_code], "translated", now)
+            self._conn.commit()
+
+    def record_confirmed(self, siv_code, translation, supplier=None):
+        """Překlad schválený k uložení (text po případných úpravách v GUI)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO products (siv_code, supplier, stage, translation, prompt_version, updated_at) "
+                "VALUES (?, ?, 'confirmed', ?, ?, ?) "
+                "ON CONFLICT(siv_code) DO UPDATE SET stage = 'confirmed', translation = excluded.translation, "
+                "supplier = COALESCE(excluded.supplier, products.supplier), updated_at = excluded.updated_at",
+                (str(siv_code), None if supplier is None else str(supplier), translation, PROMPT_VERSION, now))
+            self._events([siv_code], "confirmed", now)
+            self._conn.commit()
+
+    def record_saved(self, siv_codes):
+        siv_codes = [str(code) for code in siv_codes]
+        if not siv_codes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("UPDATE products SET stage = 'saved', updated_at = ? WHERE siv_code = ?",
+                                   [(now, code) for code in siv_codes])
+            self._events(siv_codes, "saved", now)
+            self._conn.commit()
+
+    def record_flush(self, notes, result):
+        """
+        Zaznamená výsledek dávky z WriteBehindSaver. Uložené jsou všechny kromě
+        result["failed_codes"]; result=None (výjimka) znamená, že se neuložilo nic.
+        """
+        if result is None:
+            return
+        failed = set(map(str, result.get("failed_codes", ())))
+        self.record_saved(code for code, _ in notes if str(code) not in failed)
+
+    def pending_saves(self):
+        """Potvrzené překlady, které se do DB ještě nezapsaly: [(siv_code, překlad)]"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT siv_code, translation FROM products WHERE stage = 'confirmed' ORDER BY updated_at"
+            ).fetchall()
+
+    def replay_pending(self, saver):
+        """Zařadí neuložené potvrzené překlady do fronty ukládání; vrací jejich počet"""
+        pending = self.pending_saves()
+        for siv_code, translation in pending:
+            saver.put(siv_code, translation)
+        if pending:
+            logger.info("Žurnál: znovu ukládám %d potvrzených překladů z minulého běhu", len(pending))
+            self._inc("replayed", len(pending))
+        return len(pending)
+
+    def prune(self, retention_days=WORK_JOURNAL_RETENTION_DAYS):
+        """Smaže dávno uložené produkty a jejich historii"""
+        cutoff = time.time() - retention_days * 24 * 3600
+        with self._lock:
+            self._conn.execute("DELETE FROM products WHERE stage = 'saved' AND updated_at < ?", (cutoff,))
+            self._conn.execute("DELETE FROM events WHERE at < ?", (cutoff,))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+            for stage, count in self._conn.execute("SELECT stage, COUNT(*) FROM products GROUP BY stage"):
+                data[stage] = count
+        return data
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_work_journal():
+    """Sdílená instance žurnálu, nebo None pokud je vypnutý (WORK_JOURNAL=0)"""
+    global _journal
+    if not WORK_JOURNAL_ENABLED:
+        return None
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = WorkJournal()
+    return _journal
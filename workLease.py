@@ -0,0 +1,98 @@
+"""
+Leasing práce, aby se více lidí/procesů nad stejným dodavatelem nepřekrývalo.
+
+- produkty se z DB berou přes claim_products: každý vrácený SivCode dostane lease
+  (WorkerId + platnost) v tabulce LEASE_TABLE
+- vlákno na pozadí prodlužuje leasy pracovníka, dokud běží
+- po uložení nebo přeskočení se lease uvolní; lease pracovníka, který spadl, po
+  WORK_LEASE_SECONDS vyprší a produkt se vrátí do poolu
+- když leasing není k dispozici (chybí práva na tabulku, WORK_LEASE=0), použije se
+  obyčejné get_products; jiná chyba zabírání se předá volajícímu (bez leasů by se
+  pracovníci překrývali)
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+
+from database import get_products, claim_products, renew_leases, release_leases, LeaseUnavailableError
+
+logger = logging.getLogger(__name__)
+
+WORK_LEASE_ENABLED = os.getenv("WORK_LEASE", "1") != "0"
+WORK_LEASE_SECONDS = int(os.getenv("WORK_LEASE_SECONDS", "600"))
+
+
+def new_worker_id():
+    """Jednoznačný identifikátor pracovníka (počítač, proces, instance)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class WorkLeases:
+    """Leasy jednoho pracovníka: zabírání stránek, obnova na pozadí, uvolnění"""
+
+    def __init__(self, lease_seconds=WORK_LEASE_SECONDS, worker_id=None, enabled=WORK_LEASE_ENABLED):
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or new_worker_id()
+        self.enabled = enabled
+        self.counters = {"claimed": 0, "released": 0, "renewals": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._keeper = None
+
+    def _inc(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def fetch(self, supplier_code, limit=20, after=None, shard=None):
+        """Další stránka produktů (zabraná pro tohoto pracovníka, pokud je leasing zapnutý)"""
+        if not self.enabled:
+            return get_products(supplier_code, limit=limit, after=after, shard=shard)
+        try:
+            rows = claim_products(supplier_code, self.worker_id, limit=limit, after=after,
+                                  lease_seconds=self.lease_seconds, shard=shard)
+        except LeaseUnavailableError as e:
+            logger.warning("Leasing produktů není k dispozici (%s) - pokračuji bez něj", e)
+            self.enabled = False
+            return get_products(supplier_code, limit=limit, after=after, shard=shard)
+        self._inc("claimed", len(rows))
+        self._start_keeper()
+        return rows
+
+    def _start_keeper(self):
+        with self._lock:
+            if self._keeper is not None:
+                return
+            self._keeper = threading.Thread(target=self._keep_alive, name="lease-keeper", daemon=True)
+            self._keeper.start()
+
+    def _keep_alive(self):
+        # Obnova třikrát za dobu platnosti → jedna nepovedená obnova lease neztratí
+        interval = max(self.lease_seconds / 3.0, 1.0)
+        while not self._stop.wait(interval):
+            try:
+                renew_leases(self.worker_id, self.lease_seconds)
+                self._inc("renewals")
+            except Exception as e:
+                logger.warning("Obnova leasů selhala: %s", e)
+
+    def release(self, siv_codes):
+        """Produkty jsou hotové (uložené/přeskočené) - uvolní jejich leasy"""
+        siv_codes = list(siv_codes)
+        if not self.enabled or not siv_codes:
+            return
+        release_leases(self.worker_id, siv_codes)
+        self._inc("released", len(siv_codes))
+
+    def close(self):
+        """Zastaví obnovu a uvolní všechny zbývající leasy pracovníka"""
+        self._stop.set()
+        if self.enabled and self.counters["claimed"]:
+            release_leases(self.worker_id)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+        data["enabled"] = self.enabled
+        return data